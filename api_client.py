@@ -3,78 +3,188 @@ from __future__ import annotations
 
 import aiohttp
 import time
+import math
 import asyncio
-import operator
+import random
+import itertools
 import logging
-from typing import Any, TYPE_CHECKING
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Container, Iterable, TYPE_CHECKING
+
+from rate_limiter import AimdRateController, ArrivalSchedule, TokenBucketRateLimiter
+import json_codec
+from latency_histogram import LatencyHistogram
+from load_profile import LoadProfile
+from early_stop import EarlyStopController, ShardEarlyStop
+from result_store import ResultStore
+from tracing import ConnectionPoolStats, RequestTimings, create_trace_config
+from rule_engine import RuleEvaluator, compile_rules, evaluate_rule, extract_score, field_keys, resolve_field  # noqa: F401
 
 if TYPE_CHECKING:
     from webhook_server import WebhookServer
+    from file_handler import JsonlResultSink
+    from response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
+# Valores por defecto del pool de conexiones (los mismos que aiohttp)
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_LIMIT_PER_HOST = 0  # 0 = sin límite por host
+DEFAULT_KEEPALIVE_TIMEOUT = 15.0
+DEFAULT_DNS_CACHE_TTL = 10
+
+# Reintentos: estados HTTP transitorios y los que indican throttling
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = frozenset({429, 503})
+DEFAULT_RETRY_MAX_ATTEMPTS = 1
+DEFAULT_RETRY_BACKOFF_BASE = 0.5
+DEFAULT_RETRY_BACKOFF_MAX = 30.0
+
+# Modelos de carga: "paced" (token bucket, por defecto), "open" (cronograma
+# de llegadas fijo) y "closed" (N usuarios virtuales sin pacing)
+LOAD_MODELS = ("paced", "open", "closed")
+DEFAULT_LOAD_MODEL = "paced"
+DEFAULT_ARRIVAL = "constant"
+DEFAULT_ARRIVAL_SEED = 0  # semilla de las llegadas "poisson" (reproducibles)
+DEFAULT_VIRTUAL_USERS = 10
+
+# Qué se conserva de cada respuesta: el objeto completo o solo los campos
+# que leen las reglas, el "reason" y el sweep_field
+RESPONSE_MODES = ("full", "fields")
+DEFAULT_RESPONSE_MODE = "full"
+
+# Cada cuántos emails salteados seguidos el loop de despacho cede el event
+# loop: mientras recorre un tramo largo sin enviar nada, las respuestas en
+# vuelo se siguen leyendo y sus latencias no se inflan
+SKIP_YIELD_EVERY = 1000
 
-def resolve_field(data: dict[str, Any], field_path: str) -> Any:
+
+def connector_settings(api_config: dict[str, Any]) -> dict[str, Any]:
     """
-    Resuelve un campo usando dot notation.
-    Ejemplo: 'data.nested.field' → data['data']['nested']['field']
+    Configuración efectiva del pool de conexiones de una API a partir de
+    las claves max_connections, limit_per_host, keepalive_timeout,
+    dns_cache_ttl y force_close.
     """
-    keys = field_path.split(".")
-    current = data
-    for key in keys:
-        if isinstance(current, dict):
-            current = current.get(key)
-        else:
-            return None
-        if current is None:
-            return None
-    return current
+    force_close = bool(api_config.get("force_close", False))
+    return {
+        "max_connections": api_config.get("max_connections", DEFAULT_MAX_CONNECTIONS),
+        "limit_per_host": api_config.get("limit_per_host", DEFAULT_LIMIT_PER_HOST),
+        # Con force_close no hay keep-alive
+        "keepalive_timeout": None if force_close else api_config.get("keepalive_timeout", DEFAULT_KEEPALIVE_TIMEOUT),
+        "dns_cache_ttl": api_config.get("dns_cache_ttl", DEFAULT_DNS_CACHE_TTL),
+        "force_close": force_close,
+    }
 
 
-def evaluate_rule(api_response: dict[str, Any], rule: dict[str, Any], response_path: str = "data") -> bool:
+def create_connector(api_config: dict[str, Any]) -> aiohttp.TCPConnector:
+    """Crea el TCPConnector de una API con su configuración de pool y DNS."""
+    settings = connector_settings(api_config)
+    kwargs: dict[str, Any] = {
+        "limit": settings["max_connections"],
+        "limit_per_host": settings["limit_per_host"],
+        "ttl_dns_cache": settings["dns_cache_ttl"],
+        "force_close": settings["force_close"],
+    }
+    if not settings["force_close"]:
+        kwargs["keepalive_timeout"] = settings["keepalive_timeout"]
+    return aiohttp.TCPConnector(**kwargs)
+
+
+def retry_policy(api_config: dict[str, Any]) -> dict[str, Any]:
     """
-    Evalúa una única regla de validación contra la respuesta de la API.
-    Soporta dot notation para acceder a campos anidados.
+    Política de reintentos efectiva de una API (clave "retry"). Sin
+    configurar se hace un solo intento, pero los estados de retry_on
+    igual se reportan como Error en lugar de evaluar su body.
     """
-    field = rule.get("field")
-    op_str = rule.get("operator")
-    value = rule.get("value")
-
-    # Construir la ruta completa: response_path + field
-    full_path = f"{response_path}.{field}" if response_path else field
-
-    # Resolver el campo usando dot notation
-    actual_value = resolve_field(api_response, full_path)
-
-    if actual_value is None:
-        logger.debug("Campo '%s' no encontrado en la respuesta.", full_path)
-        return False
-
-    # Mapeo de operadores
-    ops = {
-        '>': operator.gt,
-        '<': operator.lt,
-        '>=': operator.ge,
-        '<=': operator.le,
-        '==': operator.eq,
-        '!=': operator.ne,
-        'in': lambda a, b: a in b,
+    retry = api_config.get("retry", {})
+    return {
+        "max_attempts": retry.get("max_attempts", DEFAULT_RETRY_MAX_ATTEMPTS),
+        "backoff_base": retry.get("backoff_base", DEFAULT_RETRY_BACKOFF_BASE),
+        "backoff_max": retry.get("backoff_max", DEFAULT_RETRY_BACKOFF_MAX),
+        "retry_on": frozenset(retry.get("retry_on", DEFAULT_RETRY_STATUSES)),
     }
 
-    op_func = ops.get(op_str)
-    if not op_func:
-        raise ValueError(f"Operador no válido: {op_str}")
 
-    # Convertir a int si es necesario para comparaciones numéricas
+def load_settings(api_config: dict[str, Any], defaults: dict[str, Any] | None = None) -> dict[str, Any]:
+    """
+    Modelo de carga efectivo de una API: sus claves "load_model",
+    "arrival", "arrival_seed", "virtual_users" y "think_time" o, si no las define, las
+    globales de defaults (ej. --load-model), como api_rps con el rps.
+    """
+    defaults = defaults or {}
+
+    def pick(key: str, fallback: Any) -> Any:
+        if api_config.get(key) is not None:
+            return api_config[key]
+        if defaults.get(key) is not None:
+            return defaults[key]
+        return fallback
+
+    return {
+        "load_model": pick("load_model", DEFAULT_LOAD_MODEL),
+        "arrival": pick("arrival", DEFAULT_ARRIVAL),
+        "arrival_seed": pick("arrival_seed", DEFAULT_ARRIVAL_SEED),
+        "virtual_users": pick("virtual_users", DEFAULT_VIRTUAL_USERS),
+        "think_time": pick("think_time", 0.0),
+    }
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Segundos indicados por un header Retry-After (en segundos o fecha HTTP)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
     try:
-        if op_str in ['>', '<', '>=', '<=']:
-            actual_value = int(actual_value)
-            value = int(value)
-    except (ValueError, TypeError):
-        logger.debug("No se pudo convertir a número para la comparación de '%s'.", field)
-        return False
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, policy: dict[str, Any], retry_after: float | None = None) -> float:
+    """
+    Espera antes del intento attempt + 1: backoff exponencial con full
+    jitter, y nunca menos que el Retry-After del proveedor.
+    """
+    cap = min(policy["backoff_max"], policy["backoff_base"] * 2 ** (attempt - 1))
+    delay = random.uniform(0, cap)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def classify(is_valid_source: bool, api_considers_valid: bool) -> str:
+    """Clasifica el resultado combinando la fuente del email y el veredicto de la API."""
+    if is_valid_source and api_considers_valid:
+        return "Valido considerado valido"
+    elif is_valid_source and not api_considers_valid:
+        return "Valido considerado invalido"
+    elif not is_valid_source and api_considers_valid:
+        return "Invalido considerado valido"
+    return "Invalido considerado invalido"
+
 
-    return op_func(actual_value, value)
+def cached_result(
+    email: str,
+    is_valid_source: bool,
+    cached_response: Any,
+    evaluator: RuleEvaluator,
+) -> dict[str, Any]:
+    """Resultado de un hit del cache: se evalúa la respuesta guardada sin tocar la red."""
+    return {
+        "email": email,
+        "duration": 0.0,
+        "classification": classify(is_valid_source, evaluator.evaluate(cached_response)),
+        "response_reason": evaluator.extract_reason(cached_response),
+        "raw_response": cached_response,
+        "cache_hit": True,
+    }
 
 
 async def process_email(
@@ -82,12 +192,100 @@ async def process_email(
     email: str,
     is_valid_source: bool,
     api_config: dict[str, Any],
+    evaluator: RuleEvaluator | None = None,
+    cache: ResponseCache | None = None,
+    acquire: Callable[[], Awaitable[float]] | None = None,
+    rate_control: AimdRateController | None = None,
+    cache_checked: bool = False,
 ) -> dict[str, Any]:
     """
     Envía un único email a la API y procesa la respuesta.
     La configuración de request (método, headers, params) es configurable por API.
+    evaluator es el RuleEvaluator precompilado; si no se pasa, se compila aquí.
+
+    Si se pasa un cache y tiene una respuesta fresca para este email, se
+    evalúa sin tocar la red (resultado con "cache_hit": True); si no, la
+    respuesta obtenida se guarda en el cache. Con cache_checked, el
+    llamador ya buscó el email en el cache (sin hit) y no se vuelve a buscar.
+
+    acquire es el turno del rate limiter (ej. TokenBucketRateLimiter.acquire):
+    se espera justo antes de enviar, así los hits del cache no consumen
+    tokens, y su lag se guarda en "scheduling_lag".
+
+    Los estados transitorios (retry_policy: 429, 5xx) se reintentan hasta
+    "max_attempts" con backoff exponencial + jitter, respetando Retry-After;
+    cada intento vuelve a pasar por acquire. duration y timings son los del
+    último intento; "attempts", "retry_wait" y "throttle_events" quedan en
+    el resultado cuando hubo reintentos. rate_control (AIMD), si se pasa,
+    se notifica de cada throttle (429/503) y de cada respuesta correcta.
+    """
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(api_config, email)
+        cached_response = None if cache_checked else cache.get(cache_key)
+        if cached_response is not None:
+            if evaluator is None:
+                evaluator = compile_rules(api_config["validation_rules"], api_config.get("response_path", "data"))
+            return cached_result(email, is_valid_source, cached_response, evaluator)
+
+    policy = retry_policy(api_config)
+    attempts = 0
+    retry_wait = 0.0
+    throttle_events = 0
+    while True:
+        attempts += 1
+        scheduling_lag = await acquire() if acquire else None
+        result = await _request_email(session, email, is_valid_source, api_config, evaluator, policy["retry_on"])
+        status = result.get("status_code")
+        retry_after = result.pop("retry_after", None)
+
+        if status in THROTTLE_STATUSES:
+            throttle_events += 1
+            if rate_control is not None:
+                rate_control.on_throttle()
+        elif rate_control is not None and result["classification"] != "Error":
+            rate_control.on_success()
+
+        if status not in policy["retry_on"] or attempts >= policy["max_attempts"]:
+            break
+        delay = backoff_delay(attempts, policy, retry_after)
+        logger.debug("HTTP %s para '%s': reintento %d en %.2fs.", status, email, attempts, delay)
+        retry_wait += delay
+        await asyncio.sleep(delay)
+
+    if scheduling_lag is not None:
+        result["scheduling_lag"] = scheduling_lag
+    if attempts > 1:
+        result["attempts"] = attempts
+        result["retry_wait"] = retry_wait
+    if throttle_events:
+        result["throttle_events"] = throttle_events
+
+    if cache_key is not None and result["classification"] != "Error":
+        cache.put(cache_key, result["raw_response"])
+
+    return result
+
+
+async def _request_email(
+    session: aiohttp.ClientSession,
+    email: str,
+    is_valid_source: bool,
+    api_config: dict[str, Any],
+    evaluator: RuleEvaluator | None = None,
+    retry_on: frozenset[int] = frozenset(DEFAULT_RETRY_STATUSES),
+) -> dict[str, Any]:
     """
-    start_time = time.time()
+    Hace la solicitud HTTP de process_email y clasifica la respuesta.
+    Si el estado HTTP está en retry_on no se evalúa el body: el resultado es
+    un Error con "status_code" (y "retry_after" si el proveedor lo indicó).
+
+    duration se mide con time.perf_counter desde el inicio de la solicitud
+    hasta terminar de leer el body; "timings" desglosa las fases
+    (ver tracing.PHASES) cuando la sesión usa create_trace_config().
+    """
+    timings = RequestTimings()
+    start_time = timings.start
 
     api_key = api_config["api_key"]
     endpoint = api_config["endpoint"]
@@ -107,48 +305,57 @@ async def process_email(
     try:
         if method == "GET":
             url = f"{endpoint}?{param_name}={email}"
-            async with session.get(url, headers=headers, timeout=timeout) as response:
-                duration = time.time() - start_time
-                result_json = await response.json()
+            request = session.get(url, headers=headers, timeout=timeout, trace_request_ctx=timings)
         elif method == "POST":
             url = endpoint
             payload = {param_name: email}
-            async with session.post(url, headers=headers, json=payload, timeout=timeout) as response:
-                duration = time.time() - start_time
-                result_json = await response.json()
+            request = session.post(url, headers=headers, json=payload, timeout=timeout, trace_request_ctx=timings)
         else:
             raise ValueError(f"Método HTTP no soportado: {method}")
 
-        # Evaluar todas las reglas de validación
-        api_considers_valid = all(
-            evaluate_rule(result_json, rule, response_path) for rule in validation_rules
-        )
+        async with request as response:
+            if response.status in retry_on:
+                # 429/5xx: el body no es una respuesta de validación
+                await response.read()
+                timings.mark_body_read()
+                return {
+                    "email": email,
+                    "duration": timings.total,
+                    "classification": "Error",
+                    "error_message": f"HTTP {response.status}",
+                    "status_code": response.status,
+                    "retry_after": parse_retry_after(response.headers.get("Retry-After")),
+                    "timings": timings.phases(),
+                }
+            result_json = await response.json(loads=json_codec.loads)
+            timings.mark_body_read()
+            raw_body = (await response.read()).decode("utf-8", "replace") if api_config.get("keep_raw_body") else None
+        duration = timings.total
 
-        if is_valid_source and api_considers_valid:
-            classification = "Valido considerado valido"
-        elif is_valid_source and not api_considers_valid:
-            classification = "Valido considerado invalido"
-        elif not is_valid_source and api_considers_valid:
-            classification = "Invalido considerado valido"
-        else:
-            classification = "Invalido considerado invalido"
+        if evaluator is None:
+            evaluator = compile_rules(validation_rules, response_path)
+
+        # Evaluar todas las reglas de validación
+        api_considers_valid = evaluator.evaluate(result_json)
+        classification = classify(is_valid_source, api_considers_valid)
 
         # Extraer reason de la respuesta usando response_path
-        response_data = resolve_field(result_json, response_path) if response_path else result_json
-        response_reason = None
-        if isinstance(response_data, dict):
-            response_reason = response_data.get("reason")
+        response_reason = evaluator.extract_reason(result_json)
 
-        return {
+        result = {
             "email": email,
             "duration": duration,
             "classification": classification,
             "response_reason": response_reason,
             "raw_response": result_json,
+            "timings": timings.phases(),
         }
+        if raw_body is not None:
+            result["raw_body"] = raw_body
+        return result
 
     except asyncio.TimeoutError:
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
         logger.warning("Timeout para email '%s' después de %.2fs.", email, duration)
         return {
             "email": email,
@@ -157,7 +364,7 @@ async def process_email(
             "error_message": f"Timeout después de {timeout_seconds}s",
         }
     except aiohttp.ClientError as e:
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
         logger.error("Error de cliente para '%s': %s", email, str(e))
         return {
             "email": email,
@@ -166,7 +373,7 @@ async def process_email(
             "error_message": str(e),
         }
     except Exception as e:
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
         logger.error("Error inesperado para '%s': %s", email, str(e))
         return {
             "email": email,
@@ -182,12 +389,44 @@ async def process_email_webhook(
     is_valid_source: bool,
     api_config: dict[str, Any],
     webhook_server: WebhookServer,
+    evaluator: RuleEvaluator | None = None,
+    acquire: Callable[[], Awaitable[float]] | None = None,
 ) -> dict[str, Any]:
     """
     Envía un email a la API en modo webhook: incluye un callback_url
     y espera a que el proveedor envíe el resultado vía POST.
+    evaluator debe estar compilado sobre webhook.result_path.
+    acquire funciona igual que en process_email.
+    """
+    scheduling_lag = await acquire() if acquire else None
+    result = await _request_email_webhook(session, email, is_valid_source, api_config, webhook_server, evaluator)
+    if scheduling_lag is not None:
+        result["scheduling_lag"] = scheduling_lag
+    return result
+
+
+async def _request_email_webhook(
+    session: aiohttp.ClientSession,
+    email: str,
+    is_valid_source: bool,
+    api_config: dict[str, Any],
+    webhook_server: WebhookServer,
+    evaluator: RuleEvaluator | None = None,
+) -> dict[str, Any]:
     """
-    start_time = time.time()
+    Hace la solicitud de process_email_webhook y espera el callback.
+
+    Sin "id_field", cada solicitud lleva su propio callback_url
+    (/webhook/{request_id}). Con "id_field", todas usan la URL fija del
+    canal de la API y el callback se correlaciona por el ID de trabajo que
+    devuelve la respuesta inicial en esa ruta; el proveedor puede enviar
+    los resultados de a uno o en lotes ("batch_path", "callback_id_field").
+
+    duration cubre hasta la llegada del callback; "timings" desglosa las
+    fases de la solicitud inicial.
+    """
+    timings = RequestTimings()
+    start_time = timings.start
 
     api_key = api_config["api_key"]
     endpoint = api_config["endpoint"]
@@ -207,8 +446,16 @@ async def process_email_webhook(
     headers = {"x-mails-api-key": api_key}
     headers.update(custom_headers)
 
-    # Crear callback pendiente en el servidor de webhooks
-    request_id, callback_url, future = webhook_server.create_callback()
+    if id_field:
+        # URL fija del canal: el Future se registra al conocer el ID de trabajo
+        channel = api_config.get("name", endpoint)
+        callback_url = webhook_server.add_channel(
+            channel, webhook_cfg.get("callback_id_field", id_field), webhook_cfg.get("batch_path"),
+        )
+        request_id, future = None, None
+    else:
+        # Crear callback pendiente en el servidor de webhooks
+        request_id, callback_url, future = webhook_server.create_callback(api=api_config.get("name", endpoint))
 
     # Construir el payload con el callback URL
     payload: dict[str, Any] = {param_name: email}
@@ -225,19 +472,37 @@ async def process_email_webhook(
     try:
         # 1. Enviar solicitud a la API
         if method == "POST":
-            async with session.post(endpoint, headers=headers, json=payload, timeout=timeout) as response:
-                initial_json = await response.json()
+            async with session.post(
+                endpoint, headers=headers, json=payload, timeout=timeout, trace_request_ctx=timings,
+            ) as response:
+                initial_json = await response.json(loads=json_codec.loads)
+                timings.mark_body_read()
         elif method == "GET":
             params = {param_name: email}
             if callback_wrapper_param:
                 params[f"{callback_wrapper_param}[{callback_param}]"] = callback_url
             else:
                 params[callback_param] = callback_url
-            async with session.get(endpoint, headers=headers, params=params, timeout=timeout) as response:
-                initial_json = await response.json()
+            async with session.get(
+                endpoint, headers=headers, params=params, timeout=timeout, trace_request_ctx=timings,
+            ) as response:
+                initial_json = await response.json(loads=json_codec.loads)
+                timings.mark_body_read()
         else:
             raise ValueError(f"Método HTTP no soportado: {method}")
 
+        if id_field:
+            request_id = resolve_field(initial_json, id_field) if isinstance(initial_json, dict) else None
+            if request_id is None:
+                return {
+                    "email": email,
+                    "duration": time.perf_counter() - start_time,
+                    "classification": "Error",
+                    "error_message": f"La respuesta inicial no tiene '{id_field}'",
+                    "timings": timings.phases(),
+                }
+            future = webhook_server.expect(channel, request_id)
+
         logger.debug(
             "Solicitud webhook enviada para '%s', request_id=%s, respuesta inicial: %s",
             email, request_id, initial_json,
@@ -247,7 +512,7 @@ async def process_email_webhook(
         try:
             webhook_payload = await asyncio.wait_for(future, timeout=webhook_timeout)
         except asyncio.TimeoutError:
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
             logger.warning(
                 "Timeout de webhook para '%s' (request_id=%s) después de %ds.",
                 email, request_id, webhook_timeout,
@@ -259,28 +524,17 @@ async def process_email_webhook(
                 "error_message": f"Webhook timeout después de {webhook_timeout}s",
             }
 
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
 
-        # 3. Evaluar reglas de validación sobre el payload del webhook
-        api_considers_valid = all(
-            evaluate_rule(webhook_payload, rule, result_path)
-            for rule in validation_rules
-        )
+        if evaluator is None:
+            evaluator = compile_rules(validation_rules, result_path)
 
-        if is_valid_source and api_considers_valid:
-            classification = "Valido considerado valido"
-        elif is_valid_source and not api_considers_valid:
-            classification = "Valido considerado invalido"
-        elif not is_valid_source and api_considers_valid:
-            classification = "Invalido considerado valido"
-        else:
-            classification = "Invalido considerado invalido"
+        # 3. Evaluar reglas de validación sobre el payload del webhook
+        api_considers_valid = evaluator.evaluate(webhook_payload)
+        classification = classify(is_valid_source, api_considers_valid)
 
         # Extraer reason del payload del webhook
-        response_data = resolve_field(webhook_payload, result_path) if result_path else webhook_payload
-        response_reason = None
-        if isinstance(response_data, dict):
-            response_reason = response_data.get("reason")
+        response_reason = evaluator.extract_reason(webhook_payload)
 
         return {
             "email": email,
@@ -288,10 +542,11 @@ async def process_email_webhook(
             "classification": classification,
             "response_reason": response_reason,
             "raw_response": webhook_payload,
+            "timings": timings.phases(),
         }
 
     except asyncio.TimeoutError:
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
         logger.warning("Timeout de solicitud para '%s' después de %.2fs.", email, duration)
         return {
             "email": email,
@@ -300,7 +555,7 @@ async def process_email_webhook(
             "error_message": f"Timeout de solicitud después de {webhook_timeout}s",
         }
     except aiohttp.ClientError as e:
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
         logger.error("Error de cliente para '%s': %s", email, str(e))
         return {
             "email": email,
@@ -309,7 +564,7 @@ async def process_email_webhook(
             "error_message": str(e),
         }
     except Exception as e:
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
         logger.error("Error inesperado (webhook) para '%s': %s", email, str(e))
         return {
             "email": email,
@@ -317,54 +572,495 @@ async def process_email_webhook(
             "classification": "Error",
             "error_message": f"Error inesperado: {str(e)}",
         }
+    finally:
+        # Si la solicitud falló antes de esperar, el callback ya no se espera
+        if future is not None and not future.done():
+            future.cancel()
+
+
+def default_max_in_flight(api_config: dict[str, Any], rps: float) -> int:
+    """
+    Límite de solicitudes en vuelo por defecto: rps × timeout (ley de Little).
+    Es el máximo que puede acumularse si cada solicitud agota su timeout,
+    así que no reduce la tasa de envío pero acota la memoria.
+    """
+    timeout_seconds = api_config.get("timeout", 30)
+    if api_config.get("mode", "sync") == "webhook":
+        timeout_seconds = api_config.get("webhook", {}).get("timeout", 120)
+    return max(1, math.ceil(rps * timeout_seconds))
 
 
 async def run_api_tests(
-    emails_to_process: list[tuple[str, bool]],
+    emails_to_process: Iterable[tuple[str, bool]],
     api_config: dict[str, Any],
     rps: int,
     on_progress: Any = None,
     webhook_server: WebhookServer | None = None,
-) -> list[dict[str, Any]]:
+    rate_limiter: TokenBucketRateLimiter | None = None,
+    run_metrics: dict[str, Any] | None = None,
+    max_in_flight: int | None = None,
+    total: int | None = None,
+    sink: JsonlResultSink | None = None,
+    cache: ResponseCache | None = None,
+    skip_emails: Container[str] | None = None,
+    load: dict[str, Any] | None = None,
+    store_results: bool = True,
+    early_stop: EarlyStopController | ShardEarlyStop | None = None,
+) -> ResultStore:
     """
-    Ejecuta las pruebas de API para una lista de emails.
+    Ejecuta las pruebas de API para una secuencia de (email, es_válido).
     on_progress es un callback opcional que recibe (completados, total).
     Si api_config["mode"] == "webhook" y webhook_server está disponible,
     usa el flujo de webhook en lugar del flujo síncrono.
+
+    emails_to_process puede ser cualquier iterable (incluso un generador):
+    se consume a medida que hay cupo, con como mucho max_in_flight
+    solicitudes en vuelo, así que la memoria no depende del tamaño del corpus. El cupo es
+    api_config["max_in_flight"] si la API lo define, si no el max_in_flight
+    global y, si tampoco se indica, default_max_in_flight(). total (los
+    emails a enviar, sin contar skip_emails) se usa para el progreso
+    cuando el iterable no tiene len().
+
+    El envío se controla con un TokenBucketRateLimiter (compartido por los
+    flujos sync y webhook); si no se pasa uno, se crea con rps y el
+    "burst" de la API. Si se pasa run_metrics, se completa con las
+    métricas de la ejecución (ej. "rate_limiter", el LatencyHistogram de
+    la API y el tiempo real "wall_clock_time") para calculate_statistics.
+
+    Los resultados se devuelven en un ResultStore (columnar). Si se pasa un
+    sink, cada resultado se escribe completo (con el nombre de la API)
+    apenas termina, y en memoria se conserva sin raw_response (salvo que
+    el sink tenga drop_raw_response en False). Con store_results=False los
+    resultados solo van al sink y se devuelve un ResultStore vacío (los
+    workers de multiprocess_runner los envían así al proceso principal).
+
+    skip_emails son los emails ya procesados en una ejecución anterior
+    (ver checkpoint.RunCheckpoint): se saltean sin enviar la solicitud,
+    cediendo el event loop cada SKIP_YIELD_EVERY para no demorar las
+    respuestas en vuelo.
+
+    Con cache (solo modo sync), las respuestas frescas se reutilizan sin
+    enviar la solicitud ni consumir tokens del rate limiter.
+
+    En modo sync, "retry" define la política de reintentos (ver
+    retry_policy) y "adaptive_rate" activa un AimdRateController que baja
+    el rate del limiter ante 429/503 y lo recupera cuando cede el throttling.
+
+    Si la API define "sweep_field", cada resultado guarda ese campo numérico
+    de la respuesta en "score" (antes de descartar raw_response).
+
+    Con "response_mode": "fields", raw_response se reduce a los campos de
+    las reglas, el "reason" y el sweep_field (RuleEvaluator.project) en
+    lugar de conservar el objeto completo. Con "keep_raw_body" (modo sync)
+    se guarda además el body tal como llegó en "raw_body".
+
+    El modelo de carga sale de load_settings(api_config, load):
+    - "paced" (por defecto): el token bucket descripto arriba.
+    - "open": cada solicitud tiene un tiempo de envío previsto en un
+      ArrivalSchedule ("arrival": "constant" o "poisson") que no se corre
+      si el cliente se atrasa; además de duration, cada resultado guarda
+      "corrected_latency", medida desde el envío previsto.
+    - "closed": "virtual_users" usuarios virtuales que envían la siguiente
+      solicitud al recibir la respuesta (tras "think_time" segundos), sin
+      rate limit.
+
+    Con "load_profile" (modelos paced y open) el rate sigue las etapas del
+    perfil (ver load_profile.LoadProfile): cada resultado guarda su "stage"
+    y la ejecución termina con la última etapa o al superar los umbrales
+    de p99 / tasa de errores. run_metrics["load_profile"] resume cada etapa
+    y el throughput máximo sostenible.
+
+    Con "early_stop" (ver early_stop.EarlyStopController) las tasas de
+    FP/FN y sus intervalos se actualizan con cada resultado: no se envían
+    más emails de una etiqueta cuya estimación convergió, y la ejecución
+    termina cuando convergen las dos o se agota el presupuesto de errores.
+    run_metrics["early_stop"] trae las estimaciones y las solicitudes
+    ahorradas. Si se pasa early_stop se usa en lugar del de api_config (los
+    workers de multiprocess_runner pasan un ShardEarlyStop que sigue las
+    decisiones del proceso principal).
     """
-    delay = 1.0 / rps
-    results: list[dict[str, Any]] = []
-    total = len(emails_to_process)
+    settings = load_settings(api_config, load)
+    load_model = settings["load_model"]
+    schedule = None
+    if load_model == "open":
+        schedule = ArrivalSchedule(rps, settings["arrival"], seed=settings["arrival_seed"])
+        pacer = schedule
+        rate_limiter = None
+    elif load_model == "closed":
+        pacer = rate_limiter = None
+    else:
+        if rate_limiter is None:
+            rate_limiter = TokenBucketRateLimiter(rps, burst=api_config.get("burst", 1))
+        pacer = rate_limiter
+    think_time = settings["think_time"] if load_model == "closed" else 0.0
 
+    # Perfil escalonado (opcional): el rate de cada etapa reemplaza a rps
+    profile = None
+    if "load_profile" in api_config:
+        if pacer is None:
+            logger.warning(
+                "load_profile no aplica al modelo closed ('%s'): se ignora.", api_config.get("name", "?"),
+            )
+        else:
+            profile = LoadProfile.from_config(api_config["load_profile"])
+            pacer.set_rate(profile.rate(0))
+            rps = max(stage["rps"] for stage in profile.stages)  # para el max_in_flight por defecto
+
+    if early_stop is None and "early_stop" in api_config:
+        early_stop = EarlyStopController.from_config(api_config["early_stop"])
+
+    rate_control = None
+    if "adaptive_rate" in api_config and pacer is not None:
+        adaptive = api_config["adaptive_rate"]
+        # Techo: el rate inicial (con perfil, el de la etapa en curso)
+        rate_control = AimdRateController(
+            pacer,
+            min_rate=adaptive.get("min_rps", 1.0),
+            decrease_factor=adaptive.get("decrease_factor", 0.5),
+            increase_step=adaptive.get("increase_step", 1.0),
+            cooldown=adaptive.get("cooldown", 1.0),
+        )
+    if load_model == "closed":
+        max_in_flight = settings["virtual_users"]
+    else:
+        # Como con rps: el valor de la API tiene prioridad sobre el global
+        max_in_flight = api_config.get("max_in_flight") or max_in_flight or default_max_in_flight(api_config, rps)
+    if total is None:
+        total = len(emails_to_process) if hasattr(emails_to_process, "__len__") else 0
+        if skip_emails:
+            total = max(0, total - len(skip_emails))
+
+    results = ResultStore()
+    completed = 0
+    email_iter = iter(emails_to_process)
+
+    api_name = api_config.get("name", "?")
     mode = api_config.get("mode", "sync")
     use_webhook = mode == "webhook" and webhook_server is not None
 
+    # Compilar las reglas una sola vez para toda la ejecución
+    response_path = api_config.get("response_path", "data")
     if use_webhook:
-        logger.info("Ejecutando pruebas en modo webhook para '%s'.", api_config.get("name", "?"))
+        result_path = api_config.get("webhook", {}).get("result_path", response_path)
+        evaluator = compile_rules(api_config["validation_rules"], result_path)
+        logger.info("Ejecutando pruebas en modo webhook para '%s'.", api_name)
     else:
-        logger.info("Ejecutando pruebas en modo sync para '%s'.", api_config.get("name", "?"))
+        result_path = response_path
+        evaluator = compile_rules(api_config["validation_rules"], response_path)
+        logger.info("Ejecutando pruebas en modo sync para '%s'.", api_name)
+    if load_model != DEFAULT_LOAD_MODEL:
+        logger.info("Modelo de carga '%s' para '%s': %s.", load_model, api_name, settings)
 
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for email, is_valid_source in emails_to_process:
-            if use_webhook:
-                task = asyncio.create_task(
-                    process_email_webhook(
-                        session, email, is_valid_source, api_config, webhook_server,
-                    )
+    # Campo numérico para el barrido de umbrales (calculate_threshold_sweep)
+    sweep_field = api_config.get("sweep_field")
+    sweep_keys = field_keys(sweep_field, result_path) if sweep_field else None
+    fields_only = api_config.get("response_mode", DEFAULT_RESPONSE_MODE) == "fields"
+    extra_paths = (sweep_keys,) if sweep_keys else ()
+
+    def acquire_arrival(intended: float) -> Callable[[], Awaitable[float]]:
+        """acquire para el modelo open: solo el primer intento tiene llegada prevista."""
+        sent = False
+
+        async def acquire() -> float:
+            nonlocal sent
+            if sent:
+                return 0.0
+            sent = True
+            return schedule.record_send(intended)
+        return acquire
+
+    def acquire_paced(first_lag: float) -> Callable[[], Awaitable[float]]:
+        """acquire con el primer token ya tomado al despachar (los reintentos toman el suyo)."""
+        sent = False
+
+        async def acquire() -> float:
+            nonlocal sent
+            if sent:
+                return await rate_limiter.acquire()
+            sent = True
+            return first_lag
+        return acquire
+
+    async def handle(
+        session: aiohttp.ClientSession, email: str, is_valid_source: bool,
+        intended: float | None = None, stage: int | None = None, first_lag: float | None = None,
+        cached_response: Any = None,
+    ) -> None:
+        nonlocal completed
+        if schedule is not None:
+            acquire = acquire_arrival(intended)
+        elif first_lag is not None:
+            acquire = acquire_paced(first_lag)
+        else:
+            acquire = rate_limiter.acquire if rate_limiter is not None else None
+        try:
+            if cached_response is not None:
+                result = cached_result(email, is_valid_source, cached_response, evaluator)
+            elif use_webhook:
+                result = await process_email_webhook(
+                    session, email, is_valid_source, api_config, webhook_server,
+                    evaluator=evaluator, acquire=acquire,
                 )
             else:
+                # El cache ya se consultó al despachar
+                result = await process_email(
+                    session, email, is_valid_source, api_config,
+                    evaluator=evaluator, cache=cache, acquire=acquire,
+                    rate_control=rate_control, cache_checked=True,
+                )
+            if intended is not None and not result.get("cache_hit"):
+                result["corrected_latency"] = schedule.elapsed_since(intended)
+            if think_time:
+                await asyncio.sleep(think_time)
+        finally:
+            in_flight.release()
+        result["is_valid_source"] = is_valid_source
+        if stage is not None:
+            result["stage"] = stage + 1
+            profile.record_result(stage, result)
+        if early_stop is not None:
+            early_stop.record_result(result)
+        if sweep_keys and result.get("raw_response") is not None:
+            result["score"] = extract_score(result["raw_response"], sweep_keys)
+        if fields_only and result.get("raw_response") is not None:
+            result["raw_response"] = evaluator.project(result["raw_response"], extra_paths)
+        if sink is not None:
+            sink.write(result, api=api_name)
+            if sink.drop_raw_response:
+                result.pop("raw_response", None)
+                result.pop("raw_body", None)
+        if "duration" in result and not result.get("cache_hit"):
+            latency.record(result["duration"])
+        if "corrected_latency" in result:
+            corrected_latency.record(result["corrected_latency"])
+        if store_results:
+            results.append(result)
+        completed += 1
+        if on_progress:
+            on_progress(completed, total)
+
+    # Semáforo = cupo de solicitudes en vuelo; como mucho max_in_flight
+    # tareas vivas a la vez, sin importar el tamaño del corpus.
+    in_flight = asyncio.Semaphore(max_in_flight)
+    running: set[asyncio.Task] = set()
+
+    # Histograma de latencias actualizado a medida que llegan los resultados
+    latency = LatencyHistogram()
+    corrected_latency = LatencyHistogram()
+
+    pool_stats = ConnectionPoolStats()
+    session = aiohttp.ClientSession(
+        connector=create_connector(api_config),
+        trace_configs=[create_trace_config(pool_stats)],
+    )
+
+    active_stage = 0
+    passed_over = 0  # emails salteados, para ceder el loop cada SKIP_YIELD_EVERY
+    started = time.perf_counter()
+    async with session:
+        try:
+            for email, is_valid_source in email_iter:
+                if skip_emails and email in skip_emails:
+                    passed_over += 1
+                    if passed_over % SKIP_YIELD_EVERY == 0:
+                        await asyncio.sleep(0)
+                    continue
+                if early_stop is not None and not early_stop.should_send(is_valid_source):
+                    if early_stop.stopped:
+                        break
+                    early_stop.record_skipped()
+                    passed_over += 1
+                    if passed_over % SKIP_YIELD_EVERY == 0:
+                        await asyncio.sleep(0)
+                    continue
+                # Open loop: la llegada prevista no espera al cupo en vuelo
+                intended = await schedule.next_arrival() if schedule is not None else None
+                await in_flight.acquire()
+                stage = first_lag = None
+                # Los hits del cache no consumen tokens ni tocan la red
+                cached_response = None
+                if cache is not None and not use_webhook:
+                    cached_response = cache.get(cache.make_key(api_config, email))
+                if rate_limiter is not None and cached_response is None:
+                    # El token se toma al despachar: el loop avanza al rate del
+                    # limiter y solo existen tareas para solicitudes que ya pueden
+                    # salir (no hay tareas esperando turno), así que el semáforo
+                    # cuenta solicitudes realmente en vuelo. Con perfil, además,
+                    # la solicitud sale con el rate de la etapa vigente, y con
+                    # parada temprana no quedan solicitudes esperando tras converger.
+                    first_lag = await rate_limiter.acquire()
+                if early_stop is not None and not early_stop.should_send(is_valid_source):
+                    # Convergió mientras se esperaba el cupo o el token
+                    in_flight.release()
+                    if early_stop.stopped:
+                        break
+                    early_stop.record_skipped()
+                    passed_over += 1
+                    continue
+                if profile is not None:
+                    stage = profile.current_stage()
+                    if stage is None:
+                        in_flight.release()
+                        logger.info(
+                            "Perfil de carga de '%s' %s: no se envían más solicitudes.",
+                            api_name, "detenido" if profile.stopped else "completado",
+                        )
+                        break
+                    if stage != active_stage:
+                        active_stage = stage
+                        pacer.set_rate(profile.rate(stage))
+                        if rate_control is not None:
+                            rate_control.set_max_rate(profile.rate(stage))
+                        logger.info("Etapa %d del perfil de '%s': %s RPS.", stage + 1, api_name, profile.rate(stage))
+                    profile.record_sent(stage)
+                if early_stop is not None:
+                    early_stop.record_sent()
                 task = asyncio.create_task(
-                    process_email(session, email, is_valid_source, api_config)
+                    handle(session, email, is_valid_source, intended, stage, first_lag, cached_response)
                 )
-            tasks.append(task)
-            await asyncio.sleep(delay)
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if profile is not None:
+                profile.end_sending()
+            if running:
+                await asyncio.gather(*running)
+        except BaseException:
+            for task in running:
+                task.cancel()
+            raise
+    wall_clock_time = time.perf_counter() - started
 
-        for i, coro in enumerate(asyncio.as_completed(tasks)):
-            result = await coro
-            results.append(result)
-            if on_progress:
-                on_progress(i + 1, total)
+    if profile is not None:
+        profile.finish()
+    if early_stop is not None and early_stop.stopped:
+        logger.info("Parada temprana de '%s': %s.", api_name, early_stop.stop_reason)
+
+    limiter_stats = pacer.stats() if pacer is not None else {}
+    if run_metrics is not None:
+        run_metrics["rate_limiter"] = limiter_stats
+        run_metrics["max_in_flight"] = max_in_flight
+        run_metrics["latency_histogram"] = latency
+        run_metrics["wall_clock_time"] = wall_clock_time
+        run_metrics["load_model"] = {"model": load_model, **load_model_details(settings)}
+        if schedule is not None:
+            run_metrics["corrected_latency_histogram"] = corrected_latency
+        if profile is not None:
+            run_metrics["load_profile"] = profile.summary()
+        if early_stop is not None:
+            run_metrics["early_stop"] = early_stop.summary(total)
+        if rate_control is not None:
+            run_metrics["adaptive_rate"] = rate_control.stats()
+        if use_webhook:
+            # El servidor es compartido: solo los contadores de esta API
+            run_metrics["webhook"] = webhook_server.stats(api_name)
+        run_metrics["connection_pool"] = {
+            **connector_settings(api_config),
+            **pool_stats.stats(),
+        }
 
-    logger.info("Prueba completada: %d emails procesados.", len(results))
+    achieved_rps = limiter_stats.get("achieved_rps")
+    if achieved_rps is None and wall_clock_time > 0:
+        achieved_rps = completed / wall_clock_time
+    logger.info(
+        "Prueba completada: %d emails procesados (rps objetivo=%s, logrado=%s).",
+        completed, limiter_stats.get("target_rps", "n/a"),
+        f"{achieved_rps:.2f}" if achieved_rps else "n/a",
+    )
     return results
+
+
+def load_model_details(settings: dict[str, Any]) -> dict[str, Any]:
+    """Parámetros de load_settings() que aplican a su modelo de carga."""
+    if settings["load_model"] == "open":
+        if settings["arrival"] == "poisson":
+            return {"arrival": settings["arrival"], "arrival_seed": settings["arrival_seed"]}
+        return {"arrival": settings["arrival"]}
+    if settings["load_model"] == "closed":
+        return {"virtual_users": settings["virtual_users"], "think_time": settings["think_time"]}
+    return {}
+
+
+def api_rps(api_config: dict[str, Any], default_rps: int) -> int:
+    """RPS efectivo de una API: su clave "rps" si está definida, o el global."""
+    return api_config.get("rps") or default_rps
+
+
+async def run_multi_api_tests(
+    emails_to_process: Iterable[tuple[str, bool]],
+    api_configs: list[dict[str, Any]],
+    rps: int,
+    on_progress: Any = None,
+    webhook_server: WebhookServer | None = None,
+    max_in_flight: int | None = None,
+    total: int | None = None,
+    sink: JsonlResultSink | None = None,
+    cache: ResponseCache | None = None,
+    skip_emails_by_api: dict[str, Container[str]] | None = None,
+    load: dict[str, Any] | None = None,
+) -> tuple[dict[str, ResultStore], dict[str, dict[str, Any]]]:
+    """
+    Prueba todas las APIs al mismo tiempo, repartiendo el mismo stream de
+    emails a cada una. Cada API corre su propio run_api_tests, con su propio
+    rate limiter ("rps" de la API o el global), límite de solicitudes en
+    vuelo y sesión HTTP con su propio connector, así que todas se miden en la misma ventana de tiempo.
+
+    Si emails_to_process es re-iterable (ej. una lista), cada API lo recorre
+    por su cuenta; si es un iterador de un solo uso se reparte con
+    itertools.tee (que retiene los emails que la API más lenta aún no leyó).
+
+    on_progress recibe (api_name, completados, total). El sink, si se pasa,
+    es compartido: cada línea lleva el nombre de su API. skip_emails_by_api
+    indica, por API, los emails ya procesados, y load el modelo de carga
+    global (ver run_api_tests).
+
+    Returns:
+        Tupla (resultados por API, run_metrics por API).
+    """
+    if total is None and hasattr(emails_to_process, "__len__"):
+        total = len(emails_to_process)
+
+    if iter(emails_to_process) is emails_to_process:
+        streams = itertools.tee(emails_to_process, len(api_configs))
+    else:
+        streams = [emails_to_process] * len(api_configs)
+
+    metrics_by_api: dict[str, dict[str, Any]] = {api["name"]: {} for api in api_configs}
+
+    def progress_for(api_name: str) -> Any:
+        if not on_progress:
+            return None
+        return lambda completed, total_count: on_progress(api_name, completed, total_count)
+
+    skip_by_api = skip_emails_by_api or {}
+
+    def total_for(api_name: str) -> int | None:
+        """total sin los emails que esa API ya procesó."""
+        skip = skip_by_api.get(api_name)
+        return max(0, total - len(skip)) if total and skip else total
+
+    logger.info("Ejecutando %d APIs en paralelo.", len(api_configs))
+
+    runs = [
+        run_api_tests(
+            stream,
+            api_config,
+            api_rps(api_config, rps),
+            on_progress=progress_for(api_config["name"]),
+            webhook_server=webhook_server,
+            run_metrics=metrics_by_api[api_config["name"]],
+            max_in_flight=max_in_flight,
+            total=total_for(api_config["name"]),
+            sink=sink,
+            cache=cache,
+            skip_emails=skip_by_api.get(api_config["name"]),
+            load=load,
+        )
+        for stream, api_config in zip(streams, api_configs)
+    ]
+    all_results = await asyncio.gather(*runs)
+
+    results_by_api = {
+        api_config["name"]: results
+        for api_config, results in zip(api_configs, all_results)
+    }
+    return results_by_api, metrics_by_api
@@ -1,6 +1,7 @@
 
 import os
 import sys
+import multiprocessing
 import webview
 from desktop_api import DesktopApi
 
@@ -39,5 +40,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # Necesario para los workers multiproceso en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
     main()
 
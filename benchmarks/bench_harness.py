@@ -0,0 +1,325 @@
+"""
+Benchmark del costo del propio harness por solicitud, con umbrales de
+regresión.
+
+Cada escenario corre en un proceso nuevo (para medir su pico de RSS) a
+los tamaños de corpus indicados:
+- run_api_tests: flujo sync contra el proveedor simulado (mock_provider,
+  en otro proceso y con latencia 0), sin límite de rate efectivo.
+- webhook: el mismo flujo en modo webhook, con el WebhookServer local.
+- rules: evaluate_rule (por llamada) y el RuleEvaluator compilado.
+- statistics: calculate_statistics sobre un ResultStore.
+- save_json: save_results_to_json con el detalle de todos los resultados.
+
+Se reporta throughput, CPU del cliente por solicitud, latencia observada
+(con un servidor de latencia 0 es el overhead de cliente + loopback) y
+pico de RSS. Con --save-baseline se guardan como línea base (JSON); con
+--baseline se comparan contra una y el proceso termina con código 1 si
+alguna métrica empeora más que su umbral.
+
+Uso:
+    python benchmarks/bench_harness.py --sizes 10000,100000 --save-baseline harness_baseline.json
+    python benchmarks/bench_harness.py --sizes 10000,100000 --baseline harness_baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import resource
+except ImportError:  # resource no existe en Windows: sin pico de RSS
+    resource = None
+
+from api_client import run_api_tests  # noqa: E402
+from file_handler import save_results_to_json  # noqa: E402
+from mock_provider import MockProvider  # noqa: E402
+from result_store import CLASSIFICATIONS, ResultStore  # noqa: E402
+from rule_engine import compile_rules, evaluate_rule  # noqa: E402
+from stats_calculator import calculate_statistics  # noqa: E402
+from webhook_server import WebhookServer  # noqa: E402
+
+DEFAULT_SIZES = (10_000,)
+# Máximo empeoramiento relativo permitido por métrica (el resto usa "default")
+DEFAULT_THRESHOLDS = {"default": 0.30, "peak_rss_mb": 0.15}
+# Métricas en las que más es mejor; en las demás, menos es mejor
+HIGHER_IS_BETTER = frozenset({"throughput_rps"})
+
+RULES = [
+    {"field": "score", "operator": ">=", "value": "50"},
+    {"field": "result", "operator": "in", "value": ["deliverable", "risky"]},
+]
+
+
+def peak_rss_mb() -> float | None:
+    """Pico de memoria residente del proceso (MB), o None si no se puede medir."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_emails(n: int) -> list[tuple[str, bool]]:
+    return [(f"invalid{i}@example.com", False) if i % 4 == 0 else (f"user{i}@example.com", True) for i in range(n)]
+
+
+# ── Proveedor simulado en un proceso aparte ─────────────────────────
+
+def _serve_provider(url_queue: multiprocessing.Queue, webhook: bool) -> None:
+    async def serve():
+        async with MockProvider(webhook=webhook) as provider:
+            url_queue.put(provider.url)
+            await asyncio.Event().wait()
+    asyncio.run(serve())
+
+
+def start_provider(webhook: bool = False) -> tuple[multiprocessing.Process, str]:
+    """Levanta el proveedor simulado en otro proceso, para no sumar su CPU a la del cliente."""
+    context = multiprocessing.get_context("spawn")
+    url_queue = context.Queue()
+    process = context.Process(target=_serve_provider, args=(url_queue, webhook), daemon=True)
+    process.start()
+    return process, url_queue.get(timeout=30)
+
+
+# ── Escenarios ──────────────────────────────────────────────────────
+
+def _api_config(url: str, webhook: bool) -> dict:
+    config = {
+        "name": "Mock",
+        "api_key": "mock",
+        "endpoint": url,
+        "method": "POST" if webhook else "GET",
+        "validation_rules": RULES,
+        "max_in_flight": 256,
+        "max_connections": 256,
+    }
+    if webhook:
+        config.update({"mode": "webhook", "webhook": {"callback_param": "callback_url", "timeout": 60}})
+    return config
+
+
+def _client_metrics(n: int, wall: float, cpu: float, run_metrics: dict) -> dict:
+    percentiles = run_metrics["latency_histogram"].percentiles()
+    return {
+        "throughput_rps": n / wall,
+        "cpu_us_per_request": cpu / n * 1e6,
+        "latency_p50_ms": percentiles["p50"] * 1000,
+        "latency_p99_ms": percentiles["p99"] * 1000,
+    }
+
+
+def scenario_run_api_tests(n: int, webhook: bool = False) -> dict:
+    provider, url = start_provider(webhook)
+    try:
+        async def run():
+            server = None
+            if webhook:
+                server = WebhookServer(host="127.0.0.1", port=0)
+                await server.start()
+            try:
+                run_metrics = {}
+                results = await run_api_tests(
+                    build_emails(n), _api_config(url, webhook), 1_000_000,
+                    webhook_server=server, run_metrics=run_metrics,
+                )
+            finally:
+                if server is not None:
+                    await server.stop()
+            return results, run_metrics
+
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        results, run_metrics = asyncio.run(run())
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    finally:
+        provider.terminate()
+        provider.join()
+
+    errors = results.classification_counts().get("Error", 0)
+    if errors:
+        raise RuntimeError(f"{errors} solicitudes con error contra el proveedor simulado.")
+    return _client_metrics(n, wall, cpu, run_metrics)
+
+
+def scenario_webhook(n: int) -> dict:
+    return scenario_run_api_tests(n, webhook=True)
+
+
+def scenario_rules(n: int) -> dict:
+    rng = random.Random(1234)
+    pool = [
+        {"data": {"score": rng.randint(0, 100), "result": rng.choice(["deliverable", "risky", "unknown"]), "reason": "r"}}
+        for _ in range(1000)
+    ]
+    responses = [pool[i % len(pool)] for i in range(n)]
+
+    start = time.perf_counter()
+    for response in responses:
+        all(evaluate_rule(response, rule, "data") for rule in RULES)
+    per_call = time.perf_counter() - start
+
+    start = time.perf_counter()
+    evaluator = compile_rules(RULES, "data")
+    for response in responses:
+        evaluator.evaluate(response)
+    compiled = time.perf_counter() - start
+    return {"evaluate_rule_ns": per_call / n * 1e9, "compiled_ns": compiled / n * 1e9}
+
+
+def build_store(n: int) -> ResultStore:
+    """ResultStore sintético con la forma de una ejecución con --details-file."""
+    rng = random.Random(1234)
+    store = ResultStore()
+    for i in range(n):
+        classification = rng.choice(CLASSIFICATIONS)
+        store.append({
+            "email": f"user{i}@example.com",
+            "duration": rng.lognormvariate(-2, 0.5),
+            "classification": classification,
+            "response_reason": "accepted_email",
+            "scheduling_lag": rng.random() / 1000,
+            "is_valid_source": classification.startswith("Valido"),
+        })
+    return store
+
+
+def scenario_statistics(n: int) -> dict:
+    store = build_store(n)
+    start = time.perf_counter()
+    calculate_statistics(store, n // 2, n - n // 2, 16, "http://bench")
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "us_per_result": seconds / n * 1e6}
+
+
+def scenario_save_json(n: int) -> dict:
+    store = build_store(n)
+    data = {"Mock": calculate_statistics(store, n // 2, n - n // 2, 16, "http://bench")}
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        if not save_results_to_json(data, os.path.join(directory, "results.json")):
+            raise RuntimeError("save_results_to_json falló.")
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds, "us_per_result": seconds / n * 1e6}
+
+
+SCENARIOS = {
+    "run_api_tests": scenario_run_api_tests,
+    "webhook": scenario_webhook,
+    "rules": scenario_rules,
+    "statistics": scenario_statistics,
+    "save_json": scenario_save_json,
+}
+
+
+def run_scenario(name: str, n: int) -> dict:
+    """Corre un escenario (en el proceso hijo) y agrega su pico de RSS."""
+    metrics = SCENARIOS[name](n)
+    rss = peak_rss_mb()
+    if rss is not None:
+        metrics["peak_rss_mb"] = rss
+    return metrics
+
+
+def run_isolated(name: str, n: int) -> dict:
+    """Corre un escenario en un proceso nuevo, para que el pico de RSS sea solo suyo."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_scenario, name, n).result()
+
+
+# ── Línea base y regresiones ────────────────────────────────────────
+
+def compare(results: dict, baseline: dict, thresholds: dict[str, float]) -> list[str]:
+    """
+    Métricas que empeoraron más que su umbral respecto de la línea base
+    (solo tamaños y escenarios presentes en ambas).
+    """
+    regressions = []
+    for size, scenarios in results.items():
+        for name, metrics in scenarios.items():
+            base = baseline.get(size, {}).get(name, {})
+            for metric, value in metrics.items():
+                reference = base.get(metric)
+                if not reference:
+                    continue
+                if metric in HIGHER_IS_BETTER:
+                    change = (reference - value) / reference
+                else:
+                    change = (value - reference) / reference
+                limit = thresholds.get(metric, thresholds["default"])
+                if change > limit:
+                    regressions.append(
+                        f"{name} @ {size}: {metric} {value:.2f} vs {reference:.2f} "
+                        f"({change * 100:+.0f}% peor, umbral {limit * 100:.0f}%)"
+                    )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del overhead del harness con umbrales de regresión.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Tamaños de corpus separados por coma (ej. 10000,100000,1000000).")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Escenarios a correr ({', '.join(SCENARIOS)}).")
+    parser.add_argument("--output", help="Guardar los resultados en este JSON.")
+    parser.add_argument("--save-baseline", help="Guardar los resultados como línea base en este JSON.")
+    parser.add_argument("--baseline", help="Comparar contra esta línea base y fallar si hay regresiones.")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help=f"Empeoramiento relativo máximo por defecto (default {DEFAULT_THRESHOLDS['default']}).")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    names = [name.strip() for name in args.scenarios.split(",")]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}.")
+
+    results: dict[str, dict[str, dict]] = {}
+    for n in sizes:
+        for name in names:
+            metrics = run_isolated(name, n)
+            results.setdefault(str(n), {})[name] = metrics
+            print(f"{name:<14} n={n:<9} " + "  ".join(f"{key}={value:.2f}" for key, value in metrics.items()))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            if path == args.save_baseline:
+                report["thresholds"] = DEFAULT_THRESHOLDS
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Resultados guardados en '{path}'.")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        thresholds = {**DEFAULT_THRESHOLDS, **baseline.get("thresholds", {})}
+        if args.max_regression is not None:
+            thresholds["default"] = args.max_regression
+        regressions = compare(results, baseline["results"], thresholds)
+        if regressions:
+            print("Regresiones respecto de la línea base:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("Sin regresiones respecto de la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
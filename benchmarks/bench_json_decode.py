@@ -0,0 +1,95 @@
+"""
+Micro-benchmark de la decodificación de respuestas.
+
+Mide el tiempo de CPU por respuesta de cada backend JSON disponible
+(json de la stdlib y orjson si está instalado) sobre bodies sintéticos
+con la forma de una API de validación, y cuánto ocupa raw_response en un
+ResultStore con response_mode "full" frente a "fields".
+
+Uso:
+    python benchmarks/bench_json_decode.py [--responses 200000]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_codec import JSON_BACKENDS, get_loads  # noqa: E402
+from result_store import ResultStore  # noqa: E402
+from rule_engine import compile_rules  # noqa: E402
+
+RULES = [
+    {"field": "score", "operator": ">=", "value": "80"},
+    {"field": "result", "operator": "in", "value": ["deliverable", "risky"]},
+]
+
+
+def build_bodies(n: int, seed: int = 1234) -> list[bytes]:
+    """Genera n bodies (bytes) con campos de más, como los de un proveedor real."""
+    rng = random.Random(seed)
+    results = ["deliverable", "risky", "undeliverable", "unknown"]
+    pool = []
+    for i in range(1000):
+        body = {
+            "data": {
+                "email": f"user{i}@example.com",
+                "score": rng.randint(0, 100),
+                "result": rng.choice(results),
+                "reason": rng.choice(["accepted_email", "rejected_email", "low_deliverability"]),
+                "mx_records": [f"mx{j}.example.com" for j in range(rng.randint(1, 4))],
+                "smtp": {"provider": "example", "catch_all": rng.random() < 0.2, "latency_ms": rng.randint(5, 900)},
+                "flags": {name: rng.random() < 0.5 for name in ("disposable", "role", "free", "webmail", "gibberish")},
+            },
+            "meta": {"request_id": f"{rng.getrandbits(64):016x}", "credits_left": rng.randint(0, 10_000)},
+        }
+        pool.append(json.dumps(body).encode("utf-8"))
+    return [pool[i % len(pool)] for i in range(n)]
+
+
+def bench_decode(bodies: list[bytes], backend: str) -> float:
+    """Segundos de CPU para decodificar todos los bodies con el backend."""
+    loads = get_loads(backend)
+    start = time.process_time()
+    for body in bodies:
+        loads(body)
+    return time.process_time() - start
+
+
+def bench_retained(bodies: list[bytes]) -> dict[str, int]:
+    """Bytes de raw_response en un ResultStore con el objeto completo y solo con los campos."""
+    evaluator = compile_rules(RULES, "data")
+    loads = get_loads()
+    full, fields = ResultStore(), ResultStore()
+    for body in bodies:
+        response = loads(body)
+        full.append({"email": "x", "raw_response": response})
+        fields.append({"email": "x", "raw_response": evaluator.project(response)})
+    return {"full": len(full.raw_blob), "fields": len(fields.raw_blob)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de decodificación JSON de respuestas.")
+    parser.add_argument("--responses", type=int, default=200_000)
+    args = parser.parse_args()
+
+    bodies = build_bodies(args.responses)
+    n = len(bodies)
+    print(f"Respuestas: {n} (body promedio: {sum(map(len, bodies)) / n:.0f} bytes)")
+
+    timings = {backend: bench_decode(bodies, backend) for backend in JSON_BACKENDS}
+    for backend, seconds in timings.items():
+        print(f"  {backend:<7} {seconds:.2f}s CPU ({seconds / n * 1e6:.2f} µs/respuesta)")
+    if "orjson" in timings and timings["orjson"]:
+        print(f"  Speedup orjson: {timings['json'] / timings['orjson']:.1f}x")
+    else:
+        print("  (orjson no está instalado: solo se midió el json de la stdlib)")
+
+    retained = bench_retained(bodies)
+    print("raw_response retenido en el ResultStore:")
+    print(f"  response_mode full:   {retained['full'] / n:.0f} bytes/respuesta")
+    print(f"  response_mode fields: {retained['fields'] / n:.0f} bytes/respuesta")
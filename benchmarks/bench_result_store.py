@@ -0,0 +1,108 @@
+"""
+Benchmark de memoria y agregación de los resultados de una ejecución.
+
+Compara N resultados como lista de dicts contra el ResultStore columnar:
+memoria medida con tracemalloc y tiempo de calculate_statistics. Los
+resultados imitan los de run_api_tests con --details-file (sin
+raw_response en memoria, con timings por fase).
+
+Uso:
+    python benchmarks/bench_result_store.py [--results 1000000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_store import CLASSIFICATIONS, ResultStore  # noqa: E402
+from stats_calculator import calculate_statistics  # noqa: E402
+from tracing import PHASES  # noqa: E402
+
+
+def build_result(rng: random.Random, i: int) -> dict:
+    """Un resultado sintético con la forma de los de run_api_tests."""
+    duration = rng.lognormvariate(-2, 0.5)
+    classification = rng.choice(CLASSIFICATIONS)
+    result = {
+        "email": f"user{i}@example.com",
+        "duration": duration,
+        "classification": classification,
+        "scheduling_lag": rng.random() / 1000,
+        "is_valid_source": classification.startswith("Valido"),
+    }
+    if classification == "Error":
+        result["error_message"] = "Timeout después de 30s"
+    else:
+        result["response_reason"] = rng.choice(["accepted_email", "rejected_email", "low_deliverability"])
+        result["timings"] = {phase: duration / len(PHASES) for phase in PHASES}
+        result["timings"]["total"] = duration
+        result["timings"]["connection_reused"] = i % 10 != 0
+    return result
+
+
+def measure(build) -> tuple[object, int, float]:
+    """Construye el contenedor y retorna (contenedor, bytes pico, segundos)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    container = build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return container, peak, elapsed
+
+
+def bench(n: int) -> dict[str, float]:
+    def as_list():
+        rng = random.Random(1234)
+        return [build_result(rng, i) for i in range(n)]
+
+    def as_store():
+        rng = random.Random(1234)
+        store = ResultStore()
+        for i in range(n):
+            store.append(build_result(rng, i))
+        return store
+
+    results, list_bytes, _ = measure(as_list)
+    start = time.perf_counter()
+    list_stats = calculate_statistics(results, n // 2, n // 2, 16, "http://bench", details_file="x.jsonl")
+    list_stats_time = time.perf_counter() - start
+    del results
+
+    store, store_bytes, _ = measure(as_store)
+    start = time.perf_counter()
+    store_stats = calculate_statistics(store, n // 2, n // 2, 16, "http://bench", details_file="x.jsonl")
+    store_stats_time = time.perf_counter() - start
+
+    if list_stats["accuracy"] != store_stats["accuracy"]:
+        raise AssertionError("El ResultStore no coincide con la lista de dicts.")
+
+    return {
+        "results": n,
+        "list_bytes": list_bytes,
+        "store_bytes": store_bytes,
+        "list_stats_seconds": list_stats_time,
+        "store_stats_seconds": store_stats_time,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de memoria del ResultStore columnar.")
+    parser.add_argument("--results", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    stats = bench(args.results)
+    mb = 1024 * 1024
+    print(f"Resultados: {stats['results']}")
+    print(f"  Lista de dicts: {stats['list_bytes'] / mb:.0f} MB "
+          f"({stats['list_bytes'] / stats['results']:.0f} B/resultado), "
+          f"calculate_statistics {stats['list_stats_seconds']:.2f}s")
+    print(f"  ResultStore:    {stats['store_bytes'] / mb:.0f} MB "
+          f"({stats['store_bytes'] / stats['results']:.0f} B/resultado), "
+          f"calculate_statistics {stats['store_stats_seconds']:.2f}s")
+    print(f"  Reducción de memoria: {stats['list_bytes'] / stats['store_bytes']:.1f}x")
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark del motor de reglas.
+
+Compara evaluate_rule (que prepara la regla en cada llamada) contra un
+RuleEvaluator compilado una sola vez, evaluando N respuestas.
+
+Uso:
+    python benchmarks/bench_rule_engine.py [--responses 1000000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rule_engine import compile_rules, evaluate_rule  # noqa: E402
+
+RULES = [
+    {"field": "score", "operator": ">=", "value": "80"},
+    {"field": "result", "operator": "in", "value": ["deliverable", "risky"]},
+]
+
+
+def build_responses(n: int, seed: int = 1234) -> list[dict]:
+    """Genera n respuestas sintéticas con la forma de apis_config.json."""
+    rng = random.Random(seed)
+    results = ["deliverable", "risky", "undeliverable", "unknown"]
+    pool = [
+        {"data": {"score": rng.randint(0, 100), "result": rng.choice(results), "reason": "r"}}
+        for _ in range(1000)
+    ]
+    return [pool[i % len(pool)] for i in range(n)]
+
+
+def bench(n: int) -> dict[str, float]:
+    responses = build_responses(n)
+
+    start = time.perf_counter()
+    legacy = [all(evaluate_rule(r, rule, "data") for rule in RULES) for r in responses]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    evaluator = compile_rules(RULES, "data")
+    compiled = [evaluator.evaluate(r) for r in responses]
+    compiled_time = time.perf_counter() - start
+
+    if legacy != compiled:
+        raise AssertionError("El evaluador compilado no coincide con evaluate_rule.")
+
+    return {
+        "responses": n,
+        "per_call_seconds": legacy_time,
+        "compiled_seconds": compiled_time,
+        "per_call_ns_per_response": legacy_time / n * 1e9,
+        "compiled_ns_per_response": compiled_time / n * 1e9,
+        "speedup": legacy_time / compiled_time if compiled_time else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del motor de reglas compilado.")
+    parser.add_argument("--responses", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    stats = bench(args.responses)
+    print(f"Respuestas evaluadas: {stats['responses']}")
+    print(f"  evaluate_rule por llamada: {stats['per_call_seconds']:.2f}s "
+          f"({stats['per_call_ns_per_response']:.0f} ns/respuesta)")
+    print(f"  RuleEvaluator compilado:   {stats['compiled_seconds']:.2f}s "
+          f"({stats['compiled_ns_per_response']:.0f} ns/respuesta)")
+    print(f"  Speedup: {stats['speedup']:.1f}x")
@@ -0,0 +1,245 @@
+import os
+import json
+import hashlib
+import time
+import logging
+from collections import Counter
+from typing import Any
+
+from file_handler import JsonlResultSink
+from latency_histogram import LatencyHistogram
+from result_store import ResultStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUNS_DIR = "runs"
+CHECKPOINT_FILE = "checkpoint.json"
+DETAILS_FILE = "details.jsonl"
+
+
+def new_run_id() -> str:
+    """Identificador de ejecución basado en la fecha y hora de inicio."""
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+class RunCheckpoint:
+    """
+    Checkpoint de una ejecución en runs/<run_id>/ para poder retomarla si
+    el proceso se corta.
+
+    Funciona como sink de run_api_tests: cada resultado se agrega al JSONL
+    de detalle (los pares (api, email) completados; sin un details_file
+    propio, runs/<run_id>/details.jsonl se escribe sin raw_response) y se
+    actualizan los agregados parciales por API, que se guardan en
+    checkpoint.json cada save_interval segundos. Al retomar, load_results() reconstruye lo ya
+    hecho y run_api_tests saltea esos emails (skip_emails).
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        runs_dir: str = DEFAULT_RUNS_DIR,
+        meta: dict[str, Any] | None = None,
+        save_interval: float = 5.0,
+        drop_raw_response: bool = True,
+    ):
+        self.run_id = run_id
+        self.directory = os.path.join(runs_dir, run_id)
+        self.meta_path = os.path.join(self.directory, CHECKPOINT_FILE)
+        self.meta = meta if meta is not None else {}
+        self.details_path = self.meta.get("details_file") or os.path.join(self.directory, DETAILS_FILE)
+        self.drop_raw_response = drop_raw_response
+        self._save_interval = save_interval
+        self._last_save = time.monotonic()
+        self._counts: dict[str, Counter] = {
+            api: Counter(progress.get("classification_counts", {}))
+            for api, progress in self.meta.get("progress", {}).items()
+        }
+        self._sink: JsonlResultSink | None = None
+
+    @classmethod
+    def create(
+        cls,
+        runs_dir: str = DEFAULT_RUNS_DIR,
+        details_file: str | None = None,
+        drop_raw_response: bool = True,
+        **info: Any,
+    ) -> "RunCheckpoint":
+        """
+        Crea el checkpoint de una ejecución nueva.
+
+        Args:
+            runs_dir: Directorio donde se guardan las ejecuciones.
+            details_file: JSONL de detalle (por defecto runs/<run_id>/details.jsonl).
+            drop_raw_response: Ver JsonlResultSink.
+            **info: Datos de la ejecución a guardar (config, rps, archivos de emails...).
+        """
+        run_id = new_run_id()
+        while os.path.exists(os.path.join(runs_dir, run_id)):
+            run_id = f"{new_run_id()}-{time.monotonic_ns() % 1000:03d}"
+        meta = {
+            "run_id": run_id,
+            "status": "running",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "details_file": details_file,
+            "drop_raw_response": drop_raw_response,
+            "progress": {},
+            **info,
+        }
+        checkpoint = cls(run_id, runs_dir, meta, drop_raw_response=drop_raw_response)
+        os.makedirs(checkpoint.directory, exist_ok=True)
+        checkpoint.save()
+        logger.info("Checkpoint de la ejecución '%s' en '%s'.", run_id, checkpoint.directory)
+        return checkpoint
+
+    @classmethod
+    def load(cls, run_id: str, runs_dir: str = DEFAULT_RUNS_DIR) -> "RunCheckpoint":
+        """
+        Abre el checkpoint de una ejecución anterior para retomarla. Se
+        retoma con las mismas opciones: el JSONL de detalle y si las
+        raw_response quedaban en memoria.
+        """
+        meta_path = os.path.join(runs_dir, run_id, CHECKPOINT_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"No existe un checkpoint para la ejecución '{run_id}' en '{runs_dir}'.")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        meta["status"] = "running"
+        meta["resumed_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        return cls(run_id, runs_dir, meta, drop_raw_response=meta.get("drop_raw_response", True))
+
+    @staticmethod
+    def latest_unfinished(runs_dir: str = DEFAULT_RUNS_DIR) -> str | None:
+        """run_id de la ejecución más reciente que no terminó, o None."""
+        if not os.path.isdir(runs_dir):
+            return None
+        for run_id in sorted(os.listdir(runs_dir), reverse=True):
+            meta_path = os.path.join(runs_dir, run_id, CHECKPOINT_FILE)
+            if not os.path.exists(meta_path):
+                continue
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                if json.load(f).get("status") != "completed":
+                    return run_id
+        return None
+
+    def load_results(self) -> dict[str, ResultStore]:
+        """
+        Lee los resultados ya completados, por API. Una última línea
+        incompleta (corte a mitad de escritura) se descarta.
+        """
+        stores: dict[str, ResultStore] = {}
+        if not os.path.exists(self.details_path):
+            return stores
+        with open(self.details_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Línea %d del checkpoint incompleta: se descarta.", line_number)
+                    continue
+                api_name = row.pop("api", "?")
+                if self.drop_raw_response:
+                    row.pop("raw_response", None)
+                    row.pop("raw_body", None)
+                stores.setdefault(api_name, ResultStore()).append(row)
+
+        # El detalle es la fuente de verdad: rehacer los agregados desde ahí
+        self._counts = {api: Counter(store.classification_counts()) for api, store in stores.items()}
+        self.meta["progress"] = {
+            api: {"completed": len(store), "classification_counts": dict(self._counts[api])}
+            for api, store in stores.items()
+        }
+        logger.info(
+            "Checkpoint '%s': %d resultados previos (%s).", self.run_id,
+            sum(len(store) for store in stores.values()),
+            ", ".join(f"{api}={len(store)}" for api, store in stores.items()) or "ninguno",
+        )
+        return stores
+
+    # ── Interfaz de sink para run_api_tests ──
+
+    def write(self, result: dict[str, Any], api: str = "?") -> None:
+        if self._sink is None:
+            self._sink = JsonlResultSink(
+                self.details_path,
+                append=True,
+                drop_raw_response=self.drop_raw_response,
+                omit_raw_response=not self.meta.get("details_file"),
+            )
+        self._sink.write(result, api=api)
+
+        counts = self._counts.setdefault(api, Counter())
+        counts[result.get("classification")] += 1
+        progress = self.meta["progress"].setdefault(api, {})
+        progress["completed"] = sum(counts.values())
+        progress["classification_counts"] = dict(counts)
+
+        if time.monotonic() - self._last_save >= self._save_interval:
+            self.save()
+
+    def save(self) -> None:
+        """Guarda checkpoint.json (tras volcar el detalle, para que nunca quede por delante)."""
+        if self._sink is not None:
+            self._sink.flush()
+        self.meta["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+        self._last_save = time.monotonic()
+
+    def close(self, completed: bool = False) -> None:
+        """Cierra el detalle y guarda el estado final ("completed" o "interrupted")."""
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        self.meta["status"] = "completed" if completed else "interrupted"
+        self.save()
+
+
+def config_fingerprint(file_path: str) -> str:
+    """
+    Huella del archivo de configuración de APIs (el JSON normalizado, sin
+    resolver variables de entorno), para detectar si cambió al retomar.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def completed_emails(previous: dict[str, ResultStore]) -> dict[str, set[str]]:
+    """Emails ya procesados por API (para skip_emails_by_api)."""
+    return {api_name: set(store.emails) for api_name, store in previous.items()}
+
+
+def merge_previous_results(
+    previous: dict[str, ResultStore],
+    results_by_api: dict[str, ResultStore],
+    metrics_by_api: dict[str, dict[str, Any]],
+) -> None:
+    """
+    Combina los resultados de una ejecución retomada con los de la anterior
+    (in place): los resultados previos van primero, el histograma de
+    latencias suma las duraciones previas y "resumed_requests" indica
+    cuántos resultados no son de esta ejecución.
+    """
+    for api_name, old in previous.items():
+        if api_name not in results_by_api:
+            continue
+        old_count = len(old)
+        old_latency = LatencyHistogram()
+        old_latency.record_many(old.latencies())
+        old_corrected = LatencyHistogram()
+        old_corrected.record_many(old.values(old.corrected_latencies))
+
+        old.extend(results_by_api[api_name])
+        results_by_api[api_name] = old
+
+        run_metrics = metrics_by_api.setdefault(api_name, {})
+        if run_metrics.get("latency_histogram") is not None:
+            run_metrics["latency_histogram"] = old_latency.merge(run_metrics["latency_histogram"])
+        if run_metrics.get("corrected_latency_histogram") is not None:
+            run_metrics["corrected_latency_histogram"] = old_corrected.merge(run_metrics["corrected_latency_histogram"])
+        run_metrics["resumed_requests"] = old_count
@@ -5,6 +5,16 @@ import argparse
 import json
 from typing import Any
 
+from rule_engine import compile_rules
+from response_cache import DEFAULT_CACHE_FILE, DEFAULT_CACHE_TTL, DEFAULT_CACHE_MAX_ENTRIES
+from checkpoint import DEFAULT_RUNS_DIR
+from corpus import DEFAULT_EMAIL_COLUMN, DEFAULT_SAMPLE_SEED
+from stats_calculator import DEFAULT_CONFIDENCE
+from rate_limiter import ARRIVAL_PROCESSES
+from api_client import DEFAULT_ARRIVAL_SEED, LOAD_MODELS, RESPONSE_MODES
+from load_profile import LoadProfile
+from early_stop import EarlyStopController
+
 logger = logging.getLogger(__name__)
 
 # Constantes Configurables
@@ -13,10 +23,12 @@ DEFAULT_CONFIG_FILE = "apis_config.json"
 DEFAULT_REQUEST_TIMEOUT = 30  # segundos
 
 
-def load_apis_config(file_path: str) -> list[dict[str, Any]]:
+def load_apis_config(file_path: str, require_api_keys: bool = True) -> list[dict[str, Any]]:
     """
     Carga la configuración de las APIs desde un archivo JSON.
     Valida que cada API tenga los campos requeridos.
+    Con require_api_keys=False (ej. re-scoring offline) no falla si una
+    api_key apunta a una variable de entorno no definida.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"El archivo de configuración '{file_path}' no fue encontrado.")
@@ -40,13 +52,14 @@ def load_apis_config(file_path: str) -> list[dict[str, Any]]:
         if api_key.startswith("$"):
             env_var = api_key[1:]
             env_value = os.getenv(env_var)
-            if not env_value:
+            if not env_value and require_api_keys:
                 raise ValueError(
                     f"La API '{api['name']}' usa la variable de entorno '{env_var}' "
                     f"pero no está definida."
                 )
-            api["api_key"] = env_value
-            logger.info("API key para '%s' cargada desde variable de entorno '%s'.", api["name"], env_var)
+            if env_value:
+                api["api_key"] = env_value
+                logger.info("API key para '%s' cargada desde variable de entorno '%s'.", api["name"], env_var)
 
         # Validar reglas de validación
         if not isinstance(api.get("validation_rules"), list):
@@ -61,6 +74,152 @@ def load_apis_config(file_path: str) -> list[dict[str, Any]]:
         api.setdefault("response_path", "data")
         api.setdefault("timeout", DEFAULT_REQUEST_TIMEOUT)
         api.setdefault("mode", "sync")
+        api.setdefault("burst", 1)
+
+        if not isinstance(api["burst"], int) or api["burst"] < 1:
+            raise ValueError(
+                f"La API '{api['name']}' debe tener 'burst' como entero mayor o igual a 1."
+            )
+
+        # rps por API es opcional: si no se define se usa --requests-per-second
+        api_rps = api.get("rps")
+        if api_rps is not None and (not isinstance(api_rps, (int, float)) or api_rps <= 0):
+            raise ValueError(
+                f"La API '{api['name']}' debe tener 'rps' como número mayor a 0."
+            )
+
+        # Pool de conexiones (opcional): límites, keep-alive y caché de DNS
+        for key in ("max_connections", "limit_per_host", "dns_cache_ttl"):
+            value = api.get(key)
+            if value is not None and (not isinstance(value, int) or value < 0):
+                raise ValueError(
+                    f"La API '{api['name']}' debe tener '{key}' como entero mayor o igual a 0."
+                )
+        keepalive_timeout = api.get("keepalive_timeout")
+        if keepalive_timeout is not None and (not isinstance(keepalive_timeout, (int, float)) or keepalive_timeout < 0):
+            raise ValueError(
+                f"La API '{api['name']}' debe tener 'keepalive_timeout' como número mayor o igual a 0."
+            )
+        if api.get("force_close") and keepalive_timeout is not None:
+            raise ValueError(
+                f"La API '{api['name']}' no puede combinar 'force_close' con 'keepalive_timeout'."
+            )
+
+        # max_in_flight es opcional: si no se define se calcula como rps × timeout
+        max_in_flight = api.get("max_in_flight")
+        if max_in_flight is not None and (
+            not isinstance(max_in_flight, int) or isinstance(max_in_flight, bool) or max_in_flight < 1
+        ):
+            raise ValueError(
+                f"La API '{api['name']}' debe tener 'max_in_flight' como entero mayor o igual a 1."
+            )
+
+        # sweep_field es opcional: campo numérico para el barrido de umbrales
+        sweep_field = api.get("sweep_field")
+        if sweep_field is not None and (not isinstance(sweep_field, str) or not sweep_field):
+            raise ValueError(f"La API '{api['name']}' debe tener 'sweep_field' como texto no vacío.")
+
+        # Qué se conserva de cada respuesta (opcional): objeto completo o solo campos
+        response_mode = api.get("response_mode")
+        if response_mode is not None and response_mode not in RESPONSE_MODES:
+            raise ValueError(
+                f"La API '{api['name']}' tiene un 'response_mode' inválido: '{response_mode}'. "
+                f"Valores permitidos: {', '.join(RESPONSE_MODES)}."
+            )
+        if not isinstance(api.get("keep_raw_body", False), bool):
+            raise ValueError(f"La API '{api['name']}' debe tener 'keep_raw_body' como booleano.")
+
+        # Reintentos (opcional): intentos, backoff y estados a reintentar
+        retry = api.get("retry")
+        if retry is not None:
+            if not isinstance(retry, dict):
+                raise ValueError(f"La API '{api['name']}' debe tener 'retry' como objeto.")
+            max_attempts = retry.get("max_attempts", 1)
+            if not isinstance(max_attempts, int) or max_attempts < 1:
+                raise ValueError(
+                    f"La API '{api['name']}' debe tener 'retry.max_attempts' como entero mayor o igual a 1."
+                )
+            for key in ("backoff_base", "backoff_max"):
+                value = retry.get(key)
+                if value is not None and (not isinstance(value, (int, float)) or value < 0):
+                    raise ValueError(
+                        f"La API '{api['name']}' debe tener 'retry.{key}' como número mayor o igual a 0."
+                    )
+            retry_on = retry.get("retry_on")
+            if retry_on is not None and (
+                not isinstance(retry_on, list) or not all(isinstance(code, int) for code in retry_on)
+            ):
+                raise ValueError(
+                    f"La API '{api['name']}' debe tener 'retry.retry_on' como lista de códigos HTTP."
+                )
+
+        # Rate adaptativo AIMD (opcional): baja ante 429/503 y se recupera
+        adaptive = api.get("adaptive_rate")
+        if adaptive is not None:
+            if not isinstance(adaptive, dict):
+                raise ValueError(f"La API '{api['name']}' debe tener 'adaptive_rate' como objeto.")
+            for key in ("min_rps", "increase_step", "cooldown"):
+                value = adaptive.get(key)
+                if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+                    raise ValueError(
+                        f"La API '{api['name']}' debe tener 'adaptive_rate.{key}' como número mayor a 0."
+                    )
+            decrease_factor = adaptive.get("decrease_factor")
+            if decrease_factor is not None and (
+                not isinstance(decrease_factor, (int, float)) or not 0 < decrease_factor < 1
+            ):
+                raise ValueError(
+                    f"La API '{api['name']}' debe tener 'adaptive_rate.decrease_factor' entre 0 y 1."
+                )
+
+        # Modelo de carga (opcional): paced, open o closed (ver api_client.load_settings)
+        load_model = api.get("load_model")
+        if load_model is not None and load_model not in LOAD_MODELS:
+            raise ValueError(
+                f"La API '{api['name']}' tiene un 'load_model' inválido: '{load_model}'. "
+                f"Valores permitidos: {', '.join(LOAD_MODELS)}."
+            )
+        arrival = api.get("arrival")
+        if arrival is not None and arrival not in ARRIVAL_PROCESSES:
+            raise ValueError(
+                f"La API '{api['name']}' tiene un 'arrival' inválido: '{arrival}'. "
+                f"Valores permitidos: {', '.join(ARRIVAL_PROCESSES)}."
+            )
+        arrival_seed = api.get("arrival_seed")
+        if arrival_seed is not None and (not isinstance(arrival_seed, int) or isinstance(arrival_seed, bool)):
+            raise ValueError(f"La API '{api['name']}' debe tener 'arrival_seed' como entero.")
+        virtual_users = api.get("virtual_users")
+        if virtual_users is not None and (not isinstance(virtual_users, int) or virtual_users < 1):
+            raise ValueError(
+                f"La API '{api['name']}' debe tener 'virtual_users' como entero mayor o igual a 1."
+            )
+        think_time = api.get("think_time")
+        if think_time is not None and (not isinstance(think_time, (int, float)) or think_time < 0):
+            raise ValueError(
+                f"La API '{api['name']}' debe tener 'think_time' como número mayor o igual a 0."
+            )
+
+        # Perfil de carga escalonado (opcional)
+        if "load_profile" in api:
+            try:
+                LoadProfile.from_config(api["load_profile"])
+            except ValueError as e:
+                raise ValueError(f"La API '{api['name']}' tiene un 'load_profile' inválido: {e}") from e
+            if load_model == "closed":
+                raise ValueError(f"La API '{api['name']}' no puede combinar 'load_profile' con el modelo 'closed'.")
+
+        # Parada temprana (opcional)
+        if "early_stop" in api:
+            try:
+                EarlyStopController.from_config(api["early_stop"])
+            except ValueError as e:
+                raise ValueError(f"La API '{api['name']}' tiene un 'early_stop' inválido: {e}") from e
+
+        # Compilar las reglas para detectar operadores inválidos al cargar
+        try:
+            compile_rules(api["validation_rules"], api["response_path"])
+        except ValueError as e:
+            raise ValueError(f"La API '{api['name']}' tiene una regla inválida: {e}") from e
 
         # Validar modo
         mode = api["mode"]
@@ -79,6 +238,16 @@ def load_apis_config(file_path: str) -> list[dict[str, Any]]:
                     f"un objeto 'webhook' con la configuración del callback."
                 )
 
+            # Correlación por ID de trabajo (opcional): rutas en dot notation
+            for key in ("id_field", "callback_id_field", "batch_path"):
+                value = webhook_cfg.get(key)
+                if value is not None and (not isinstance(value, str) or not value):
+                    raise ValueError(f"La API '{api['name']}' debe tener 'webhook.{key}' como texto no vacío.")
+            if "id_field" not in webhook_cfg and ("callback_id_field" in webhook_cfg or "batch_path" in webhook_cfg):
+                raise ValueError(
+                    f"La API '{api['name']}' usa 'webhook.callback_id_field'/'batch_path' sin 'webhook.id_field'."
+                )
+
             webhook_cfg.setdefault("callback_param", "callback_url")
             webhook_cfg.setdefault("timeout", 120)
             webhook_cfg.setdefault("result_path", api.get("response_path", "data"))
@@ -108,6 +277,71 @@ def get_config() -> argparse.Namespace:
         "--requests-per-second", "-rps", type=int, default=REQUESTS_PER_SECOND,
         help="Número de solicitudes a enviar por segundo."
     )
+    parser.add_argument(
+        "--max-in-flight", type=int, default=None,
+        help="Máximo de solicitudes simultáneas por API (por defecto: rps × timeout)."
+    )
+    parser.add_argument(
+        "--concurrent-apis", action="store_true",
+        help="Probar todas las APIs en paralelo, cada una con su propio rate limit."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Procesos entre los que se reparten los emails de cada API (cada uno con rps / workers). "
+             "Útil a cientos de RPS, cuando un solo event loop satura la CPU."
+    )
+    parser.add_argument(
+        "--load-model", type=str, default=None, choices=LOAD_MODELS,
+        help="Modelo de carga: paced (token bucket), open (cronograma de llegadas fijo, con latencia "
+             "corregida desde el envío previsto) o closed (usuarios virtuales). Por defecto: paced."
+    )
+    parser.add_argument(
+        "--arrival", type=str, default=None, choices=ARRIVAL_PROCESSES,
+        help="Proceso de llegadas del modelo open: constant o poisson. Por defecto: constant."
+    )
+    parser.add_argument(
+        "--arrival-seed", type=int, default=None,
+        help=f"Semilla de las llegadas poisson (misma semilla = mismo cronograma). Por defecto: {DEFAULT_ARRIVAL_SEED}"
+    )
+    parser.add_argument(
+        "--virtual-users", type=int, default=None,
+        help="Usuarios virtuales del modelo closed (solicitudes simultáneas). Por defecto: 10."
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=None,
+        help="Segundos que cada usuario virtual espera entre respuesta y siguiente solicitud (modelo closed)."
+    )
+    parser.add_argument(
+        "--details-file", type=str, default=None,
+        help="Escribir el detalle de cada request en este archivo JSONL durante la ejecución "
+             "(results.json queda solo con los agregados)."
+    )
+    parser.add_argument(
+        "--cache", action="store_true",
+        help="Usar el caché local de respuestas: los emails con una respuesta fresca no se envían."
+    )
+    parser.add_argument(
+        "--cache-file", type=str, default=DEFAULT_CACHE_FILE,
+        help=f"Archivo SQLite del caché de respuestas. Por defecto: {DEFAULT_CACHE_FILE}"
+    )
+    parser.add_argument(
+        "--cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+        help="Segundos que una respuesta cacheada se considera fresca."
+    )
+    parser.add_argument(
+        "--cache-max-entries", type=int, default=DEFAULT_CACHE_MAX_ENTRIES,
+        help="Máximo de respuestas guardadas en el caché (se eliminan las más antiguas)."
+    )
+    parser.add_argument(
+        "--resume", type=str, default=None, metavar="RUN_ID",
+        help=f"Retomar una ejecución interrumpida (ver {DEFAULT_RUNS_DIR}/): saltea los emails ya "
+             "procesados y combina los resultados anteriores con los nuevos. Se retoma con las opciones "
+             "de la ejecución original (RPS, workers, corpus, muestra); falla si cambió la configuración de APIs."
+    )
+    parser.add_argument(
+        "--checkpoint", action="store_true",
+        help=f"Guardar un checkpoint de la ejecución en {DEFAULT_RUNS_DIR}/ para poder retomarla con --resume."
+    )
     parser.add_argument(
         "--valid-emails-file", type=str, default="valid_emails.txt",
         help="Archivo con la lista de emails válidos."
@@ -116,6 +350,47 @@ def get_config() -> argparse.Namespace:
         "--invalid-emails-file", type=str, default="invalid_emails.txt",
         help="Archivo con la lista de emails inválidos."
     )
+    parser.add_argument(
+        "--corpus-file", type=str, default=None,
+        help="CSV (o .csv.gz) con emails etiquetados en la columna --label-column, "
+             "además de (o en lugar de) las listas de válidos/inválidos."
+    )
+    parser.add_argument(
+        "--email-column", type=str, default=DEFAULT_EMAIL_COLUMN,
+        help=f"Columna del email en los archivos CSV. Por defecto: {DEFAULT_EMAIL_COLUMN}"
+    )
+    parser.add_argument(
+        "--label-column", type=str, default="label",
+        help="Columna de la etiqueta (válido/inválido) en --corpus-file. Por defecto: label"
+    )
+    parser.add_argument(
+        "--normalize-emails", action="store_true",
+        help="Normalizar los emails (sin espacios, en minúsculas) antes de deduplicar."
+    )
+    parser.add_argument(
+        "--no-dedupe", action="store_true",
+        help="No eliminar emails duplicados del corpus (tampoco se detectan conflictos)."
+    )
+    parser.add_argument(
+        "--drop-conflicts", action="store_true",
+        help="Excluir los emails que aparecen como válidos e inválidos (por defecto se conserva la primera aparición)."
+    )
+    parser.add_argument(
+        "--sample-size", type=int, default=None,
+        help="Probar solo una muestra estratificada por etiqueta de este tamaño (la misma para todas las APIs)."
+    )
+    parser.add_argument(
+        "--sample-seed", type=int, default=DEFAULT_SAMPLE_SEED,
+        help=f"Semilla de la muestra (misma semilla y corpus = misma muestra). Por defecto: {DEFAULT_SAMPLE_SEED}"
+    )
+    parser.add_argument(
+        "--stratify-by-domain", action="store_true",
+        help="Estratificar la muestra también por dominio del email."
+    )
+    parser.add_argument(
+        "--confidence", type=float, default=DEFAULT_CONFIDENCE,
+        help=f"Nivel de confianza de los intervalos de FP/FN y de los percentiles. Por defecto: {DEFAULT_CONFIDENCE}"
+    )
     parser.add_argument(
         "--log-level", type=str, default="INFO",
         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
@@ -131,6 +406,28 @@ def get_config() -> argparse.Namespace:
         datefmt="%Y-%m-%d %H:%M:%S",
     )
 
+    if args.workers < 1:
+        parser.error("--workers debe ser al menos 1.")
+    if args.max_in_flight is not None and args.max_in_flight < 1:
+        parser.error("--max-in-flight debe ser al menos 1.")
+    if args.virtual_users is not None and args.virtual_users < 1:
+        parser.error("--virtual-users debe ser al menos 1.")
+    if args.think_time is not None and args.think_time < 0:
+        parser.error("--think-time no puede ser negativo.")
+    if args.sample_size is not None and args.sample_size < 1:
+        parser.error("--sample-size debe ser al menos 1.")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence debe estar entre 0 y 1.")
+
+    # Modelo de carga global; las claves de cada API tienen prioridad
+    args.load = {
+        "load_model": args.load_model,
+        "arrival": args.arrival,
+        "arrival_seed": args.arrival_seed,
+        "virtual_users": args.virtual_users,
+        "think_time": args.think_time,
+    }
+
     # Cargar la configuración de las APIs
     args.apis = load_apis_config(args.config_file)
 
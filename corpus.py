@@ -0,0 +1,414 @@
+import os
+import csv
+import gzip
+import hashlib
+import random
+import logging
+from array import array
+from typing import IO, Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMAIL_COLUMN = "email"
+CONFLICT_POLICIES = ("keep-first", "drop")
+# Valores aceptados en la columna de etiqueta (en minúsculas)
+VALID_LABELS = frozenset({"1", "true", "valid", "valido", "válido", "yes", "si", "sí"})
+INVALID_LABELS = frozenset({"0", "false", "invalid", "invalido", "inválido", "no"})
+# Ejemplos de conflictos que se guardan en el reporte
+CONFLICT_SAMPLE_SIZE = 20
+DEFAULT_SAMPLE_SEED = 0
+
+
+def open_text(path: str) -> IO[str]:
+    """Abre un archivo de texto UTF-8, descomprimiéndolo si termina en .gz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def is_csv(path: str) -> bool:
+    return path.removesuffix(".gz").lower().endswith(".csv")
+
+
+def parse_label(value: str | None) -> bool | None:
+    """Etiqueta de la columna de un CSV (True válido, False inválido, None si no se reconoce)."""
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in VALID_LABELS:
+        return True
+    if value in INVALID_LABELS:
+        return False
+    return None
+
+
+def normalize_email(email: str) -> str:
+    """Forma canónica para deduplicar: sin espacios y en minúsculas."""
+    return email.strip().lower()
+
+
+def email_domain(email: str) -> str:
+    return email.rpartition("@")[2].strip().lower()
+
+
+def email_hash(email: str) -> int:
+    """Hash de 64 bits (blake2b) de un email; nunca 0 (0 = celda vacía en CompactHashSet)."""
+    return int.from_bytes(hashlib.blake2b(email.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class CompactHashSet:
+    """
+    Conjunto de hashes de 64 bits en un array('Q') con direccionamiento
+    abierto (sondeo lineal, carga máxima 1/2): ~16 bytes por elemento, en
+    lugar de los ~100 de un set de strings. Dos emails distintos con el
+    mismo hash (probabilidad ~n²/2^65) se tratarían como duplicados.
+    """
+
+    __slots__ = ("_table", "_mask", "_size")
+
+    def __init__(self, capacity: int = 1024):
+        slots = 1
+        while slots < capacity * 2:
+            slots <<= 1
+        self._table = array("Q", bytes(8 * slots))
+        self._mask = slots - 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _slot(self, h: int) -> int:
+        table, mask = self._table, self._mask
+        i = h & mask
+        while table[i] and table[i] != h:
+            i = (i + 1) & mask
+        return i
+
+    def __iter__(self) -> Iterator[int]:
+        return (h for h in self._table if h)
+
+    def __contains__(self, h: int) -> bool:
+        return self._table[self._slot(h)] == h
+
+    def add(self, h: int) -> bool:
+        """Agrega el hash; retorna False si ya estaba."""
+        i = self._slot(h)
+        if self._table[i] == h:
+            return False
+        self._table[i] = h
+        self._size += 1
+        if self._size * 2 > len(self._table):
+            self._grow()
+        return True
+
+    def _grow(self) -> None:
+        old = self._table
+        self._table = array("Q", bytes(8 * len(old) * 2))
+        self._mask = len(self._table) - 1
+        for h in old:
+            if h:
+                self._table[self._slot(h)] = h
+
+
+class CorpusSource:
+    """
+    Un archivo del corpus: texto con un email por línea (etiqueta fija) o
+    CSV con encabezado, con la columna del email y, opcionalmente, una
+    columna de etiqueta. Cualquiera de los dos puede estar comprimido (.gz).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        label: bool | None = None,
+        email_column: str = DEFAULT_EMAIL_COLUMN,
+        label_column: str | None = None,
+    ):
+        if label is None and label_column is None:
+            raise ValueError(f"'{path}' necesita una etiqueta fija o una columna de etiqueta.")
+        self.path = path
+        self.label = label
+        self.email_column = email_column
+        self.label_column = label_column
+
+    def records(self) -> Iterator[tuple[str | None, bool | None]]:
+        """
+        (email, etiqueta) de cada registro, en orden y sin cargar el archivo.
+        Los registros sin email o con etiqueta no reconocida se emiten con
+        None para que el índice de cada registro sea estable entre pasadas.
+        """
+        with open_text(self.path) as f:
+            if not is_csv(self.path):
+                for line in f:
+                    email = line.strip()
+                    if email:
+                        yield email, self.label
+                return
+
+            reader = csv.reader(f)
+            header = [name.strip() for name in next(reader, [])]
+            if self.email_column not in header:
+                raise ValueError(f"'{self.path}' no tiene la columna '{self.email_column}'.")
+            email_index = header.index(self.email_column)
+            label_index = None
+            if self.label_column is not None:
+                if self.label_column not in header:
+                    raise ValueError(f"'{self.path}' no tiene la columna '{self.label_column}'.")
+                label_index = header.index(self.label_column)
+            for row in reader:
+                email = row[email_index].strip() if email_index < len(row) else ""
+                if label_index is None:
+                    label = self.label
+                else:
+                    label = parse_label(row[label_index]) if label_index < len(row) else None
+                yield email or None, label
+
+
+class EmailCorpus:
+    """
+    Corpus de emails etiquetados que se lee en streaming: cada iteración
+    vuelve a recorrer los archivos y produce (email, es_válido) sin tener
+    la lista en memoria, así que es re-iterable (una pasada por API).
+
+    scan() hace una primera pasada que cuenta válidos/inválidos, detecta
+    duplicados (con normalize, tras normalize_email) y conflictos de
+    etiqueta (el mismo email como válido e inválido) usando dos
+    CompactHashSet, y guarda solo los índices de los registros a saltear.
+    Con conflicts="keep-first" se conserva la primera aparición; con
+    "drop" se excluyen todas las apariciones de un email en conflicto.
+    """
+
+    def __init__(
+        self,
+        sources: Iterable[CorpusSource],
+        normalize: bool = False,
+        dedupe: bool = True,
+        conflicts: str = "keep-first",
+    ):
+        if conflicts not in CONFLICT_POLICIES:
+            raise ValueError(
+                f"Política de conflictos no válida: '{conflicts}'. Valores permitidos: {', '.join(CONFLICT_POLICIES)}."
+            )
+        self.sources = list(sources)
+        self.normalize = normalize
+        self.dedupe = dedupe
+        self.conflicts = conflicts
+        self.valid_count = 0
+        self.invalid_count = 0
+        self._skips: list[array] = []
+        self._conflict_hashes: CompactHashSet | None = None
+        self._report: dict[str, Any] | None = None
+
+    @classmethod
+    def from_files(
+        cls,
+        valid_file: str | None = None,
+        invalid_file: str | None = None,
+        corpus_file: str | None = None,
+        email_column: str = DEFAULT_EMAIL_COLUMN,
+        label_column: str | None = None,
+        **options: Any,
+    ) -> "EmailCorpus":
+        """
+        Corpus a partir de las listas de válidos/inválidos y/o un archivo
+        con columna de etiqueta. Los archivos que no existen se omiten
+        con un warning (como read_emails_from_file).
+        """
+        sources = []
+        for path, label in ((valid_file, True), (invalid_file, False), (corpus_file, None)):
+            if not path:
+                continue
+            if not os.path.exists(path):
+                logger.warning("El archivo '%s' no fue encontrado.", path)
+                continue
+            sources.append(CorpusSource(path, label, email_column, label_column if label is None else None))
+        return cls(sources, **options).scan()
+
+    def _key(self, email: str) -> int:
+        return email_hash(normalize_email(email) if self.normalize else email)
+
+    def scan(self) -> "EmailCorpus":
+        """Primera pasada: conteos, duplicados y conflictos (ver docstring de la clase)."""
+        seen = {True: CompactHashSet(), False: CompactHashSet()}
+        conflict_hashes = CompactHashSet(16)
+        sample: list[str] = []
+        self._skips = []
+        valid = invalid = duplicates = unlabeled = conflict_count = 0
+
+        for source in self.sources:
+            skips = array("Q")
+            read = 0
+            for index, (email, label) in enumerate(source.records()):
+                read += 1
+                if email is None or label is None:
+                    unlabeled += 1
+                    skips.append(index)
+                    continue
+                if not self.dedupe:
+                    valid += label
+                    invalid += not label
+                    continue
+                h = self._key(email)
+                if h in seen[not label]:
+                    conflict_count += 1
+                    if conflict_hashes.add(h) and len(sample) < CONFLICT_SAMPLE_SIZE:
+                        sample.append(email)
+                    skips.append(index)
+                elif not seen[label].add(h):
+                    duplicates += 1
+                    skips.append(index)
+                else:
+                    valid += label
+                    invalid += not label
+            self._skips.append(skips)
+            logger.info("Leídos %d registros desde '%s'.", read, source.path)
+
+        # En modo "drop" también salen las primeras apariciones de los conflictos
+        self._conflict_hashes = conflict_hashes if self.conflicts == "drop" and len(conflict_hashes) else None
+        if self._conflict_hashes is not None:
+            # Cada email en conflicto se contó una vez, con la etiqueta de su primera aparición
+            for h in conflict_hashes:
+                if h in seen[True]:
+                    valid -= 1
+                else:
+                    invalid -= 1
+
+        self.valid_count, self.invalid_count = valid, invalid
+        self._report = {
+            "files": [source.path for source in self.sources],
+            "valid": valid,
+            "invalid": invalid,
+            "duplicates": duplicates,
+            "unlabeled": unlabeled,
+            "conflicts": len(conflict_hashes),
+            "conflicting_records": conflict_count,
+            "conflict_policy": self.conflicts,
+            "conflict_sample": sample,
+            "normalized": self.normalize,
+        }
+        if len(conflict_hashes):
+            logger.warning(
+                "%d emails aparecen como válidos e inválidos (%s). Ejemplos: %s",
+                len(conflict_hashes), self.conflicts, ", ".join(sample[:5]),
+            )
+        if duplicates or unlabeled:
+            logger.info("Corpus: %d duplicados y %d registros sin email/etiqueta omitidos.", duplicates, unlabeled)
+        return self
+
+    def report(self) -> dict[str, Any]:
+        """Resumen de la última pasada de scan()."""
+        if self._report is None:
+            self.scan()
+        return self._report
+
+    def __len__(self) -> int:
+        return self.valid_count + self.invalid_count
+
+    def __iter__(self) -> Iterator[tuple[str, bool]]:
+        if self._report is None:
+            self.scan()
+        for source, skips in zip(self.sources, self._skips):
+            next_skip = 0
+            for index, (email, label) in enumerate(source.records()):
+                if next_skip < len(skips) and skips[next_skip] == index:
+                    next_skip += 1
+                    continue
+                if self.normalize:
+                    email = normalize_email(email)
+                if self._conflict_hashes is not None and self._key(email) in self._conflict_hashes:
+                    continue
+                yield email, label
+
+
+def allocate_sample(stratum_sizes: dict[Any, int], size: int) -> dict[Any, int]:
+    """
+    Reparte size entre los estratos en proporción a su tamaño (método de
+    los mayores restos), sin superar el tamaño de ningún estrato.
+    """
+    population = sum(stratum_sizes.values())
+    if size >= population:
+        return dict(stratum_sizes)
+    quotas = {key: n * size // population for key, n in stratum_sizes.items()}
+    remaining = size - sum(quotas.values())
+    # Los lugares que faltan van a los estratos con mayor resto (desempate estable por orden)
+    by_remainder = sorted(stratum_sizes, key=lambda key: -(stratum_sizes[key] * size % population))
+    for key in by_remainder[:remaining]:
+        quotas[key] += 1
+    return quotas
+
+
+def stratified_sample(
+    emails: Iterable[tuple[str, bool]],
+    size: int,
+    seed: int = DEFAULT_SAMPLE_SEED,
+    by_domain: bool = False,
+) -> tuple[list[tuple[str, bool]], dict[str, Any]]:
+    """
+    Muestra estratificada y reproducible de un corpus en streaming.
+
+    Los estratos son la etiqueta (válido/inválido) y, con by_domain, el
+    dominio del email dentro de cada etiqueta. Una primera pasada cuenta
+    el tamaño de cada estrato y reparte size en proporción
+    (allocate_sample); una segunda pasada llena un reservorio por estrato
+    (algoritmo R) con un random.Random(seed). Así solo la muestra queda en
+    memoria, y con el mismo corpus y la misma semilla la muestra es la
+    misma (lo que permite retomar una ejecución muestreada).
+
+    Como la asignación es proporcional, la muestra es autoponderada: las
+    tasas de FP/FN de cada etiqueta se estiman directamente sobre ella.
+
+    emails tiene que poder recorrerse dos veces (EmailCorpus o una lista).
+    Retorna la muestra, en el orden del corpus, y un reporte con la
+    población y la muestra por etiqueta.
+    """
+    def stratum(email: str, label: bool) -> Any:
+        return (label, email_domain(email)) if by_domain else label
+
+    stratum_sizes: dict[Any, int] = {}
+    for email, label in emails:
+        key = stratum(email, label)
+        stratum_sizes[key] = stratum_sizes.get(key, 0) + 1
+    quotas = allocate_sample(stratum_sizes, size)
+
+    rng = random.Random(seed)
+    reservoirs: dict[Any, list[tuple[int, str, bool]]] = {key: [] for key in quotas}
+    seen = dict.fromkeys(quotas, 0)
+    for position, (email, label) in enumerate(emails):
+        key = stratum(email, label)
+        quota = quotas[key]
+        if not quota:
+            continue
+        index = seen[key]
+        seen[key] = index + 1
+        reservoir = reservoirs[key]
+        if index < quota:
+            reservoir.append((position, email, label))
+        else:
+            slot = rng.randrange(index + 1)
+            if slot < quota:
+                reservoir[slot] = (position, email, label)
+
+    chosen = sorted(item for reservoir in reservoirs.values() for item in reservoir)
+    sample = [(email, label) for _, email, label in chosen]
+
+    by_label = {True: [0, 0], False: [0, 0]}
+    for key, n in stratum_sizes.items():
+        label = key[0] if by_domain else key
+        by_label[label][0] += n
+        by_label[label][1] += quotas[key]
+    population = sum(stratum_sizes.values())
+    report = {
+        "population": population,
+        "sample_size": len(sample),
+        "fraction": len(sample) / population if population else 0.0,
+        "seed": seed,
+        "strata": "label+domain" if by_domain else "label",
+        "stratum_count": len(stratum_sizes),
+        "valid": {"population": by_label[True][0], "sample": by_label[True][1]},
+        "invalid": {"population": by_label[False][0], "sample": by_label[False][1]},
+    }
+    logger.info(
+        "Muestra estratificada (%s, semilla %d): %d de %d emails.",
+        report["strata"], seed, len(sample), population,
+    )
+    return sample, report
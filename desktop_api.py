@@ -4,13 +4,19 @@ import sys
 import json
 import asyncio
 import logging
+import functools
 import threading
 from typing import Any
 
 from config import load_apis_config, DEFAULT_CONFIG_FILE
-from file_handler import read_emails_from_file, save_results_to_json
-from api_client import run_api_tests
-from stats_calculator import calculate_statistics
+from file_handler import save_results_to_json
+from corpus import DEFAULT_SAMPLE_SEED, EmailCorpus, stratified_sample
+from api_client import run_multi_api_tests, api_rps
+from multiprocess_runner import run_multi_sharded_api_tests, run_sharded_api_tests
+from result_store import ResultStore
+from stats_calculator import calculate_statistics, merge_latency
+from rescore import rescore_file
+from checkpoint import DEFAULT_RUNS_DIR, RunCheckpoint, completed_emails, config_fingerprint, merge_previous_results
 from webhook_server import WebhookServer
 
 logger = logging.getLogger(__name__)
@@ -23,6 +29,15 @@ logging.basicConfig(
 )
 
 
+def _rate_with_interval(accuracy: dict[str, Any], rate: str) -> str:
+    """Tasa de FP/FN con su intervalo de confianza, para el log (ej. "1.2% [0.8–1.9]")."""
+    text = f"{accuracy[f'{rate}_rate_percent']:.1f}%"
+    interval = accuracy.get(f"{rate}_rate_ci_percent")
+    if interval:
+        text += f" [{interval[0]:.1f}–{interval[1]:.1f}]"
+    return text
+
+
 def get_base_path() -> str:
     """Retorna la ruta base del proyecto."""
     if getattr(sys, 'frozen', False):
@@ -106,25 +121,90 @@ class DesktopApi:
         """Retorna el estado actual de progreso."""
         return self._progress.copy()
 
-    def run_tests(self, rps: int = 16) -> dict[str, Any]:
-        """Lanza las pruebas en un hilo separado."""
+    def run_tests(
+        self,
+        rps: int = 16,
+        concurrent: bool = False,
+        workers: int = 1,
+        sample_size: int = 0,
+        stratify_by_domain: bool = False,
+        sample_seed: int | None = DEFAULT_SAMPLE_SEED,
+        checkpoint: bool = False,
+    ) -> dict[str, Any]:
+        """
+        Lanza las pruebas en un hilo separado.
+        Si concurrent es True, todas las APIs se prueban en paralelo; con
+        workers > 1 cada API se reparte entre varios procesos. Con
+        sample_size se prueba solo una muestra estratificada por etiqueta
+        (y por dominio con stratify_by_domain) del corpus. Con checkpoint
+        (como --checkpoint en la CLI) la ejecución se guarda en runs/ para
+        poder retomarla con resume_tests.
+        """
         if self._is_running:
             return {"success": False, "error": "Ya hay una prueba en ejecución."}
 
         self._is_running = True
         self._progress = {"status": "starting", "completed": 0, "total": 0, "current_api": "", "log": []}
 
-        thread = threading.Thread(target=self._run_tests_sync, args=(rps,), daemon=True)
+        sample_options = {
+            "sample_size": sample_size or None,
+            "sample_seed": DEFAULT_SAMPLE_SEED if sample_seed is None else sample_seed,
+            "stratify_by_domain": stratify_by_domain,
+        }
+        thread = threading.Thread(
+            target=self._run_tests_sync, args=(rps, concurrent, workers, None, sample_options, checkpoint),
+            daemon=True,
+        )
         thread.start()
 
         return {"success": True, "message": "Pruebas iniciadas."}
 
-    def _run_tests_sync(self, rps: int):
+    def resume_tests(
+        self, run_id: str | None = None, rps: int = 16, concurrent: bool = False, workers: int = 1,
+    ) -> dict[str, Any]:
+        """
+        Retoma una ejecución interrumpida (por defecto, la más reciente sin
+        terminar): saltea los emails ya procesados y combina los resultados.
+        Se retoma con el RPS, el paralelismo, los procesos y la muestra de
+        la ejecución original (rps, concurrent y workers solo se usan si el
+        checkpoint no los tiene); falla si cambió la configuración de APIs.
+        """
+        if self._is_running:
+            return {"success": False, "error": "Ya hay una prueba en ejecución."}
+
+        runs_dir = self._path(DEFAULT_RUNS_DIR)
+        run_id = run_id or RunCheckpoint.latest_unfinished(runs_dir)
+        if not run_id:
+            return {"success": False, "error": "No hay ejecuciones interrumpidas para retomar."}
+        if not os.path.exists(os.path.join(runs_dir, run_id)):
+            return {"success": False, "error": f"No existe la ejecución '{run_id}'."}
+
+        self._is_running = True
+        self._progress = {"status": "starting", "completed": 0, "total": 0, "current_api": "", "log": []}
+
+        thread = threading.Thread(
+            target=self._run_tests_sync, args=(rps, concurrent, workers, run_id), daemon=True,
+        )
+        thread.start()
+
+        return {"success": True, "message": f"Retomando la ejecución {run_id}."}
+
+    def _run_tests_sync(
+        self,
+        rps: int,
+        concurrent: bool = False,
+        workers: int = 1,
+        resume_run_id: str | None = None,
+        sample_options: dict[str, Any] | None = None,
+        save_checkpoint: bool = False,
+    ):
         """Ejecuta las pruebas sincrónicamente en un hilo."""
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
-            loop.run_until_complete(self._run_tests_async(rps))
+            loop.run_until_complete(
+                self._run_tests_async(rps, concurrent, workers, resume_run_id, sample_options, save_checkpoint)
+            )
         except Exception as e:
             self._progress["status"] = "error"
             self._progress["log"].append(f"Error fatal: {str(e)}")
@@ -133,7 +213,15 @@ class DesktopApi:
             self._is_running = False
             loop.close()
 
-    async def _run_tests_async(self, rps: int):
+    async def _run_tests_async(
+        self,
+        rps: int,
+        concurrent: bool = False,
+        workers: int = 1,
+        resume_run_id: str | None = None,
+        sample_options: dict[str, Any] | None = None,
+        save_checkpoint: bool = False,
+    ):
         """Lógica async de pruebas."""
         self._add_log("Cargando configuración...")
 
@@ -144,19 +232,80 @@ class DesktopApi:
             self._add_log(f"Error de configuración: {str(e)}")
             return
 
-        valid_emails = read_emails_from_file(self._path("valid_emails.txt"))
-        invalid_emails = read_emails_from_file(self._path("invalid_emails.txt"))
+        corpus = EmailCorpus.from_files(
+            self._path("valid_emails.txt"), self._path("invalid_emails.txt"),
+        )
 
-        if not valid_emails and not invalid_emails:
+        if not corpus:
             self._progress["status"] = "error"
             self._add_log("No se encontraron emails para procesar.")
             return
 
-        emails_to_process = [(e, True) for e in valid_emails] + [(e, False) for e in invalid_emails]
-        total_emails = len(emails_to_process)
+        corpus_report = corpus.report()
+        if corpus_report["duplicates"] or corpus_report["conflicts"]:
+            self._add_log(
+                f"Corpus: {corpus_report['duplicates']} duplicados omitidos, "
+                f"{corpus_report['conflicts']} emails en ambas listas (se conserva la primera aparición)."
+            )
 
+        # Checkpoint (opcional, o al retomar) para poder retomar: raw_response
+        # queda en memoria para results.json, pero no se escribe en
+        # runs/<run_id>/details.jsonl
+        runs_dir = self._path(DEFAULT_RUNS_DIR)
+        fingerprint = config_fingerprint(self._path(DEFAULT_CONFIG_FILE))
+        previous_results: dict[str, ResultStore] = {}
+        checkpoint: RunCheckpoint | None = None
+        if resume_run_id:
+            checkpoint = RunCheckpoint.load(resume_run_id, runs_dir)
+            if checkpoint.meta.get("config_fingerprint") not in (None, fingerprint):
+                self._progress["status"] = "error"
+                self._add_log(
+                    f"No se puede retomar {resume_run_id}: la configuración de APIs cambió desde entonces."
+                )
+                return
+            # Mismas opciones que la ejecución original
+            rps = checkpoint.meta.get("requests_per_second", rps)
+            concurrent = checkpoint.meta.get("concurrent", concurrent)
+            workers = checkpoint.meta.get("workers", workers)
+            previous_results = checkpoint.load_results()
+            self._add_log(
+                f"Retomando la ejecución {resume_run_id}: "
+                f"{sum(len(store) for store in previous_results.values())} resultados previos."
+            )
+            sample_options = {
+                key: checkpoint.meta.get(key) for key in ("sample_size", "sample_seed", "stratify_by_domain")
+            }
+        else:
+            sample_options = sample_options or {}
+            if save_checkpoint:
+                checkpoint = RunCheckpoint.create(
+                    runs_dir,
+                    drop_raw_response=False,
+                    config_fingerprint=fingerprint,
+                    requests_per_second=rps,
+                    concurrent=concurrent,
+                    workers=workers,
+                    **sample_options,
+                )
+                self._add_log(f"Checkpoint de la ejecución: {checkpoint.run_id}")
+
+        # Muestra estratificada (opcional): la misma para todas las APIs
+        emails_to_process, valid_count, invalid_count = corpus, corpus.valid_count, corpus.invalid_count
+        sampling = None
+        if sample_options.get("sample_size"):
+            emails_to_process, sampling = stratified_sample(
+                corpus,
+                sample_options["sample_size"],
+                sample_options.get("sample_seed") or DEFAULT_SAMPLE_SEED,
+                bool(sample_options.get("stratify_by_domain")),
+            )
+            valid_count, invalid_count = sampling["valid"]["sample"], sampling["invalid"]["sample"]
+            self._add_log(f"Muestra estratificada de {sampling['sample_size']} de {sampling['population']} emails.")
+
+        total_emails = len(emails_to_process)
         self._add_log(f"Emails a procesar por API: {total_emails}")
-        self._progress["total"] = total_emails * len(apis)
+        skip_emails_by_api = completed_emails(previous_results)
+        self._progress["total"] = total_emails * len(apis) - sum(len(done) for done in skip_emails_by_api.values())
 
         # ── Webhook server: iniciar si alguna API lo necesita ──
         needs_webhook = any(api.get("mode") == "webhook" for api in apis)
@@ -173,53 +322,108 @@ class DesktopApi:
                 return
 
         all_apis_results = {}
-        global_completed = 0
+        results_by_api: dict[str, ResultStore] = {}
+        metrics_by_api: dict[str, dict[str, Any]] = {}
+        completed = False
 
         try:
-            for api_config in apis:
-                api_name = api_config['name']
-                mode = api_config.get('mode', 'sync')
-                self._progress["current_api"] = api_name
+            if concurrent:
+                self._progress["current_api"] = ", ".join(api['name'] for api in apis)
                 self._progress["status"] = "running"
-                self._add_log(f"Probando API: {api_name} (modo: {mode})...")
+                self._add_log(f"Probando {len(apis)} APIs en paralelo...")
 
-                def on_progress(completed, total):
-                    nonlocal global_completed
-                    self._progress["completed"] = global_completed + completed
+                completed_by_api: dict[str, int] = {}
 
-                results = await run_api_tests(
+                def on_multi_progress(api_name, completed, total):
+                    completed_by_api[api_name] = completed
+                    self._progress["completed"] = sum(completed_by_api.values())
+
+                run_multi = run_multi_api_tests
+                if workers > 1:
+                    run_multi = functools.partial(run_multi_sharded_api_tests, workers=workers)
+                results_by_api, metrics_by_api = await run_multi(
                     emails_to_process,
-                    api_config,
+                    apis,
                     rps,
-                    on_progress=on_progress,
+                    on_progress=on_multi_progress,
                     webhook_server=wh_server,
+                    sink=checkpoint,
+                    skip_emails_by_api=skip_emails_by_api,
                 )
-
-                global_completed += total_emails
-
-                stats = calculate_statistics(
-                    results,
-                    len(valid_emails),
-                    len(invalid_emails),
-                    rps,
-                    api_config['endpoint'],
-                )
-
-                all_apis_results[api_name] = stats
-                fp = stats['accuracy']['false_positive_rate_percent']
-                fn = stats['accuracy']['false_negative_rate_percent']
-                avg = stats['performance']['average_response_time']
-                self._add_log(f"✓ {api_name}: FP={fp:.1f}%, FN={fn:.1f}%, Avg={avg:.3f}s")
+            else:
+                global_completed = 0
+
+                for api_config in apis:
+                    api_name = api_config['name']
+                    mode = api_config.get('mode', 'sync')
+                    self._progress["current_api"] = api_name
+                    self._progress["status"] = "running"
+                    self._add_log(f"Probando API: {api_name} (modo: {mode})...")
+
+                    def on_progress(completed, total):
+                        self._progress["completed"] = global_completed + completed
+
+                    metrics_by_api[api_name] = {}
+                    results_by_api[api_name] = await run_sharded_api_tests(
+                        emails_to_process,
+                        api_config,
+                        api_rps(api_config, rps),
+                        workers,
+                        on_progress=on_progress,
+                        webhook_server=wh_server,
+                        run_metrics=metrics_by_api[api_name],
+                        sink=checkpoint,
+                        skip_emails=skip_emails_by_api.get(api_name),
+                    )
+
+                    global_completed += total_emails - len(skip_emails_by_api.get(api_name, ()))
+            completed = True
         finally:
+            if checkpoint is not None:
+                checkpoint.close(completed=completed)
             # Siempre detener el servidor de webhooks
             if wh_server:
                 await wh_server.stop()
                 self._add_log("Servidor de webhooks detenido.")
+                wh_stats = wh_server.stats()
+                if wh_stats["late_callbacks"] or wh_stats["expired"]:
+                    self._add_log(
+                        f"Webhooks: {wh_stats['late_callbacks']} callbacks tardíos, "
+                        f"{wh_stats['expired']} vencidos por TTL."
+                    )
+
+        merge_previous_results(previous_results, results_by_api, metrics_by_api)
+
+        for api_config in apis:
+            api_name = api_config['name']
+            stats = calculate_statistics(
+                results_by_api[api_name],
+                valid_count,
+                invalid_count,
+                api_rps(api_config, rps),
+                api_config['endpoint'],
+                run_metrics=metrics_by_api[api_name],
+                sweep_field=api_config.get("sweep_field"),
+            )
+
+            all_apis_results[api_name] = stats
+            accuracy = stats['accuracy']
+            avg = stats['performance']['average_response_time']
+            self._add_log(
+                f"✓ {api_name}: FP={_rate_with_interval(accuracy, 'false_positive')}, "
+                f"FN={_rate_with_interval(accuracy, 'false_negative')}, Avg={avg:.3f}s"
+            )
+            if stats.get("early_stop", {}).get("requests_saved"):
+                self._add_log(f"  Parada temprana: {stats['early_stop']['requests_saved']} solicitudes ahorradas.")
 
         final_output = {
             "global_summary": {
                 "total_apis_tested": len(apis),
                 "total_emails_per_api": total_emails,
+                "corpus": corpus_report,
+                "sampling": sampling,
+                "run_id": checkpoint.run_id if checkpoint is not None else None,
+                "latency_percentiles": merge_latency(metrics_by_api.values()).percentiles(),
             },
             "individual_api_results": all_apis_results
         }
@@ -248,6 +452,23 @@ class DesktopApi:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def rescore(self, source_path: str | None = None) -> dict[str, Any]:
+        """
+        Re-evalúa las reglas actuales sobre las respuestas guardadas
+        (por defecto, results.json) sin enviar solicitudes.
+        """
+        try:
+            source_path = source_path or self._path("results.json")
+            if not os.path.exists(source_path):
+                return {"success": False, "error": "No hay resultados previos. Ejecutá las pruebas primero."}
+
+            api_configs = load_apis_config(self._path(DEFAULT_CONFIG_FILE), require_api_keys=False)
+            data = rescore_file(source_path, api_configs)
+            save_results_to_json(data, self._path("results_rescored.json"))
+            return {"success": True, "data": data}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
     def export_csv(self, api_name: str, details_json: str) -> dict[str, Any]:
         """Abre diálogo Guardar Como y exporta CSV."""
         try:
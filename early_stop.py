@@ -0,0 +1,239 @@
+import logging
+from typing import Any
+
+from stats_calculator import DEFAULT_CONFIDENCE, wilson_interval
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_REQUESTS = 100
+
+# Por etiqueta de origen: la tasa que se estima con sus resultados
+# (False = inválidos → falsos positivos, True = válidos → falsos negativos)
+RATES = {
+    False: ("invalid", "false_positive", "Invalido considerado valido"),
+    True: ("valid", "false_negative", "Valido considerado invalido"),
+}
+
+# Posiciones de los flags compartidos con los workers (ver ShardEarlyStop):
+# convergió la etiqueta False / True, y la ejecución se detuvo
+FLAG_STOPPED = 2
+
+
+class EarlyStopController:
+    """
+    Parada temprana secuencial: run_api_tests registra cada resultado y
+    consulta should_send() antes de despachar la siguiente solicitud.
+
+    Con los resultados de cada etiqueta se actualiza la tasa de FP
+    (inválidos) o de FN (válidos) y el ancho de su intervalo de Wilson.
+    Cuando una etiqueta tiene min_requests resultados y su intervalo mide
+    como mucho max_ci_width_percent puntos, su estimación convergió y no se
+    envían más emails de esa etiqueta; cuando convergen las dos, la
+    ejecución se detiene. También se detiene si se agota el presupuesto de
+    errores: max_errors errores, o una tasa de errores mayor a
+    max_error_rate_percent tras min_requests resultados.
+
+    Los errores (classification "Error") no cuentan para las tasas, como
+    en calculate_accuracy no cuentan como FP ni FN.
+    """
+
+    def __init__(
+        self,
+        max_ci_width_percent: float,
+        confidence: float = DEFAULT_CONFIDENCE,
+        min_requests: int = DEFAULT_MIN_REQUESTS,
+        max_error_rate_percent: float | None = None,
+        max_errors: int | None = None,
+    ):
+        self.max_ci_width_percent = max_ci_width_percent
+        self.confidence = confidence
+        self.min_requests = min_requests
+        self.max_error_rate_percent = max_error_rate_percent
+        self.max_errors = max_errors
+
+        self._results = {True: 0, False: 0}
+        self._wrong = {True: 0, False: 0}
+        self._converged_after: dict[bool, int | None] = {True: None, False: None}
+        self._done = 0
+        self._errors = 0
+        self.sent = 0
+        self.skipped = 0
+        self.stop_reason: str | None = None
+
+    @classmethod
+    def from_config(cls, early_stop: dict[str, Any]) -> "EarlyStopController":
+        """Crea el controlador desde la clave "early_stop" de una API (ValueError si es inválida)."""
+        if not isinstance(early_stop, dict):
+            raise ValueError("'early_stop' debe ser un objeto.")
+        width = early_stop.get("max_ci_width_percent")
+        if not isinstance(width, (int, float)) or isinstance(width, bool) or width <= 0:
+            raise ValueError("'early_stop.max_ci_width_percent' debe ser un número mayor a 0.")
+        confidence = early_stop.get("confidence", DEFAULT_CONFIDENCE)
+        if not isinstance(confidence, (int, float)) or not 0 < confidence < 1:
+            raise ValueError("'early_stop.confidence' debe ser un número entre 0 y 1.")
+        min_requests = early_stop.get("min_requests", DEFAULT_MIN_REQUESTS)
+        if not isinstance(min_requests, int) or isinstance(min_requests, bool) or min_requests < 1:
+            raise ValueError("'early_stop.min_requests' debe ser un entero mayor a 0.")
+        for key in ("max_error_rate_percent", "max_errors"):
+            value = early_stop.get(key)
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0):
+                raise ValueError(f"'early_stop.{key}' debe ser un número mayor a 0.")
+        return cls(
+            width,
+            confidence=confidence,
+            min_requests=min_requests,
+            max_error_rate_percent=early_stop.get("max_error_rate_percent"),
+            max_errors=early_stop.get("max_errors"),
+        )
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_reason is not None
+
+    def converged(self, is_valid_source: bool) -> bool:
+        return self._converged_after[is_valid_source] is not None
+
+    def should_send(self, is_valid_source: bool) -> bool:
+        """False si la ejecución se detuvo o la estimación de esa etiqueta ya convergió."""
+        return not self.stopped and not self.converged(is_valid_source)
+
+    def record_sent(self) -> None:
+        self.sent += 1
+
+    def record_skipped(self) -> None:
+        self.skipped += 1
+
+    def interval(self, is_valid_source: bool) -> tuple[float, float] | None:
+        """Intervalo de Wilson (en %) de la tasa de FN (válidos) o FP (inválidos)."""
+        interval = wilson_interval(self._wrong[is_valid_source], self._results[is_valid_source], self.confidence)
+        return (interval[0] * 100, interval[1] * 100) if interval else None
+
+    def record_result(self, result: dict[str, Any]) -> None:
+        """Actualiza las estimaciones con un resultado (necesita "is_valid_source")."""
+        self._done += 1
+        if result.get("classification") == "Error":
+            self._errors += 1
+            self._check_error_budget()
+            return
+
+        label = bool(result.get("is_valid_source"))
+        self._results[label] += 1
+        if result.get("classification") == RATES[label][2]:
+            self._wrong[label] += 1
+        if self.converged(label) or self._results[label] < self.min_requests:
+            return
+
+        low, high = self.interval(label)
+        if high - low <= self.max_ci_width_percent:
+            self._converged_after[label] = self._results[label]
+            logger.info(
+                "Tasa de %s convergió tras %d resultados %s: %.2f%% [%.2f–%.2f].",
+                "FN" if label else "FP", self._results[label], "válidos" if label else "inválidos",
+                self._wrong[label] / self._results[label] * 100, low, high,
+            )
+            if self.converged(True) and self.converged(False):
+                self.stop_reason = (
+                    f"intervalos de FP y FN de ancho <= {self.max_ci_width_percent} puntos "
+                    f"({self.confidence:.0%} de confianza)"
+                )
+
+    def publish(self, flags: Any) -> None:
+        """Copia las decisiones a los flags compartidos que consultan los ShardEarlyStop."""
+        flags[int(False)] = self.converged(False)
+        flags[int(True)] = self.converged(True)
+        flags[FLAG_STOPPED] = self.stopped
+
+    def _check_error_budget(self) -> None:
+        if self.stopped:
+            return
+        error_rate = self._errors / self._done * 100
+        if self.max_errors is not None and self._errors >= self.max_errors:
+            self.stop_reason = f"presupuesto de errores agotado: {self._errors} >= max_errors {self.max_errors}"
+        elif (
+            self.max_error_rate_percent is not None
+            and self._done >= self.min_requests
+            and error_rate > self.max_error_rate_percent
+        ):
+            self.stop_reason = (
+                f"presupuesto de errores agotado: {error_rate:.1f}% > "
+                f"max_error_rate_percent {self.max_error_rate_percent}%"
+            )
+        if self.stopped:
+            logger.warning("Parada temprana: %s.", self.stop_reason)
+
+    def summary(self, total: int = 0) -> dict[str, Any]:
+        """
+        Estimaciones finales y solicitudes ahorradas. Con total (emails a
+        procesar) el ahorro es total - enviadas; sin él, solo se conocen
+        los emails salteados antes de detener la ejecución.
+        """
+        labels = {}
+        for label, (name, rate, _) in RATES.items():
+            results = self._results[label]
+            interval = self.interval(label)
+            labels[name] = {
+                "results": results,
+                f"{rate}s": self._wrong[label],
+                f"{rate}_rate_percent": self._wrong[label] / results * 100 if results else 0.0,
+                f"{rate}_rate_ci_percent": list(interval) if interval else None,
+                "converged_after": self._converged_after[label],
+            }
+        return {
+            "settings": {
+                "max_ci_width_percent": self.max_ci_width_percent,
+                "confidence": self.confidence,
+                "min_requests": self.min_requests,
+                "max_error_rate_percent": self.max_error_rate_percent,
+                "max_errors": self.max_errors,
+            },
+            "stopped_early": self.stopped,
+            "stop_reason": self.stop_reason,
+            "requests_sent": self.sent,
+            "requests_skipped": self.skipped,
+            "requests_saved": max(0, total - self.sent) if total else self.skipped,
+            "errors": self._errors,
+            **labels,
+        }
+
+
+class ShardEarlyStop:
+    """
+    Parada temprana de un worker de multiprocess_runner. Las decisiones
+    las toma el proceso principal con los resultados combinados de todos
+    los workers (un EarlyStopController, así min_requests, max_errors y el
+    ancho del intervalo se aplican al total y no a cada parte) y las
+    publica en flags compartidos (multiprocessing.Array, ver publish); el
+    worker solo los consulta antes de cada envío y cuenta lo que envía y
+    saltea.
+    """
+
+    def __init__(self, flags: Any):
+        self._flags = flags
+        self.sent = 0
+        self.skipped = 0
+
+    @property
+    def stopped(self) -> bool:
+        return bool(self._flags[FLAG_STOPPED])
+
+    @property
+    def stop_reason(self) -> str | None:
+        return "detenida por el proceso principal" if self.stopped else None
+
+    def converged(self, is_valid_source: bool) -> bool:
+        return bool(self._flags[int(is_valid_source)])
+
+    def should_send(self, is_valid_source: bool) -> bool:
+        return not self.stopped and not self.converged(is_valid_source)
+
+    def record_sent(self) -> None:
+        self.sent += 1
+
+    def record_skipped(self) -> None:
+        self.skipped += 1
+
+    def record_result(self, result: dict[str, Any]) -> None:
+        """Los resultados los cuenta el proceso principal al recibir cada lote."""
+
+    def summary(self, total: int = 0) -> dict[str, Any]:
+        return {"requests_sent": self.sent, "requests_skipped": self.skipped}
@@ -1,6 +1,7 @@
 
 import os
 import json
+import time
 import logging
 from typing import Any
 
@@ -17,7 +18,7 @@ def read_emails_from_file(file_path: str) -> list[str]:
         return []
 
     with open(file_path, 'r', encoding='utf-8') as f:
-        emails = [line.strip() for line in f.readlines() if line.strip()]
+        emails = [email for email in (line.strip() for line in f) if email]
 
     logger.info("Leídos %d emails desde '%s'.", len(emails), file_path)
     return emails
@@ -36,3 +37,73 @@ def save_results_to_json(data: dict[str, Any], file_path: str) -> bool:
     except IOError as e:
         logger.error("Error al guardar el archivo de resultados: %s", e)
         return False
+
+
+class JsonlResultSink:
+    """
+    Escribe cada resultado como una línea JSON (JSONL) a medida que se
+    completa, en modo append. Las escrituras van a un buffer y se vuelcan
+    a disco cada flush_every líneas o cada flush_interval segundos, así que
+    un corte a mitad de la ejecución pierde como mucho ese último tramo.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        flush_every: int = 1000,
+        flush_interval: float = 5.0,
+        buffer_size: int = 1024 * 1024,
+        append: bool = False,
+        drop_raw_response: bool = True,
+        omit_raw_response: bool = False,
+    ):
+        """
+        Args:
+            file_path: Archivo JSONL de destino.
+            flush_every: Líneas escritas entre flushes.
+            flush_interval: Segundos máximos entre flushes.
+            buffer_size: Tamaño del buffer de escritura en bytes.
+            append: Si es True, continúa un archivo existente en lugar de truncarlo.
+            drop_raw_response: Si es True, run_api_tests descarta raw_response
+                de los resultados en memoria una vez escritos.
+            omit_raw_response: Si es True, no se escriben raw_response ni raw_body.
+        """
+        self.file_path = file_path
+        self.drop_raw_response = drop_raw_response
+        self.omit_raw_response = omit_raw_response
+        self._flush_every = flush_every
+        self._flush_interval = flush_interval
+        self._file = open(file_path, 'a' if append else 'w', encoding='utf-8', buffering=buffer_size)
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self.lines_written = 0
+
+    def write(self, result: dict[str, Any], **extra: Any) -> None:
+        """Agrega un resultado (más campos extra, ej. api=...) como una línea."""
+        record = {**extra, **result} if extra else result
+        if self.omit_raw_response and ("raw_response" in record or "raw_body" in record):
+            record = {key: value for key, value in record.items() if key not in ("raw_response", "raw_body")}
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._file.write("\n")
+        self.lines_written += 1
+        self._pending += 1
+        if self._pending >= self._flush_every or time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Vuelca el buffer al sistema operativo."""
+        self._file.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+            logger.info("Detalle de %d resultados guardado en '%s'.", self.lines_written, self.file_path)
+
+    def __enter__(self) -> "JsonlResultSink":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,27 @@
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el json de la stdlib
+    orjson = None
+
+# Backends disponibles en este entorno, del más rápido al más lento
+JSON_BACKENDS = ("orjson", "json") if orjson is not None else ("json",)
+DEFAULT_JSON_BACKEND = JSON_BACKENDS[0]
+
+
+def get_loads(backend: str | None = None) -> Callable[[bytes | str], Any]:
+    """
+    Decoder JSON del backend indicado ("orjson" o "json"); por defecto el
+    más rápido instalado. Acepta bytes o str, así que sirve como loads=
+    de aiohttp (ClientResponse.json, web.Request.json).
+    """
+    backend = backend or DEFAULT_JSON_BACKEND
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Backend JSON no disponible: '{backend}'. Disponibles: {', '.join(JSON_BACKENDS)}.")
+    return orjson.loads if backend == "orjson" else json.loads
+
+
+# Decoder usado para las respuestas de las APIs y los callbacks de webhooks
+loads = get_loads()
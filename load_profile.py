@@ -0,0 +1,298 @@
+import time
+import logging
+from typing import Any, Callable
+
+from latency_histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+def build_stages(profile: dict[str, Any]) -> list[dict[str, float]]:
+    """
+    Etapas (rps, duración en segundos) de un load_profile. Acepta una
+    lista explícita ("stages": [{"rps": 5, "duration": 30}, ...]) o una
+    rampa escalonada (start_rps, step_rps, step_duration, max_rps).
+    """
+    if not isinstance(profile, dict):
+        raise ValueError("'load_profile' debe ser un objeto.")
+
+    if "stages" in profile:
+        stages = profile["stages"]
+        if not isinstance(stages, list) or not stages:
+            raise ValueError("'load_profile.stages' debe ser una lista no vacía.")
+        result = []
+        for stage in stages:
+            if not isinstance(stage, dict):
+                raise ValueError("Cada etapa de 'load_profile.stages' debe ser un objeto con 'rps' y 'duration'.")
+            rps, duration = stage.get("rps"), stage.get("duration")
+            if not isinstance(rps, (int, float)) or rps <= 0:
+                raise ValueError("El 'rps' de cada etapa debe ser un número mayor a 0.")
+            if not isinstance(duration, (int, float)) or duration <= 0:
+                raise ValueError("La 'duration' de cada etapa debe ser un número mayor a 0.")
+            result.append({"rps": rps, "duration": duration})
+        return result
+
+    for key in ("start_rps", "step_rps", "step_duration", "max_rps"):
+        value = profile.get(key)
+        if not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(
+                f"'load_profile.{key}' debe ser un número mayor a 0 (o definir 'stages')."
+            )
+    if profile["max_rps"] < profile["start_rps"]:
+        raise ValueError("'load_profile.max_rps' no puede ser menor que 'start_rps'.")
+
+    stages = []
+    rps = profile["start_rps"]
+    while rps <= profile["max_rps"]:
+        stages.append({"rps": rps, "duration": profile["step_duration"]})
+        rps += profile["step_rps"]
+    return stages
+
+
+class LoadProfile:
+    """
+    Perfil de carga escalonado para encontrar el punto de saturación de
+    una API: run_api_tests cambia el rate al empezar cada etapa y etiqueta
+    cada solicitud con la etapa en la que salió.
+
+    Cuando una etapa terminó y llegaron todas sus respuestas, se evalúa su
+    p99 y su tasa de errores contra max_p99 / max_error_rate_percent; si
+    supera alguno, la ejecución se detiene. El throughput máximo sostenible
+    es el de la etapa más alta que no superó los umbrales. Una etapa que
+    no llegó a durar lo configurado (se acabaron los emails o el perfil se
+    detuvo antes) no se evalúa: con pocas solicitudes no dice nada sobre
+    ese rate. El throughput de cada etapa se calcula con el tiempo que
+    realmente estuvo vigente.
+    """
+
+    def __init__(
+        self,
+        stages: list[dict[str, float]],
+        max_p99: float | None = None,
+        max_error_rate_percent: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.stages = stages
+        self.max_p99 = max_p99
+        self.max_error_rate_percent = max_error_rate_percent
+        self._clock = clock
+        self._started: float | None = None
+        # Segundos desde el inicio hasta que se dejó de enviar
+        self._ended: float | None = None
+
+        # Fin (en segundos desde el inicio) de cada etapa
+        self._ends = []
+        elapsed = 0.0
+        for stage in stages:
+            elapsed += stage["duration"]
+            self._ends.append(elapsed)
+
+        n = len(stages)
+        self._sent = [0] * n
+        self._done = [0] * n
+        self._errors = [0] * n
+        self._latency = [LatencyHistogram() for _ in stages]
+        self._evaluated = [False] * n
+        self._breaches: list[list[str]] = [[] for _ in stages]
+        self._current = 0
+        self.stop_reason: str | None = None
+
+    @classmethod
+    def from_config(cls, profile: dict[str, Any], clock: Callable[[], float] = time.monotonic) -> "LoadProfile":
+        """Crea el perfil desde la clave "load_profile" de una API (ValueError si es inválida)."""
+        stages = build_stages(profile)
+        thresholds = {}
+        for key in ("max_p99", "max_error_rate_percent"):
+            value = profile.get(key)
+            if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+                raise ValueError(f"'load_profile.{key}' debe ser un número mayor a 0.")
+            thresholds[key] = value
+        return cls(stages, clock=clock, **thresholds)
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_reason is not None
+
+    def current_stage(self) -> int | None:
+        """
+        Etapa vigente según el tiempo transcurrido (el reloj arranca en la
+        primera llamada); None si el perfil terminó o se detuvo.
+        """
+        now = self._clock()
+        if self._started is None:
+            self._started = now
+        if self.stopped:
+            return None
+        elapsed = now - self._started
+        while self._current < len(self.stages) and elapsed >= self._ends[self._current]:
+            self._current += 1
+            self._evaluate_ready()
+            if self.stopped:
+                return None
+        if self._current >= len(self.stages):
+            return None
+        return self._current
+
+    def rate(self, stage: int) -> float:
+        return self.stages[stage]["rps"]
+
+    def record_sent(self, stage: int) -> None:
+        self._sent[stage] += 1
+
+    def record_result(self, stage: int, result: dict[str, Any]) -> None:
+        """Registra la respuesta de una solicitud enviada en la etapa indicada."""
+        self._done[stage] += 1
+        if result.get("classification") == "Error":
+            self._errors[stage] += 1
+        # En el modelo open, la latencia relevante es la corregida
+        latency = result.get("corrected_latency", result.get("duration"))
+        if latency is not None and not result.get("cache_hit"):
+            self._latency[stage].record(latency)
+        if stage < self._current:
+            self._evaluate_ready()
+
+    def end_sending(self) -> None:
+        """Marca el fin del envío (run_api_tests la llama al salir del loop de despacho)."""
+        if self._ended is None and self._started is not None:
+            self._ended = self._clock() - self._started
+
+    def finish(self) -> None:
+        """
+        Evalúa las etapas pendientes al terminar (ej. si se acabaron los
+        emails); solo las que duraron completas.
+        """
+        self.end_sending()
+        for stage in range(len(self.stages)):
+            if (
+                not self._evaluated[stage] and self._completed(stage)
+                and self._sent[stage] and self._done[stage] == self._sent[stage]
+            ):
+                self._evaluate(stage)
+
+    def _sending_time(self) -> float:
+        """Segundos de envío: hasta end_sending(), o hasta ahora si sigue enviando."""
+        if self._started is None:
+            return 0.0
+        return self._ended if self._ended is not None else self._clock() - self._started
+
+    def _completed(self, stage: int) -> bool:
+        return self._started is not None and self._sending_time() >= self._ends[stage]
+
+    def _elapsed(self, stage: int) -> float:
+        """Tiempo que la etapa estuvo vigente (menos que duration si el envío terminó antes)."""
+        start = self._ends[stage] - self.stages[stage]["duration"]
+        return max(0.0, min(self._ends[stage], self._sending_time()) - start)
+
+    def _evaluate_ready(self) -> None:
+        """Evalúa las etapas terminadas cuyas respuestas ya llegaron todas."""
+        for stage in range(min(self._current, len(self.stages))):
+            if not self._evaluated[stage] and self._done[stage] == self._sent[stage]:
+                self._evaluate(stage)
+
+    def _evaluate(self, stage: int) -> None:
+        self._evaluated[stage] = True
+        if not self._sent[stage]:
+            return
+        p99 = self._latency[stage].percentile(0.99)
+        error_rate = self._errors[stage] / self._done[stage] * 100
+        breaches = self._breaches[stage]
+        if self.max_p99 is not None and p99 > self.max_p99:
+            breaches.append(f"p99 {p99:.3f}s > max_p99 {self.max_p99}s")
+        if self.max_error_rate_percent is not None and error_rate > self.max_error_rate_percent:
+            breaches.append(f"errores {error_rate:.1f}% > max_error_rate_percent {self.max_error_rate_percent}%")
+        if breaches and not self.stopped:
+            self.end_sending()
+            self.stop_reason = f"Etapa {stage + 1} ({self.rate(stage)} RPS): {'; '.join(breaches)}"
+            logger.warning("Perfil de carga detenido. %s", self.stop_reason)
+        else:
+            logger.info(
+                "Etapa %d (%s RPS): p99=%.3fs, errores=%.1f%%.", stage + 1, self.rate(stage), p99, error_rate,
+            )
+
+    def summary(self) -> dict[str, Any]:
+        """Estadísticas por etapa y throughput máximo sostenible."""
+        stages = []
+        max_sustainable_rps = None
+        max_sustainable_throughput = None
+        start = 0.0
+        for i, stage in enumerate(self.stages):
+            done = self._done[i]
+            elapsed = self._elapsed(i)
+            throughput = done / elapsed if elapsed else 0.0
+            sustainable = self._evaluated[i] and bool(self._sent[i]) and not self._breaches[i]
+            stages.append({
+                "stage": i + 1,
+                "target_rps": stage["rps"],
+                "start": start,
+                "duration": stage["duration"],
+                "elapsed": elapsed,
+                "completed": self._completed(i),
+                "requests": done,
+                "errors": self._errors[i],
+                "error_rate_percent": self._errors[i] / done * 100 if done else 0.0,
+                "throughput_rps": throughput,
+                "percentiles": self._latency[i].percentiles(),
+                "evaluated": self._evaluated[i],
+                "breaches": self._breaches[i],
+            })
+            if sustainable and (max_sustainable_rps is None or stage["rps"] > max_sustainable_rps):
+                max_sustainable_rps = stage["rps"]
+                max_sustainable_throughput = throughput
+            start += stage["duration"]
+
+        return {
+            "stages": stages,
+            "thresholds": {"max_p99": self.max_p99, "max_error_rate_percent": self.max_error_rate_percent},
+            "stopped_early": self.stopped,
+            "stop_reason": self.stop_reason,
+            "max_sustainable_rps": max_sustainable_rps,
+            "max_sustainable_throughput": max_sustainable_throughput,
+        }
+
+
+def merge_profile_summaries(summaries: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Combina los LoadProfile.summary() de varios procesos que ejecutaron el
+    mismo perfil con una parte del rate cada uno: suma rates, solicitudes y
+    errores por etapa. Como los resúmenes no traen los histogramas, cada
+    percentil combinado es el máximo entre procesos (una cota superior).
+    """
+    first = summaries[0]
+    stages = []
+    for i, stage in enumerate(first["stages"]):
+        parts = [summary["stages"][i] for summary in summaries]
+        requests = sum(part["requests"] for part in parts)
+        errors = sum(part["errors"] for part in parts)
+        stages.append({
+            **stage,
+            "target_rps": sum(part["target_rps"] for part in parts),
+            "requests": requests,
+            "errors": errors,
+            "error_rate_percent": errors / requests * 100 if requests else 0.0,
+            "throughput_rps": sum(part["throughput_rps"] for part in parts),
+            "elapsed": max(part["elapsed"] for part in parts),
+            "completed": all(part["completed"] for part in parts),
+            "percentiles": {
+                name: max(part["percentiles"][name] for part in parts) for name in stage["percentiles"]
+            },
+            "evaluated": all(part["evaluated"] for part in parts),
+            "breaches": [breach for part in parts for breach in part["breaches"]],
+        })
+
+    max_sustainable_rps = None
+    max_sustainable_throughput = None
+    for stage in stages:
+        if stage["evaluated"] and stage["requests"] and not stage["breaches"]:
+            if max_sustainable_rps is None or stage["target_rps"] > max_sustainable_rps:
+                max_sustainable_rps = stage["target_rps"]
+                max_sustainable_throughput = stage["throughput_rps"]
+
+    stop_reasons = [summary["stop_reason"] for summary in summaries if summary["stop_reason"]]
+    return {
+        "stages": stages,
+        "thresholds": first["thresholds"],
+        "stopped_early": bool(stop_reasons),
+        "stop_reason": stop_reasons[0] if stop_reasons else None,
+        "max_sustainable_rps": max_sustainable_rps,
+        "max_sustainable_throughput": max_sustainable_throughput,
+    }
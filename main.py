@@ -1,14 +1,26 @@
 
 import asyncio
+import functools
 import sys
 import logging
-from config import get_config
-from file_handler import read_emails_from_file, save_results_to_json
-from api_client import run_api_tests
-from stats_calculator import calculate_statistics
+from config import get_config, load_apis_config
+from file_handler import save_results_to_json, JsonlResultSink
+from corpus import EmailCorpus, stratified_sample
+from api_client import run_multi_api_tests, api_rps
+from multiprocess_runner import run_multi_sharded_api_tests, run_sharded_api_tests
+from stats_calculator import calculate_statistics, merge_latency
+from response_cache import ResponseCache
+from checkpoint import RunCheckpoint, completed_emails, config_fingerprint, merge_previous_results
 
 logger = logging.getLogger(__name__)
 
+# Opciones que se guardan en el checkpoint y se restauran con --resume
+RESUMED_SETTINGS = (
+    "requests_per_second", "workers", "concurrent_apis", "max_in_flight", "load",
+    "valid_emails_file", "invalid_emails_file", "corpus_file", "email_column", "label_column",
+    "normalize_emails", "no_dedupe", "drop_conflicts", "sample_size", "sample_seed", "stratify_by_domain",
+)
+
 
 def create_progress_callback(api_name: str, total: int):
     """Crea un callback de progreso que imprime el avance."""
@@ -25,6 +37,103 @@ def create_progress_callback(api_name: str, total: int):
     return on_progress
 
 
+def create_multi_progress_callback(total_per_api: int, api_count: int, skipped: int = 0):
+    """
+    Crea un callback de progreso que suma el avance de varias APIs en paralelo.
+    skipped son los pares (api, email) ya hechos en una ejecución retomada.
+    """
+    completed_by_api: dict[str, int] = {}
+    grand_total = total_per_api * api_count - skipped
+    bar = create_progress_callback("todas", grand_total)
+
+    def on_progress(api_name: str, completed: int, total_count: int) -> None:
+        completed_by_api[api_name] = completed
+        bar(sum(completed_by_api.values()), grand_total)
+    return on_progress
+
+
+def restore_run_settings(args, meta: dict) -> None:
+    """
+    Aplica a args las opciones de la ejecución que se retoma (las de
+    RESUMED_SETTINGS, el JSONL de detalle y el archivo de configuración).
+    ValueError si la configuración de APIs cambió desde entonces: los
+    resultados previos no serían comparables con los nuevos.
+    """
+    args.details_file = meta.get("details_file")
+    for key in RESUMED_SETTINGS:
+        if key in meta:
+            setattr(args, key, meta[key])
+
+    config_file = meta.get("config_file", args.config_file)
+    if meta.get("config_fingerprint") not in (None, config_fingerprint(config_file)):
+        raise ValueError(
+            f"'{config_file}' cambió desde la ejecución '{meta['run_id']}'; "
+            "no se puede retomar con otra configuración de APIs."
+        )
+    if config_file != args.config_file:
+        args.config_file = config_file
+        args.apis = load_apis_config(config_file)
+
+
+async def execute_runs(args, emails_to_process, total_emails: int, sink=None, cache=None, skip_emails_by_api=None):
+    """
+    Ejecuta las pruebas de todas las APIs (en secuencia o en paralelo según
+    --concurrent-apis), repartidas entre --workers procesos si es mayor a 1.
+    Retorna (resultados por API, run_metrics por API).
+    skip_emails_by_api son los emails ya procesados por API (--resume).
+    """
+    skip_emails_by_api = skip_emails_by_api or {}
+    if args.concurrent_apis:
+        # Todas las APIs en la misma ventana de tiempo
+        logger.info("--- Probando %d APIs en paralelo ---", len(args.apis))
+        run_multi = run_multi_api_tests
+        if args.workers > 1:
+            run_multi = functools.partial(run_multi_sharded_api_tests, workers=args.workers)
+        results_by_api, metrics_by_api = await run_multi(
+            emails_to_process,
+            args.apis,
+            args.requests_per_second,
+            on_progress=create_multi_progress_callback(
+                total_emails, len(args.apis), sum(len(done) for done in skip_emails_by_api.values()),
+            ),
+            max_in_flight=args.max_in_flight,
+            sink=sink,
+            cache=cache,
+            skip_emails_by_api=skip_emails_by_api,
+            load=args.load,
+        )
+    else:
+        results_by_api, metrics_by_api = {}, {}
+
+        # Iterar sobre cada API configurada
+        for api_config in args.apis:
+            api_name = api_config['name']
+
+            logger.info("--- Probando API: %s ---", api_name)
+            logger.info("Endpoint: %s", api_config['endpoint'])
+
+            # Crear callback de progreso
+            progress_cb = create_progress_callback(api_name, total_emails)
+
+            # Ejecutar las pruebas para la API actual
+            metrics_by_api[api_name] = {}
+            results_by_api[api_name] = await run_sharded_api_tests(
+                emails_to_process,
+                api_config,
+                api_rps(api_config, args.requests_per_second),
+                args.workers,
+                on_progress=progress_cb,
+                run_metrics=metrics_by_api[api_name],
+                max_in_flight=args.max_in_flight,
+                sink=sink,
+                cache=cache,
+                skip_emails=skip_emails_by_api.get(api_name),
+                load=args.load,
+            )
+
+    return results_by_api, metrics_by_api
+
+
 async def main():
     """
     Función principal para orquestar las pruebas a las APIs.
@@ -44,53 +153,118 @@ async def main():
 
     logger.info("Iniciando pruebas de APIs...")
 
-    # Cargar listas de emails
-    valid_emails = read_emails_from_file(args.valid_emails_file)
-    invalid_emails = read_emails_from_file(args.invalid_emails_file)
+    # Estructura para almacenar todos los resultados
+    all_apis_results = {}
 
-    if not valid_emails and not invalid_emails:
+    # Ejecución que se retoma, con las mismas opciones que la original
+    checkpoint = None
+    previous_results = {}
+    if args.resume:
+        try:
+            checkpoint = RunCheckpoint.load(args.resume)
+            restore_run_settings(args, checkpoint.meta)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            return
+        except ValueError as e:
+            print(f"Error al retomar: {e}")
+            return
+        previous_results = checkpoint.load_results()
+        logger.info("Retomando la ejecución '%s'.", checkpoint.run_id)
+
+    # Corpus de emails: se lee en streaming (una pasada por API), deduplicado
+    try:
+        corpus = EmailCorpus.from_files(
+            args.valid_emails_file,
+            args.invalid_emails_file,
+            args.corpus_file,
+            email_column=args.email_column,
+            label_column=args.label_column,
+            normalize=args.normalize_emails,
+            dedupe=not args.no_dedupe,
+            conflicts="drop" if args.drop_conflicts else "keep-first",
+        )
+    except ValueError as e:
+        print(f"Error en el corpus de emails: {e}")
+        return
+
+    if not corpus:
         logger.error("No se encontraron emails para procesar. Abortando.")
         return
 
-    emails_to_process = [(email, True) for email in valid_emails] + \
-                        [(email, False) for email in invalid_emails]
+    # Checkpoint (opcional) para poder retomar la ejecución con --resume
+    if args.checkpoint and not checkpoint:
+        checkpoint = RunCheckpoint.create(
+            details_file=args.details_file,
+            # Sin --details-file el detalle va a results.json: se conserva raw_response
+            drop_raw_response=bool(args.details_file),
+            config_file=args.config_file,
+            config_fingerprint=config_fingerprint(args.config_file),
+            **{key: getattr(args, key) for key in RESUMED_SETTINGS},
+        )
+        logger.info("Para retomar esta ejecución si se interrumpe: --resume %s", checkpoint.run_id)
+
+    # Muestra estratificada (opcional): la misma para todas las APIs
+    emails_to_process, valid_count, invalid_count = corpus, corpus.valid_count, corpus.invalid_count
+    sampling = None
+    if args.sample_size:
+        emails_to_process, sampling = stratified_sample(
+            corpus, args.sample_size, args.sample_seed, args.stratify_by_domain,
+        )
+        valid_count, invalid_count = sampling["valid"]["sample"], sampling["invalid"]["sample"]
 
     total_emails = len(emails_to_process)
     logger.info("Total de emails a procesar por cada API: %d", total_emails)
 
-    # Estructura para almacenar todos los resultados
-    all_apis_results = {}
+    # Detalle por request en JSONL (opcional) mientras corre la prueba;
+    # con checkpoint, el propio checkpoint escribe el detalle
+    if checkpoint:
+        sink = checkpoint
+    else:
+        sink = JsonlResultSink(args.details_file) if args.details_file else None
+    # Caché de respuestas (opcional) para no repetir requests pagas
+    cache = ResponseCache(args.cache_file, args.cache_ttl, args.cache_max_entries) if args.cache else None
+    completed = False
+    try:
+        results_by_api, metrics_by_api = await execute_runs(
+            args, emails_to_process, total_emails, sink, cache, completed_emails(previous_results),
+        )
+        completed = True
+    finally:
+        if checkpoint:
+            checkpoint.close(completed=completed)
+        elif sink:
+            sink.close()
+        if cache:
+            cache.close()
+
+    merge_previous_results(previous_results, results_by_api, metrics_by_api)
 
-    # Iterar sobre cada API configurada
     for api_config in args.apis:
         api_name = api_config['name']
-        api_endpoint = api_config['endpoint']
-
-        logger.info("--- Probando API: %s ---", api_name)
-        logger.info("Endpoint: %s", api_endpoint)
-
-        # Crear callback de progreso
-        progress_cb = create_progress_callback(api_name, total_emails)
-
-        # Ejecutar las pruebas para la API actual
-        results = await run_api_tests(
-            emails_to_process,
-            api_config,
-            args.requests_per_second,
-            on_progress=progress_cb,
-        )
-
         logger.info("Prueba para '%s' completada. Generando estadísticas...", api_name)
 
         # Calcular estadísticas para la API actual
         stats = calculate_statistics(
-            results,
-            len(valid_emails),
-            len(invalid_emails),
-            args.requests_per_second,
-            api_endpoint,
+            results_by_api[api_name],
+            valid_count,
+            invalid_count,
+            api_rps(api_config, args.requests_per_second),
+            api_config['endpoint'],
+            run_metrics=metrics_by_api[api_name],
+            details_file=args.details_file,
+            sweep_field=api_config.get("sweep_field"),
+            confidence=args.confidence,
         )
 
+        if "load_profile" in stats:
+            profile = stats["load_profile"]
+            logger.info(
+                "'%s': throughput máximo sostenible %s RPS (%s).", api_name,
+                profile["max_sustainable_rps"] if profile["max_sustainable_rps"] is not None else "n/a",
+                profile["stop_reason"] or "sin superar los umbrales",
+            )
+
         # Guardar las estadísticas en el diccionario general
         all_apis_results[api_name] = stats
 
@@ -99,6 +273,12 @@ async def main():
         "global_summary": {
             "total_apis_tested": len(args.apis),
             "total_emails_per_api": total_emails,
+            "corpus": corpus.report(),
+            "sampling": sampling,
+            "details_file": args.details_file,
+            "run_id": checkpoint.run_id if checkpoint else None,
+            "cache": cache.stats() if cache else None,
+            "latency_percentiles": merge_latency(metrics_by_api.values()).percentiles(),
         },
         "individual_api_results": all_apis_results
     }
@@ -0,0 +1,356 @@
+"""
+Proveedor de validación de emails simulado (servidor aiohttp local) para
+medir el harness sin gastar créditos en APIs reales.
+
+Responde en /validate (GET o POST, con el email en param_name) con la
+forma que esperan las validation_rules (score, result y reason bajo
+response_path), con latencia según una distribución configurable,
+inyección de errores 5xx y 429, y opcionalmente entrega el resultado por
+webhook (un POST por resultado o en lotes) como un proveedor asíncrono.
+
+Un email se considera inválido si su parte local empieza con "invalid" o
+su dominio termina en ".invalid"; mislabel_rate invierte esa respuesta en
+una fracción de las solicitudes para simular errores del proveedor.
+
+Uso:
+    python mock_provider.py --port 9000 --latency lognormal --latency-median 0.05
+"""
+
+import math
+import random
+import asyncio
+import logging
+import argparse
+import itertools
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "lognormal", "bimodal")
+
+
+class LatencyModel:
+    """
+    Latencia simulada por solicitud, en segundos:
+    - "fixed": siempre latency.
+    - "lognormal": mediana latency y dispersión sigma (cola larga).
+    - "bimodal": latency, o slow_latency con probabilidad slow_fraction.
+    """
+
+    def __init__(
+        self,
+        distribution: str = "fixed",
+        latency: float = 0.0,
+        sigma: float = 0.5,
+        slow_latency: float = 1.0,
+        slow_fraction: float = 0.05,
+        rng: random.Random | None = None,
+    ):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Distribución de latencia no válida: '{distribution}'. "
+                f"Valores permitidos: {', '.join(LATENCY_DISTRIBUTIONS)}."
+            )
+        self.distribution = distribution
+        self.latency = latency
+        self.sigma = sigma
+        self.slow_latency = slow_latency
+        self.slow_fraction = slow_fraction
+        self._rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.distribution == "lognormal":
+            return self._rng.lognormvariate(math.log(self.latency), self.sigma) if self.latency > 0 else 0.0
+        if self.distribution == "bimodal" and self._rng.random() < self.slow_fraction:
+            return self.slow_latency
+        return self.latency
+
+
+def is_valid_email(email: str) -> bool:
+    """Verdad del proveedor simulado (ver docstring del módulo)."""
+    local, _, domain = email.partition("@")
+    return not (local.startswith("invalid") or domain.endswith(".invalid"))
+
+
+class MockProvider:
+    """
+    Servidor simulado. Se usa como context manager async:
+
+        async with MockProvider(latency=LatencyModel("lognormal", 0.05)) as provider:
+            api_config = provider.api_config(validation_rules=[...])
+
+    o con start()/stop(). stats() cuenta solicitudes, errores inyectados y
+    callbacks entregados.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: LatencyModel | None = None,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float | None = None,
+        mislabel_rate: float = 0.0,
+        response_path: str | None = "data",
+        param_name: str = "email",
+        webhook: bool = False,
+        callback_param: str = "callback_url",
+        batch_size: int = 1,
+        batch_interval: float = 0.05,
+        seed: int | None = None,
+    ):
+        """
+        Args:
+            host, port: Dirección en la que escuchar (port 0 = uno libre).
+            latency: Latencia simulada (por defecto 0).
+            error_rate: Fracción de solicitudes que responden 500.
+            throttle_rate: Fracción de solicitudes que responden 429.
+            retry_after: Valor del header Retry-After de los 429 (segundos).
+            mislabel_rate: Fracción de respuestas con el resultado invertido.
+            response_path: Ruta (dot notation) bajo la que va el resultado.
+            param_name: Parámetro (query o body JSON) con el email.
+            webhook: Si es True, responde {"job_id": ...} y entrega el
+                     resultado por POST al callback_param de la solicitud.
+            callback_param: Campo con la URL del callback (en el body o
+                            dentro de cualquier objeto del body).
+            batch_size: Resultados por POST de callback (>1 = lotes
+                        {"results": [...]}, cada uno con su job_id).
+            batch_interval: Segundos máximos que espera un lote incompleto.
+            seed: Semilla para reproducir latencias e inyecciones.
+        """
+        self._host = host
+        self._port = port
+        self._rng = random.Random(seed)
+        self.latency = latency or LatencyModel(rng=self._rng)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.mislabel_rate = mislabel_rate
+        self.response_path = response_path
+        self.param_name = param_name
+        self.webhook = webhook
+        self.callback_param = callback_param
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+
+        self._job_ids = itertools.count(1)
+        self._batches: dict[str, list[dict[str, Any]]] = {}
+        self._flushers: dict[str, asyncio.Task] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._counters = {"requests": 0, "errors": 0, "throttled": 0, "callbacks": 0, "callback_posts": 0}
+
+        self._runner: web.AppRunner | None = None
+        self._site: web.TCPSite | None = None
+        self._session: aiohttp.ClientSession | None = None
+        self.url: str | None = None
+
+    # ── Ciclo de vida ───────────────────────────────────────────────
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_route("*", "/validate", self._handle_validate)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        self._site = web.TCPSite(self._runner, self._host, self._port)
+        await self._site.start()
+        # Con port=0 el sistema elige un puerto libre: usar el real
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{self._host}:{port}/validate"
+        if self.webhook:
+            self._session = aiohttp.ClientSession()
+        logger.info("Proveedor simulado escuchando en %s", self.url)
+
+    async def stop(self) -> None:
+        """Entrega los lotes pendientes y detiene el servidor."""
+        for callback_url in list(self._batches):
+            await self._flush(callback_url)
+        for task in list(self._tasks) + list(self._flushers.values()):
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self) -> "MockProvider":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    # ── API pública ─────────────────────────────────────────────────
+
+    def api_config(self, **overrides: Any) -> dict[str, Any]:
+        """Entrada de apis_config.json que apunta a este servidor."""
+        config: dict[str, Any] = {
+            "name": "Mock",
+            "api_key": "mock",
+            "endpoint": self.url,
+            "method": "POST" if self.webhook else "GET",
+            "param_name": self.param_name,
+            "response_path": self.response_path,
+            "validation_rules": [{"field": "score", "operator": ">=", "value": 50}],
+        }
+        if self.webhook:
+            config["mode"] = "webhook"
+            config["webhook"] = {"callback_param": self.callback_param, "result_path": self.response_path}
+            if self.batch_size > 1:
+                config["webhook"].update({"id_field": "job_id", "batch_path": "results"})
+        config.update(overrides)
+        return config
+
+    def stats(self) -> dict[str, int]:
+        return dict(self._counters)
+
+    # ── Internos ────────────────────────────────────────────────────
+
+    def _result(self, email: str) -> dict[str, Any]:
+        """Body de una respuesta de validación, con el resultado bajo response_path."""
+        valid = is_valid_email(email)
+        if self.mislabel_rate and self._rng.random() < self.mislabel_rate:
+            valid = not valid
+        body: dict[str, Any] = {
+            "email": email,
+            "score": 90 if valid else 10,
+            "result": "deliverable" if valid else "undeliverable",
+            "reason": "accepted_email" if valid else "rejected_email",
+        }
+        if self.response_path:
+            for key in reversed(self.response_path.split(".")):
+                body = {key: body}
+        return body
+
+    def _find_callback_url(self, payload: Any) -> str | None:
+        """callback_param en el body, plano o dentro de un objeto (callback_wrapper_param)."""
+        if not isinstance(payload, dict):
+            return None
+        if isinstance(payload.get(self.callback_param), str):
+            return payload[self.callback_param]
+        for value in payload.values():
+            if isinstance(value, dict) and isinstance(value.get(self.callback_param), str):
+                return value[self.callback_param]
+        return None
+
+    async def _handle_validate(self, request: web.Request) -> web.Response:
+        self._counters["requests"] += 1
+        payload: Any = {}
+        if request.method == "POST" and request.can_read_body:
+            payload = await request.json()
+        email = request.query.get(self.param_name) or (payload.get(self.param_name) if isinstance(payload, dict) else None)
+        if not email:
+            return web.json_response({"error": f"falta '{self.param_name}'"}, status=400)
+
+        roll = self._rng.random()
+        if roll < self.throttle_rate:
+            self._counters["throttled"] += 1
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+            return web.json_response({"error": "rate limit"}, status=429, headers=headers)
+        if roll < self.throttle_rate + self.error_rate:
+            self._counters["errors"] += 1
+            return web.json_response({"error": "error interno simulado"}, status=500)
+
+        delay = self.latency.sample()
+        callback_url = self._find_callback_url(payload) or request.query.get(self.callback_param)
+        if self.webhook and callback_url:
+            job_id = f"job-{next(self._job_ids)}"
+            task = asyncio.create_task(self._deliver(callback_url, job_id, email, delay))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return web.json_response({"job_id": job_id, "status": "queued"})
+
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response(self._result(email))
+
+    async def _deliver(self, callback_url: str, job_id: str, email: str, delay: float) -> None:
+        """Entrega el resultado de un trabajo tras la latencia simulada."""
+        if delay:
+            await asyncio.sleep(delay)
+        result = {"job_id": job_id, **self._result(email)}
+        if self.batch_size <= 1:
+            await self._post(callback_url, result, 1)
+            return
+        batch = self._batches.setdefault(callback_url, [])
+        batch.append(result)
+        if len(batch) >= self.batch_size:
+            await self._flush(callback_url)
+        elif callback_url not in self._flushers:
+            self._flushers[callback_url] = asyncio.create_task(self._flush_later(callback_url))
+
+    async def _flush_later(self, callback_url: str) -> None:
+        await asyncio.sleep(self.batch_interval)
+        self._flushers.pop(callback_url, None)
+        await self._flush(callback_url)
+
+    async def _flush(self, callback_url: str) -> None:
+        batch = self._batches.pop(callback_url, None)
+        if batch:
+            await self._post(callback_url, {"results": batch}, len(batch))
+
+    async def _post(self, callback_url: str, body: dict[str, Any], results: int) -> None:
+        try:
+            async with self._session.post(callback_url, json=body) as response:
+                await response.read()
+            self._counters["callbacks"] += results
+            self._counters["callback_posts"] += 1
+        except aiohttp.ClientError as e:
+            logger.warning("No se pudo entregar el callback a %s: %s", callback_url, e)
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Proveedor de validación de emails simulado para benchmarks locales.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección en la que escuchar.")
+    parser.add_argument("--port", type=int, default=9000, help="Puerto en el que escuchar.")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="fixed", help="Distribución de latencia.")
+    parser.add_argument("--latency-median", type=float, default=0.05,
+                        help="Latencia (fixed), mediana (lognormal) o modo rápido (bimodal), en segundos.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Dispersión de la lognormal.")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Latencia del modo lento (bimodal).")
+    parser.add_argument("--slow-fraction", type=float, default=0.05, help="Fracción de solicitudes lentas (bimodal).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fracción de respuestas 429.")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After de los 429 (segundos).")
+    parser.add_argument("--mislabel-rate", type=float, default=0.0, help="Fracción de resultados invertidos.")
+    parser.add_argument("--response-path", default="data", help="Ruta del resultado en la respuesta ('' = raíz).")
+    parser.add_argument("--param-name", default="email", help="Parámetro con el email.")
+    parser.add_argument("--webhook", action="store_true", help="Entregar los resultados por webhook.")
+    parser.add_argument("--batch-size", type=int, default=1, help="Resultados por POST de callback.")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para resultados reproducibles.")
+    return parser.parse_args()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    provider = MockProvider(
+        host=args.host,
+        port=args.port,
+        latency=LatencyModel(
+            args.latency, args.latency_median, args.latency_sigma, args.slow_latency, args.slow_fraction, rng,
+        ),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        mislabel_rate=args.mislabel_rate,
+        response_path=args.response_path or None,
+        param_name=args.param_name,
+        webhook=args.webhook,
+        batch_size=args.batch_size,
+        seed=args.seed,
+    )
+    async with provider:
+        try:
+            await asyncio.Event().wait()
+        finally:
+            logger.info("Proveedor simulado detenido: %s", provider.stats())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(serve(get_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,460 @@
+import math
+import time
+import itertools
+import queue
+import asyncio
+import logging
+import multiprocessing
+from typing import Any, Container, Iterable, Iterator, TYPE_CHECKING
+
+from api_client import api_rps, load_settings, run_api_tests
+from latency_histogram import LatencyHistogram
+from load_profile import build_stages, merge_profile_summaries
+from early_stop import EarlyStopController, ShardEarlyStop
+from response_cache import ResponseCache
+from result_store import ResultStore
+
+if TYPE_CHECKING:
+    from webhook_server import WebhookServer
+    from file_handler import JsonlResultSink
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto (segundos) un worker manda sus resultados al proceso principal
+PROGRESS_INTERVAL = 0.2
+# Resultados por lote (se manda antes si pasa PROGRESS_INTERVAL)
+RESULT_BATCH_SIZE = 500
+
+
+def shard_api_config(api_config: dict[str, Any], workers: int, load: dict[str, Any] | None = None) -> dict[str, Any]:
+    """
+    Copia de api_config con la parte de la carga que le toca a cada uno de
+    los workers: rps, max_in_flight, usuarios virtuales, etapas del
+    load_profile y min_rps del rate adaptativo divididos entre los procesos.
+    """
+    shard = dict(api_config)
+    settings = load_settings(api_config, load)
+    shard.update(settings)
+    shard["virtual_users"] = max(1, math.ceil(settings["virtual_users"] / workers))
+
+    if api_config.get("rps"):
+        shard["rps"] = api_config["rps"] / workers
+    if api_config.get("max_in_flight"):
+        shard["max_in_flight"] = max(1, math.ceil(api_config["max_in_flight"] / workers))
+    if "load_profile" in api_config:
+        profile = api_config["load_profile"]
+        shard["load_profile"] = {
+            "stages": [
+                {"rps": stage["rps"] / workers, "duration": stage["duration"]}
+                for stage in build_stages(profile)
+            ],
+            "max_p99": profile.get("max_p99"),
+            "max_error_rate_percent": profile.get("max_error_rate_percent"),
+        }
+    if "adaptive_rate" in api_config:
+        adaptive = dict(api_config["adaptive_rate"])
+        adaptive["min_rps"] = adaptive.get("min_rps", 1.0) / workers
+        shard["adaptive_rate"] = adaptive
+    return shard
+
+
+class _BatchSink:
+    """
+    Sink de los workers: junta los resultados y los manda en lotes al
+    proceso principal por la cola de progreso, que escribe el sink real y
+    arma el ResultStore. Los resultados van completos (con raw_response):
+    el padre decide si los conserva.
+    """
+
+    drop_raw_response = False
+
+    def __init__(self, index: int, progress_queue: Any, batch_size: int = RESULT_BATCH_SIZE):
+        self._index = index
+        self._queue = progress_queue
+        self._batch_size = batch_size
+        self._batch: list[dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+
+    def write(self, result: dict[str, Any], api: str = "?") -> None:
+        self._batch.append(result)
+        if len(self._batch) >= self._batch_size or time.monotonic() - self._last_flush >= PROGRESS_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._batch:
+            self._queue.put(("results", self._index, self._batch))
+            self._batch = []
+        self._last_flush = time.monotonic()
+
+
+def _shard(emails: Iterable[tuple[str, bool]], index: int, workers: int) -> Iterator[tuple[str, bool]]:
+    """
+    Emails del worker index: uno de cada workers por posición. Los ya
+    procesados los saltea run_api_tests (skip_emails), que cede el event
+    loop mientras recorre un tramo largo de ellos.
+    """
+    return itertools.islice(emails, index, None, workers)
+
+
+def _shard_totals(
+    emails: Iterable[tuple[str, bool]],
+    workers: int,
+    skip_emails: Container[str] | None,
+) -> list[int]:
+    """Cantidad de emails de cada worker (con skip_emails hace una pasada de conteo)."""
+    if not skip_emails and hasattr(emails, "__len__"):
+        return [len(range(index, len(emails), workers)) for index in range(workers)]
+    totals = [0] * workers
+    for position, (email, _) in enumerate(emails):
+        if not (skip_emails and email in skip_emails):
+            totals[position % workers] += 1
+    return totals
+
+
+def _reiterable(emails: Iterable[tuple[str, bool]]) -> Iterable[tuple[str, bool]]:
+    """
+    Los workers recorren cada uno el corpus completo (EmailCorpus o una
+    lista) y se quedan con su parte; solo un iterador de una pasada (ej.
+    un generador) se materializa.
+    """
+    return list(emails) if iter(emails) is emails else emails
+
+
+def _run_worker(
+    index: int,
+    workers: int,
+    emails: Iterable[tuple[str, bool]],
+    skip_emails: Container[str] | None,
+    total: int,
+    api_config: dict[str, Any],
+    rps: float,
+    max_in_flight: int | None,
+    cache_settings: dict[str, Any] | None,
+    log_level: int,
+    progress_queue: Any,
+    stop_flags: Any = None,
+) -> None:
+    """
+    Proceso worker: corre run_api_tests sobre su parte de los emails en su
+    propio event loop. Los resultados salen en lotes por progress_queue y
+    al final un mensaje "done" con las métricas (o el error). Con
+    stop_flags, la parada temprana la decide el proceso principal (ver
+    early_stop.ShardEarlyStop).
+    """
+    logging.basicConfig(
+        level=log_level,
+        format=f"%(asctime)s [%(levelname)s] %(name)s[w{index}]: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    # Cada worker con su propia secuencia de llegadas Poisson (el worker 0
+    # usa la semilla configurada, que es la que se reporta)
+    api_config = {**api_config, "arrival_seed": api_config["arrival_seed"] + index}
+    cache = ResponseCache(**cache_settings) if cache_settings else None
+    sink = _BatchSink(index, progress_queue)
+    run_metrics: dict[str, Any] = {}
+    try:
+        asyncio.run(run_api_tests(
+            _shard(emails, index, workers), api_config, rps,
+            run_metrics=run_metrics,
+            max_in_flight=max_in_flight,
+            total=total,
+            sink=sink,
+            cache=cache,
+            skip_emails=skip_emails,
+            store_results=False,
+            early_stop=ShardEarlyStop(stop_flags) if stop_flags is not None else None,
+        ))
+        sink.flush()
+        progress_queue.put(("done", index, run_metrics, cache.stats() if cache else None, None))
+    except Exception as e:
+        logger.exception("Error en el worker %d.", index)
+        progress_queue.put(("done", index, None, None, f"{type(e).__name__}: {e}"))
+    finally:
+        if cache:
+            cache.close()
+
+
+def _merge_limiter_stats(stats_list: list[dict[str, Any]]) -> dict[str, Any]:
+    stats_list = [stats for stats in stats_list if stats]
+    if not stats_list:
+        return {}
+    sent = sum(stats["requests_sent"] for stats in stats_list)
+    merged = dict(stats_list[0])
+    merged.update({
+        "target_rps": sum(stats["target_rps"] for stats in stats_list),
+        "requests_sent": sent,
+        "achieved_rps": sum(stats["achieved_rps"] or 0.0 for stats in stats_list) or None,
+        "average_scheduling_lag": (
+            sum(stats["average_scheduling_lag"] * stats["requests_sent"] for stats in stats_list) / sent
+            if sent else 0.0
+        ),
+        "max_scheduling_lag": max(stats["max_scheduling_lag"] for stats in stats_list),
+    })
+    return merged
+
+
+def _merge_pool_stats(stats_list: list[dict[str, Any]]) -> dict[str, Any]:
+    merged = dict(stats_list[0])
+    for key in ("max_connections", "limit_per_host", "connections_created", "connections_reused", "requests_queued"):
+        if key in merged:
+            merged[key] = sum(stats.get(key, 0) for stats in stats_list)
+    acquired = merged.get("connections_created", 0) + merged.get("connections_reused", 0)
+    merged["reuse_ratio"] = merged.get("connections_reused", 0) / acquired if acquired else 0.0
+    queued = merged.get("requests_queued", 0)
+    merged["average_queue_wait"] = (
+        sum(stats.get("average_queue_wait", 0.0) * stats.get("requests_queued", 0) for stats in stats_list) / queued
+        if queued else 0.0
+    )
+    merged["max_queue_wait"] = max(stats.get("max_queue_wait", 0.0) for stats in stats_list)
+    return merged
+
+
+def merge_run_metrics(metrics_list: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Combina los run_metrics de los workers en uno equivalente al de una
+    ejecución en un solo proceso (sin wall_clock_time, que mide el padre,
+    ni early_stop, que decide el padre).
+    """
+    merged: dict[str, Any] = {
+        "workers": len(metrics_list),
+        "rate_limiter": _merge_limiter_stats([m.get("rate_limiter", {}) for m in metrics_list]),
+        "max_in_flight": sum(m.get("max_in_flight", 0) for m in metrics_list),
+        "latency_histogram": LatencyHistogram(),
+    }
+    for metrics in metrics_list:
+        merged["latency_histogram"].merge(metrics["latency_histogram"])
+
+    corrected = [m["corrected_latency_histogram"] for m in metrics_list if "corrected_latency_histogram" in m]
+    if corrected:
+        merged["corrected_latency_histogram"] = LatencyHistogram()
+        for histogram in corrected:
+            merged["corrected_latency_histogram"].merge(histogram)
+
+    if "load_model" in metrics_list[0]:
+        load_model = {**metrics_list[0]["load_model"], "workers": len(metrics_list)}
+        if "virtual_users" in load_model:
+            load_model["virtual_users"] = sum(m["load_model"]["virtual_users"] for m in metrics_list)
+        merged["load_model"] = load_model
+
+    if "adaptive_rate" in metrics_list[0]:
+        merged["adaptive_rate"] = {
+            key: sum(m["adaptive_rate"][key] for m in metrics_list)
+            for key in metrics_list[0]["adaptive_rate"]
+        }
+
+    if "connection_pool" in metrics_list[0]:
+        merged["connection_pool"] = _merge_pool_stats([m["connection_pool"] for m in metrics_list])
+
+    if "load_profile" in metrics_list[0]:
+        merged["load_profile"] = merge_profile_summaries([m["load_profile"] for m in metrics_list])
+
+    return merged
+
+
+async def run_sharded_api_tests(
+    emails_to_process: Iterable[tuple[str, bool]],
+    api_config: dict[str, Any],
+    rps: float,
+    workers: int,
+    on_progress: Any = None,
+    webhook_server: "WebhookServer | None" = None,
+    run_metrics: dict[str, Any] | None = None,
+    max_in_flight: int | None = None,
+    sink: "JsonlResultSink | None" = None,
+    cache: ResponseCache | None = None,
+    skip_emails: Container[str] | None = None,
+    load: dict[str, Any] | None = None,
+) -> ResultStore:
+    """
+    Igual que run_api_tests, pero reparte los emails entre workers procesos
+    (cada uno con su event loop y rps / workers) para que el costo de CPU
+    del cliente (decodificar JSON, evaluar reglas, logging) no se sume a
+    las latencias medidas a cientos de RPS.
+
+    Los emails no se copian a los workers: cada uno recorre el corpus
+    (re-iterable, ej. EmailCorpus) y se queda con uno de cada workers por
+    posición. Los resultados vuelven en lotes por la cola de progreso y el
+    proceso principal los escribe en el sink (y el checkpoint) y los
+    agrega al ResultStore a medida que llegan; al final combina los
+    histogramas de latencia y las métricas de los workers. Con
+    "early_stop", el proceso principal actualiza un EarlyStopController
+    con cada lote (los conteos combinados de todos los workers) y publica
+    sus decisiones en flags compartidos que los workers consultan antes de
+    cada envío. Con workers <= 1, o si la API usa webhooks (los
+    callbacks llegan al WebhookServer de este proceso), se ejecuta
+    run_api_tests en este proceso.
+    """
+    if workers <= 1 or (api_config.get("mode") == "webhook" and webhook_server is not None):
+        if workers > 1:
+            logger.info(
+                "'%s' usa webhooks: se ejecuta en el proceso principal, sin workers.", api_config.get("name", "?"),
+            )
+        return await run_api_tests(
+            emails_to_process, api_config, rps,
+            on_progress=on_progress,
+            webhook_server=webhook_server,
+            run_metrics=run_metrics,
+            max_in_flight=max_in_flight,
+            sink=sink,
+            cache=cache,
+            skip_emails=skip_emails,
+            load=load,
+        )
+
+    api_name = api_config.get("name", "?")
+    emails = _reiterable(emails_to_process)
+    # Con skip_emails es una pasada completa por el corpus: fuera del event loop
+    shard_totals = await asyncio.to_thread(_shard_totals, emails, workers, skip_emails)
+    total = sum(shard_totals)
+    shard_config = shard_api_config(api_config, workers, load)
+    shard_in_flight = max(1, math.ceil(max_in_flight / workers)) if max_in_flight else None
+    logger.info("Repartiendo %d emails de '%s' entre %d procesos.", total, api_name, workers)
+
+    # spawn: sin heredar el event loop ni los hilos (pywebview) del padre
+    ctx = multiprocessing.get_context("spawn")
+    progress_queue = ctx.Queue()
+    early_stop = stop_flags = None
+    if "early_stop" in api_config:
+        early_stop = EarlyStopController.from_config(api_config["early_stop"])
+        stop_flags = ctx.Array("b", 3)
+    processes = [
+        ctx.Process(
+            target=_run_worker,
+            args=(
+                index, workers, emails, skip_emails, shard_totals[index], shard_config, rps / workers,
+                shard_in_flight, cache.settings() if cache else None, logging.getLogger().getEffectiveLevel(),
+                progress_queue, stop_flags,
+            ),
+            daemon=True,
+        )
+        for index in range(workers)
+    ]
+
+    # Los lotes de resultados se escriben en el sink (y el checkpoint) y se
+    # agregan al ResultStore a medida que llegan
+    merged = ResultStore()
+    outputs: dict[int, tuple] = {}
+    started = time.perf_counter()
+    try:
+        for process in processes:
+            process.start()
+
+        while len(outputs) < workers:
+            try:
+                message = progress_queue.get_nowait()
+            except queue.Empty:
+                for index, process in enumerate(processes):
+                    if index not in outputs and process.exitcode is not None:
+                        # El último mensaje puede estar en tránsito: se espera
+                        # en un hilo para no frenar el event loop (en modo
+                        # concurrente lo comparten las demás APIs)
+                        try:
+                            message = await asyncio.to_thread(progress_queue.get, timeout=1.0)
+                        except queue.Empty:
+                            raise RuntimeError(
+                                f"El worker {index} de '{api_name}' terminó sin resultados "
+                                f"(exit code {process.exitcode})."
+                            ) from None
+                        break
+                else:
+                    await asyncio.sleep(0.05)
+                    continue
+
+            if message[0] == "results":
+                for result in message[2]:
+                    if sink is not None:
+                        sink.write(result, api=api_name)
+                        if sink.drop_raw_response:
+                            result.pop("raw_response", None)
+                            result.pop("raw_body", None)
+                    merged.append(result)
+                    if early_stop is not None:
+                        early_stop.record_result(result)
+                if early_stop is not None:
+                    early_stop.publish(stop_flags)
+                if on_progress:
+                    on_progress(len(merged), total)
+                continue
+
+            _, index, metrics, cache_stats, error = message
+            if error:
+                raise RuntimeError(f"El worker {index} de '{api_name}' falló: {error}")
+            outputs[index] = (metrics, cache_stats)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+    wall_clock_time = time.perf_counter() - started
+    if early_stop is not None and early_stop.stopped:
+        logger.info("Parada temprana de '%s': %s.", api_name, early_stop.stop_reason)
+
+    if cache is not None:
+        for _, cache_stats in outputs.values():
+            if cache_stats:
+                cache.hits += cache_stats["hits"]
+                cache.misses += cache_stats["misses"]
+
+    if on_progress:
+        on_progress(total, total)
+
+    if run_metrics is not None:
+        metrics_list = [outputs[index][0] for index in range(workers)]
+        run_metrics.update(merge_run_metrics(metrics_list))
+        run_metrics["wall_clock_time"] = wall_clock_time
+        if early_stop is not None:
+            early_stop.sent = sum(m["early_stop"]["requests_sent"] for m in metrics_list)
+            early_stop.skipped = sum(m["early_stop"]["requests_skipped"] for m in metrics_list)
+            run_metrics["early_stop"] = early_stop.summary(total)
+
+    logger.info(
+        "Prueba completada con %d procesos: %d emails procesados en %.2fs.", workers, len(merged), wall_clock_time,
+    )
+    return merged
+
+
+async def run_multi_sharded_api_tests(
+    emails_to_process: Iterable[tuple[str, bool]],
+    api_configs: list[dict[str, Any]],
+    rps: int,
+    workers: int,
+    on_progress: Any = None,
+    webhook_server: "WebhookServer | None" = None,
+    max_in_flight: int | None = None,
+    sink: "JsonlResultSink | None" = None,
+    cache: ResponseCache | None = None,
+    skip_emails_by_api: dict[str, Container[str]] | None = None,
+    load: dict[str, Any] | None = None,
+) -> tuple[dict[str, ResultStore], dict[str, dict[str, Any]]]:
+    """
+    Versión multiproceso de run_multi_api_tests: todas las APIs en paralelo,
+    cada una repartida entre workers procesos (ver run_sharded_api_tests).
+    on_progress recibe (api_name, completados, total).
+    """
+    emails = _reiterable(emails_to_process)
+    metrics_by_api: dict[str, dict[str, Any]] = {api["name"]: {} for api in api_configs}
+
+    def progress_for(api_name: str) -> Any:
+        if not on_progress:
+            return None
+        return lambda completed, total_count: on_progress(api_name, completed, total_count)
+
+    runs = [
+        run_sharded_api_tests(
+            emails,
+            api_config,
+            api_rps(api_config, rps),
+            workers,
+            on_progress=progress_for(api_config["name"]),
+            webhook_server=webhook_server,
+            run_metrics=metrics_by_api[api_config["name"]],
+            max_in_flight=max_in_flight,
+            sink=sink,
+            cache=cache,
+            skip_emails=(skip_emails_by_api or {}).get(api_config["name"]),
+            load=load,
+        )
+        for api_config in api_configs
+    ]
+    all_results = await asyncio.gather(*runs)
+    return dict(zip((api["name"] for api in api_configs), all_results)), metrics_by_api
@@ -0,0 +1,316 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketRateLimiter:
+    """
+    Rate limiter tipo token bucket, planificado contra un reloj monotónico
+    absoluto. Cada acquire() reserva el próximo slot del cronograma
+    (t0, t0 + 1/rate, t0 + 2/rate, ...), de modo que el exceso de sleep o
+    el lag del event loop no se acumulan: el siguiente slot se calcula
+    desde el slot anterior, no desde el momento en que se despertó.
+
+    burst indica cuántos tokens se pueden acumular; permite recuperar
+    el atraso de hasta burst slots enviando varias solicitudes seguidas.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            rate: Solicitudes por segundo objetivo.
+            burst: Tamaño máximo del bucket (mínimo 1).
+            clock: Reloj monotónico (inyectable para tests).
+        """
+        if rate <= 0:
+            raise ValueError(f"El rate debe ser mayor a 0 (recibido: {rate}).")
+        if burst < 1:
+            raise ValueError(f"El burst debe ser al menos 1 (recibido: {burst}).")
+
+        self._rate = float(rate)
+        self._interval = 1.0 / self._rate
+        self._burst = int(burst)
+        self._clock = clock
+
+        # Próximo slot ideal del cronograma (None hasta el primer acquire)
+        self._next_slot: float | None = None
+
+        # Métricas
+        self._count = 0
+        self._first_send: float | None = None
+        self._last_send: float | None = None
+        self._total_lag = 0.0
+        self._max_lag = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def burst(self) -> int:
+        return self._burst
+
+    def set_rate(self, rate: float) -> None:
+        """Cambia el rate objetivo sin perder la posición en el cronograma."""
+        if rate <= 0:
+            raise ValueError(f"El rate debe ser mayor a 0 (recibido: {rate}).")
+        self._rate = float(rate)
+        self._interval = 1.0 / self._rate
+
+    async def acquire(self) -> float:
+        """
+        Espera hasta el próximo slot disponible.
+
+        Returns:
+            Lag de planificación en segundos: cuánto después de su slot
+            ideal se liberó esta solicitud (0 si salió a tiempo).
+        """
+        now = self._clock()
+        if self._next_slot is None:
+            self._next_slot = now
+
+        ideal = self._next_slot
+        # Con el bucket lleno se puede adelantar hasta burst - 1 slots;
+        # un atraso mayor no se recupera (el bucket no acumula más tokens).
+        earliest = now - (self._burst - 1) * self._interval
+        slot = ideal if ideal >= earliest else earliest
+        self._next_slot = slot + self._interval
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+        sent = self._clock()
+        lag = sent - ideal if sent > ideal else 0.0
+
+        self._count += 1
+        if self._first_send is None:
+            self._first_send = sent
+        self._last_send = sent
+        self._total_lag += lag
+        if lag > self._max_lag:
+            self._max_lag = lag
+
+        return lag
+
+    def stats(self) -> dict[str, Any]:
+        """Resumen de la tasa de envío lograda y del lag de planificación."""
+        achieved_rps = None
+        if self._count > 1 and self._last_send > self._first_send:
+            achieved_rps = (self._count - 1) / (self._last_send - self._first_send)
+
+        return {
+            "target_rps": self._rate,
+            "burst": self._burst,
+            "requests_sent": self._count,
+            "achieved_rps": achieved_rps,
+            "average_scheduling_lag": self._total_lag / self._count if self._count else 0.0,
+            "max_scheduling_lag": self._max_lag,
+        }
+
+
+ARRIVAL_PROCESSES = ("constant", "poisson")
+
+
+class ArrivalSchedule:
+    """
+    Cronograma de llegadas fijo para carga open-loop: la solicitud i tiene
+    un tiempo de envío previsto que no depende de cuándo terminaron las
+    anteriores. A diferencia del TokenBucketRateLimiter, un atraso (event
+    loop ocupado, cupo de solicitudes en vuelo agotado) no corre el
+    cronograma: las solicitudes atrasadas salen en cuanto se puede y la
+    latencia se mide también desde el tiempo previsto (corrección de
+    coordinated omission).
+
+    Con arrival="constant" las llegadas están separadas 1/rate; con
+    "poisson" los intervalos son exponenciales de media 1/rate.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        arrival: str = "constant",
+        seed: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            rate: Llegadas por segundo.
+            arrival: "constant" o "poisson".
+            seed: Semilla de los intervalos Poisson (reproducibles).
+            clock: Reloj monotónico (inyectable para tests).
+        """
+        if rate <= 0:
+            raise ValueError(f"El rate debe ser mayor a 0 (recibido: {rate}).")
+        if arrival not in ARRIVAL_PROCESSES:
+            raise ValueError(f"Proceso de llegadas desconocido: '{arrival}'. Opciones: {ARRIVAL_PROCESSES}.")
+
+        self._rate = float(rate)
+        self._arrival = arrival
+        self._random = random.Random(seed)
+        self._clock = clock
+        self._next_arrival: float | None = None
+
+        # Métricas
+        self._count = 0
+        self._first_send: float | None = None
+        self._last_send: float | None = None
+        self._total_lag = 0.0
+        self._max_lag = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def set_rate(self, rate: float) -> None:
+        """Cambia el rate de las llegadas siguientes (ej. AimdRateController)."""
+        if rate <= 0:
+            raise ValueError(f"El rate debe ser mayor a 0 (recibido: {rate}).")
+        self._rate = float(rate)
+
+    def _interval(self) -> float:
+        if self._arrival == "poisson":
+            return self._random.expovariate(self._rate)
+        return 1.0 / self._rate
+
+    async def next_arrival(self) -> float:
+        """
+        Espera hasta la próxima llegada del cronograma (sin esperar si ya
+        pasó) y retorna su tiempo de envío previsto.
+        """
+        now = self._clock()
+        if self._next_arrival is None:
+            self._next_arrival = now
+        intended = self._next_arrival
+        self._next_arrival = intended + self._interval()
+        if intended > now:
+            await asyncio.sleep(intended - now)
+        return intended
+
+    def record_send(self, intended: float) -> float:
+        """Registra el envío real de una llegada; retorna su atraso en segundos."""
+        sent = self._clock()
+        lag = sent - intended if sent > intended else 0.0
+
+        self._count += 1
+        if self._first_send is None:
+            self._first_send = sent
+        self._last_send = sent
+        self._total_lag += lag
+        if lag > self._max_lag:
+            self._max_lag = lag
+        return lag
+
+    def elapsed_since(self, intended: float) -> float:
+        """Segundos desde el tiempo de envío previsto hasta ahora."""
+        return self._clock() - intended
+
+    def stats(self) -> dict[str, Any]:
+        """Mismo formato que TokenBucketRateLimiter.stats(), más el proceso de llegadas."""
+        achieved_rps = None
+        if self._count > 1 and self._last_send > self._first_send:
+            achieved_rps = (self._count - 1) / (self._last_send - self._first_send)
+
+        return {
+            "target_rps": self._rate,
+            "arrival": self._arrival,
+            "requests_sent": self._count,
+            "achieved_rps": achieved_rps,
+            "average_scheduling_lag": self._total_lag / self._count if self._count else 0.0,
+            "max_scheduling_lag": self._max_lag,
+        }
+
+
+class AimdRateController:
+    """
+    Control adaptativo AIMD (additive increase / multiplicative decrease)
+    sobre un TokenBucketRateLimiter (o un ArrivalSchedule): ante throttling (429/503) multiplica el
+    rate por decrease_factor y, mientras las respuestas salen bien, lo sube
+    de a increase_step RPS por segundo hasta volver a max_rate.
+
+    Tras una baja se ignoran los throttles durante cooldown segundos, así
+    las solicitudes que ya estaban en vuelo no lo bajan varias veces.
+    """
+
+    def __init__(
+        self,
+        limiter: "TokenBucketRateLimiter | ArrivalSchedule",
+        min_rate: float = 1.0,
+        max_rate: float | None = None,
+        decrease_factor: float = 0.5,
+        increase_step: float = 1.0,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            limiter: Rate limiter a controlar.
+            min_rate: Piso del rate (RPS).
+            max_rate: Techo del rate; por defecto, el rate inicial del limiter.
+            decrease_factor: Factor (0 < f < 1) aplicado ante un throttle.
+            increase_step: RPS que se recuperan por segundo sin throttling.
+            cooldown: Segundos mínimos entre dos bajas.
+            clock: Reloj monotónico (inyectable para tests).
+        """
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"decrease_factor debe estar entre 0 y 1 (recibido: {decrease_factor}).")
+        if min_rate <= 0:
+            raise ValueError(f"El min_rate debe ser mayor a 0 (recibido: {min_rate}).")
+
+        self._limiter = limiter
+        self._max_rate = max_rate if max_rate is not None else limiter.rate
+        self._min_rate = min(min_rate, self._max_rate)
+        self._decrease_factor = decrease_factor
+        self._increase_step = increase_step
+        self._cooldown = cooldown
+        self._clock = clock
+        self._last_decrease: float | None = None
+
+        self.decreases = 0
+        self.throttle_events = 0
+        self.lowest_rate = limiter.rate
+
+    def set_max_rate(self, rate: float) -> None:
+        """
+        Cambia el techo (ej. al avanzar de etapa en un perfil de carga): el
+        rate no vuelve a subir por encima de la etapa en curso.
+        """
+        self._max_rate = rate
+        self._min_rate = min(self._min_rate, rate)
+        if self._limiter.rate > rate:
+            self._limiter.set_rate(rate)
+
+    def on_throttle(self) -> None:
+        """Registra un throttle (429/503) y baja el rate si no está en cooldown."""
+        self.throttle_events += 1
+        now = self._clock()
+        if self._last_decrease is not None and now - self._last_decrease < self._cooldown:
+            return
+        self._last_decrease = now
+
+        rate = max(self._min_rate, self._limiter.rate * self._decrease_factor)
+        if rate < self._limiter.rate:
+            self._limiter.set_rate(rate)
+            self.decreases += 1
+            self.lowest_rate = min(self.lowest_rate, rate)
+            logger.warning("Throttling detectado: rate reducido a %.2f RPS.", rate)
+
+    def on_success(self) -> None:
+        """Registra una respuesta sin throttling: sube el rate de forma aditiva."""
+        rate = self._limiter.rate
+        if rate < self._max_rate:
+            # increase_step / rate por respuesta ≈ increase_step RPS por segundo
+            self._limiter.set_rate(min(self._max_rate, rate + self._increase_step / rate))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_rps": self._max_rate,
+            "min_rps": self._min_rate,
+            "final_rps": self._limiter.rate,
+            "lowest_rps": self.lowest_rate,
+            "throttle_events": self.throttle_events,
+            "rate_decreases": self.decreases,
+        }
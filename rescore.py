@@ -0,0 +1,233 @@
+"""
+Re-scoring offline: vuelve a evaluar las validation_rules actuales contra
+las respuestas crudas (raw_response) guardadas en una ejecución anterior,
+sin enviar ninguna solicitud.
+
+Uso:
+    python rescore.py results_details.jsonl [--config-file apis_config.json]
+                      [--output results_rescored.json]
+"""
+
+import os
+import json
+import logging
+import argparse
+from collections import Counter
+from typing import Any, Iterator
+
+from api_client import classify
+from config import load_apis_config, DEFAULT_CONFIG_FILE
+from file_handler import save_results_to_json
+from rule_engine import RuleEvaluator, compile_rules, extract_score, field_keys
+from stats_calculator import calculate_accuracy, calculate_threshold_sweep
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESCORE_OUTPUT = "results_rescored.json"
+
+# Clasificación → el email venía de la lista de válidos (True) o inválidos (False)
+_SOURCE_BY_CLASSIFICATION = {
+    "Valido considerado valido": True,
+    "Valido considerado invalido": True,
+    "Invalido considerado valido": False,
+    "Invalido considerado invalido": False,
+}
+
+
+def iter_detail_rows(file_path: str) -> Iterator[tuple[str, dict[str, Any]]]:
+    """
+    Recorre los resultados guardados como tuplas (api_name, fila).
+
+    Acepta un JSONL de detalle (--details-file, se lee línea por línea) o un
+    results.json: si trae "details" por API se usan esos, y si apunta a un
+    "details_file" se sigue ese archivo.
+    """
+    if file_path.endswith(".jsonl"):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row.get("api", "?"), row
+        return
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    details_files = set()
+    for api_name, api_results in data.get("individual_api_results", {}).items():
+        if "details" in api_results:
+            for row in api_results["details"]:
+                yield api_name, row
+        elif api_results.get("details_file"):
+            details_files.add(api_results["details_file"])
+
+    base_dir = os.path.dirname(os.path.abspath(file_path))
+    for details_file in sorted(details_files):
+        details_path = details_file if os.path.isabs(details_file) else os.path.join(base_dir, details_file)
+        yield from iter_detail_rows(details_path)
+
+
+def row_source(row: dict[str, Any]) -> bool | None:
+    """Indica si la fila corresponde a un email válido, inválido o desconocido."""
+    if "is_valid_source" in row:
+        return row["is_valid_source"]
+    return _SOURCE_BY_CLASSIFICATION.get(row.get("classification"))
+
+
+def result_path(api_config: dict[str, Any]) -> str:
+    """Ruta del resultado dentro de raw_response según el modo de la API."""
+    path = api_config.get("response_path", "data")
+    if api_config.get("mode") == "webhook":
+        path = api_config.get("webhook", {}).get("result_path", path)
+    return path
+
+
+def build_evaluators(api_configs: list[dict[str, Any]]) -> dict[str, RuleEvaluator]:
+    """Compila las reglas actuales de cada API sobre la ruta que corresponde a su modo."""
+    return {
+        api["name"]: compile_rules(api["validation_rules"], result_path(api))
+        for api in api_configs
+    }
+
+
+def rescore_rows(
+    rows: Iterator[tuple[str, dict[str, Any]]],
+    api_configs: list[dict[str, Any]],
+) -> dict[str, dict[str, Any]]:
+    """
+    Re-clasifica cada fila con las reglas actuales, acumulando solo
+    contadores (memoria constante sin importar la cantidad de filas).
+
+    Si la API define "sweep_field", también se guardan los pares
+    (score, origen) para el barrido de umbrales.
+
+    Returns:
+        Por API: la sección "summary" y la sección "accuracy" de
+        calculate_statistics con la nueva clasificación (y
+        "threshold_sweep" si corresponde).
+    """
+    evaluators = build_evaluators(api_configs)
+    sweep_fields = {api["name"]: api["sweep_field"] for api in api_configs if api.get("sweep_field")}
+    sweep_keys = {
+        api["name"]: field_keys(api["sweep_field"], result_path(api))
+        for api in api_configs if api.get("sweep_field")
+    }
+    scored: dict[str, list[tuple[float, bool]]] = {name: [] for name in sweep_fields}
+    counts: dict[str, Counter] = {}
+    sources: dict[str, Counter] = {}
+    changed: Counter = Counter()
+    skipped: Counter = Counter()
+    without_response: Counter = Counter()
+
+    for api_name, row in rows:
+        evaluator = evaluators.get(api_name)
+        if evaluator is None:
+            skipped[api_name] += 1
+            continue
+
+        is_valid_source = row_source(row)
+        source_counts = sources.setdefault(api_name, Counter())
+        source_counts["valid" if is_valid_source else "invalid" if is_valid_source is False else "unknown"] += 1
+
+        raw_response = row.get("raw_response")
+        if raw_response is None or is_valid_source is None:
+            # Errores (o filas sin respuesta guardada): se mantienen como estaban
+            classification = row.get("classification", "Error")
+            if raw_response is None and classification != "Error":
+                without_response[api_name] += 1
+        else:
+            classification = classify(is_valid_source, evaluator.evaluate(raw_response))
+            if api_name in sweep_keys:
+                score = extract_score(raw_response, sweep_keys[api_name])
+                if score is not None:
+                    scored[api_name].append((score, is_valid_source))
+
+        counts.setdefault(api_name, Counter())[classification] += 1
+        if classification != row.get("classification"):
+            changed[api_name] += 1
+
+    for api_name, n in skipped.items():
+        logger.warning("Se omitieron %d filas de '%s': la API no está en la configuración actual.", n, api_name)
+    for api_name, n in without_response.items():
+        logger.warning(
+            "%d filas de '%s' no tienen raw_response y conservan su clasificación original "
+            "(usar el JSONL de --details-file para re-evaluarlas).", n, api_name
+        )
+
+    output = {}
+    for api_name, classification_counts in counts.items():
+        total_valid = sources[api_name]["valid"]
+        total_invalid = sources[api_name]["invalid"]
+        output[api_name] = {
+            "summary": {
+                "total_requests": sum(classification_counts.values()),
+                "valid_source_emails": total_valid,
+                "invalid_source_emails": total_invalid,
+                "unknown_source_rows": sources[api_name]["unknown"],
+                "changed_classifications": changed[api_name],
+            },
+            "accuracy": calculate_accuracy(classification_counts, total_valid, total_invalid),
+        }
+        if api_name in sweep_fields:
+            output[api_name]["threshold_sweep"] = calculate_threshold_sweep(
+                scored[api_name], sweep_fields[api_name]
+            )
+    return output
+
+
+def rescore_file(file_path: str, api_configs: list[dict[str, Any]]) -> dict[str, Any]:
+    """Re-evalúa un archivo de resultados y arma la salida con formato de results.json."""
+    api_results = rescore_rows(iter_detail_rows(file_path), api_configs)
+    for api_name, stats in api_results.items():
+        logger.info(
+            "Re-scoring de '%s': %d filas, %d cambiaron de clasificación, FP=%.2f%%, FN=%.2f%%",
+            api_name, stats["summary"]["total_requests"], stats["summary"]["changed_classifications"],
+            stats["accuracy"]["false_positive_rate_percent"], stats["accuracy"]["false_negative_rate_percent"],
+        )
+    return {
+        "global_summary": {
+            "total_apis_tested": len(api_results),
+            "rescored_from": file_path,
+        },
+        "individual_api_results": api_results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Re-evalúa las validation_rules actuales sobre las respuestas guardadas de una ejecución anterior."
+    )
+    parser.add_argument("source", help="results.json o archivo JSONL de detalle (--details-file).")
+    parser.add_argument(
+        "--config-file", type=str, default=DEFAULT_CONFIG_FILE,
+        help=f"Archivo JSON con la configuración de las APIs. Por defecto: {DEFAULT_CONFIG_FILE}"
+    )
+    parser.add_argument(
+        "--output", type=str, default=DEFAULT_RESCORE_OUTPUT,
+        help=f"Archivo de salida. Por defecto: {DEFAULT_RESCORE_OUTPUT}"
+    )
+    parser.add_argument(
+        "--log-level", type=str, default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Nivel de logging. Por defecto: INFO"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    try:
+        api_configs = load_apis_config(args.config_file, require_api_keys=False)
+        output = rescore_file(args.source, api_configs)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+
+    save_results_to_json(output, args.output)
+
+
+if __name__ == "__main__":
+    main()
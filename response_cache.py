@@ -0,0 +1,155 @@
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = "response_cache.sqlite"
+DEFAULT_CACHE_TTL = 7 * 24 * 3600  # segundos
+DEFAULT_CACHE_MAX_ENTRIES = 1_000_000
+
+
+class ResponseCache:
+    """
+    Caché local de respuestas de APIs en SQLite, para re-ejecutar los mismos
+    corpus contra los mismos proveedores sin volver a pagar cada request.
+
+    La clave es un hash de (endpoint, método, param_name, email). Las
+    entradas vencen después de ttl segundos y, si se supera max_entries,
+    se eliminan las más antiguas.
+    """
+
+    def __init__(
+        self,
+        file_path: str = DEFAULT_CACHE_FILE,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+        evict_every: int = 1000,
+        commit_every: int = 100,
+        commit_interval: float = 1.0,
+    ):
+        """
+        Args:
+            file_path: Archivo SQLite (se crea si no existe).
+            ttl: Segundos que una respuesta se considera fresca.
+            max_entries: Máximo de respuestas guardadas.
+            evict_every: Cantidad de inserciones entre pasadas de eviction.
+            commit_every: Inserciones agrupadas en cada commit.
+            commit_interval: Segundos máximos que una inserción espera su commit.
+        """
+        self.file_path = file_path
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._evict_every = evict_every
+        self._puts_since_evict = 0
+        self._commit_every = commit_every
+        self._commit_interval = commit_interval
+        self._pending_puts = 0
+        self._last_commit = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(file_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " created_at REAL NOT NULL,"
+            " body TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses (created_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(api_config: dict[str, Any], email: str) -> str:
+        """Huella de la solicitud: endpoint, método, param_name y email."""
+        fingerprint = json.dumps([
+            api_config["endpoint"],
+            api_config.get("method", "GET").upper(),
+            api_config.get("param_name", "email"),
+            email,
+        ])
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        """Retorna la respuesta guardada si existe y está fresca, o None."""
+        row = self._conn.execute(
+            "SELECT body, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self._ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Any) -> None:
+        """
+        Guarda (o reemplaza) la respuesta de una solicitud. El commit se
+        agrupa cada commit_every inserciones o commit_interval segundos,
+        para no bloquear el event loop con un commit por respuesta.
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, created_at, body) VALUES (?, ?, ?)",
+            (key, time.time(), json.dumps(response, ensure_ascii=False)),
+        )
+        self._pending_puts += 1
+        if (
+            self._pending_puts >= self._commit_every
+            or time.monotonic() - self._last_commit >= self._commit_interval
+        ):
+            self.flush()
+
+        self._puts_since_evict += 1
+        if self._puts_since_evict >= self._evict_every:
+            self.evict()
+
+    def flush(self) -> None:
+        """Confirma las inserciones pendientes."""
+        self._conn.commit()
+        self._pending_puts = 0
+        self._last_commit = time.monotonic()
+
+    def evict(self) -> int:
+        """Elimina las entradas vencidas y las más antiguas por encima de max_entries."""
+        self._puts_since_evict = 0
+        removed = self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (time.time() - self._ttl,)
+        ).rowcount
+
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self._max_entries
+        if excess > 0:
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY created_at LIMIT ?)", (excess,)
+            ).rowcount
+
+        self.flush()
+        if removed:
+            logger.debug("Caché: %d entradas eliminadas.", removed)
+        return removed
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def settings(self) -> dict[str, Any]:
+        """Argumentos para abrir la misma caché desde otro proceso."""
+        return {"file_path": self.file_path, "ttl": self._ttl, "max_entries": self._max_entries}
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        self.evict()
+        self._conn.close()
+        logger.info("Caché de respuestas cerrada (%d hits, %d misses).", self.hits, self.misses)
@@ -0,0 +1,361 @@
+import json
+import math
+from array import array
+from collections import Counter
+from typing import Any, Iterable, Iterator, Sequence
+
+from tracing import PHASES
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: acelera los agregados y habilita as_numpy()
+    np = None
+
+# Clasificaciones posibles (ver api_client.classify); ocupan los códigos 1..5
+CLASSIFICATIONS = (
+    "Valido considerado valido",
+    "Valido considerado invalido",
+    "Invalido considerado valido",
+    "Invalido considerado invalido",
+    "Error",
+)
+
+# Campos con columna propia; cualquier otro se guarda aparte por fila
+KNOWN_FIELDS = frozenset({
+    "email", "duration", "classification", "response_reason", "error_message",
+    "raw_response", "timings", "scheduling_lag", "cache_hit", "is_valid_source", "score",
+    "attempts", "retry_wait", "throttle_events", "corrected_latency", "stage",
+})
+
+# Bits de la columna flags
+_SOURCE_KNOWN = 1
+_VALID_SOURCE = 2
+_CACHE_HIT = 4
+_HAS_TIMINGS = 8
+_CONNECTION_REUSED = 16
+
+_NAN = math.nan
+
+
+def _number(value: Any) -> float:
+    return _NAN if value is None else value
+
+
+class ResultStore:
+    """
+    Resultados de una ejecución guardados por columnas en lugar de una
+    lista de dicts: duraciones, lags, scores y fases en array('d') (NaN =
+    sin dato), clasificaciones y reasons/errores como códigos enteros sobre
+    una tabla de textos compartida, y las raw_response serializadas en un
+    buffer aparte al que cada fila apunta con un offset.
+
+    Se comporta como una secuencia de solo lectura de dicts (len, índice,
+    iteración), así que el código que recorre resultados sigue funcionando;
+    calculate_statistics usa las columnas directamente.
+    """
+
+    __slots__ = (
+        "emails", "durations", "classification_codes", "reason_codes", "error_codes",
+        "scheduling_lags", "scores", "flags", "phase_columns", "timing_totals",
+        "raw_offsets", "raw_ends", "raw_blob", "attempts", "retry_waits", "throttle_events",
+        "corrected_latencies", "stages", "_labels", "_label_codes", "_extras",
+    )
+
+    def __init__(self, results: Iterable[dict[str, Any]] = ()):
+        self.emails: list[str | None] = []
+        self.durations = array('d')
+        self.classification_codes = array('I')
+        self.reason_codes = array('I')
+        self.error_codes = array('I')
+        self.scheduling_lags = array('d')
+        self.scores = array('d')
+        self.flags = array('B')
+        self.phase_columns = {phase: array('d') for phase in PHASES}
+        self.timing_totals = array('d')
+        self.raw_offsets = array('q')
+        self.raw_ends = array('q')
+        self.raw_blob = bytearray()
+        self.attempts = array('H')
+        self.retry_waits = array('d')
+        self.throttle_events = array('H')
+        self.corrected_latencies = array('d')
+        self.stages = array('H')  # etapa del perfil de carga (0 = sin perfil)
+        # Código 0 = sin valor; 1..5 = CLASSIFICATIONS
+        self._labels: list[Any] = [None, *CLASSIFICATIONS]
+        self._label_codes: dict[Any, int] = {label: code for code, label in enumerate(self._labels) if code}
+        self._extras: dict[int, dict[str, Any]] = {}
+
+        self.extend(results)
+
+    def _code(self, value: Any) -> int | None:
+        """Código del texto en la tabla compartida (None si no es hasheable)."""
+        if value is None:
+            return 0
+        try:
+            code = self._label_codes.get(value)
+        except TypeError:
+            return None
+        if code is None:
+            code = len(self._labels)
+            self._labels.append(value)
+            self._label_codes[value] = code
+        return code
+
+    def append(self, result: dict[str, Any]) -> None:
+        index = len(self.emails)
+        extras = {key: value for key, value in result.items() if key not in KNOWN_FIELDS}
+
+        self.emails.append(result.get("email"))
+        self.durations.append(_number(result.get("duration")))
+        self.classification_codes.append(self._code(result.get("classification")) or 0)
+        self.scheduling_lags.append(_number(result.get("scheduling_lag")))
+        self.scores.append(_number(result.get("score")))
+        self.attempts.append(result.get("attempts", 1))
+        self.retry_waits.append(result.get("retry_wait", 0.0))
+        self.throttle_events.append(result.get("throttle_events", 0))
+        self.corrected_latencies.append(_number(result.get("corrected_latency")))
+        self.stages.append(result.get("stage", 0))
+
+        for field, column in (("response_reason", self.reason_codes), ("error_message", self.error_codes)):
+            code = self._code(result.get(field))
+            if code is None:
+                # Valores no hasheables (ej. un dict como reason) van aparte
+                extras[field] = result[field]
+                code = 0
+            column.append(code)
+
+        flags = 0
+        if "is_valid_source" in result:
+            flags |= _SOURCE_KNOWN
+            if result["is_valid_source"]:
+                flags |= _VALID_SOURCE
+        if result.get("cache_hit"):
+            flags |= _CACHE_HIT
+
+        timings = result.get("timings")
+        if timings:
+            flags |= _HAS_TIMINGS
+            if timings.get("connection_reused"):
+                flags |= _CONNECTION_REUSED
+        for phase, column in self.phase_columns.items():
+            column.append(_number(timings.get(phase)) if timings else _NAN)
+        self.timing_totals.append(_number(timings.get("total")) if timings else _NAN)
+        self.flags.append(flags)
+
+        raw_response = result.get("raw_response")
+        if raw_response is None:
+            self.raw_offsets.append(-1)
+            self.raw_ends.append(-1)
+        else:
+            self.raw_offsets.append(len(self.raw_blob))
+            self.raw_blob += json.dumps(raw_response, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self.raw_ends.append(len(self.raw_blob))
+
+        if extras:
+            self._extras[index] = extras
+
+    def extend(self, results: Iterable[dict[str, Any]]) -> None:
+        for result in results:
+            self.append(result)
+
+    def __len__(self) -> int:
+        return len(self.emails)
+
+    def _row(self, i: int) -> dict[str, Any]:
+        row: dict[str, Any] = {"email": self.emails[i]}
+        if not math.isnan(self.durations[i]):
+            row["duration"] = self.durations[i]
+        row["classification"] = self._labels[self.classification_codes[i]]
+        if self.reason_codes[i]:
+            row["response_reason"] = self._labels[self.reason_codes[i]]
+        if self.error_codes[i]:
+            row["error_message"] = self._labels[self.error_codes[i]]
+        if self.raw_offsets[i] >= 0:
+            row["raw_response"] = self.raw_response(i)
+
+        flags = self.flags[i]
+        if flags & _HAS_TIMINGS:
+            timings = {}
+            for phase, column in self.phase_columns.items():
+                timings[phase] = None if math.isnan(column[i]) else column[i]
+            timings["total"] = self.timing_totals[i]
+            timings["connection_reused"] = bool(flags & _CONNECTION_REUSED)
+            row["timings"] = timings
+        if not math.isnan(self.scheduling_lags[i]):
+            row["scheduling_lag"] = self.scheduling_lags[i]
+        if flags & _CACHE_HIT:
+            row["cache_hit"] = True
+        if flags & _SOURCE_KNOWN:
+            row["is_valid_source"] = bool(flags & _VALID_SOURCE)
+        if not math.isnan(self.scores[i]):
+            row["score"] = self.scores[i]
+        if self.attempts[i] > 1:
+            row["attempts"] = self.attempts[i]
+            row["retry_wait"] = self.retry_waits[i]
+        if self.throttle_events[i]:
+            row["throttle_events"] = self.throttle_events[i]
+        if not math.isnan(self.corrected_latencies[i]):
+            row["corrected_latency"] = self.corrected_latencies[i]
+        if self.stages[i]:
+            row["stage"] = self.stages[i]
+        if i in self._extras:
+            row.update(self._extras[i])
+        return row
+
+    def __getitem__(self, index: int | slice) -> dict[str, Any] | list[dict[str, Any]]:
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ResultStore index out of range")
+        return self._row(index)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def to_list(self) -> list[dict[str, Any]]:
+        """Materializa los resultados como lista de dicts (ej. para results.json)."""
+        return list(self)
+
+    def raw_response(self, i: int) -> Any:
+        """raw_response de la fila i (None si no se guardó)."""
+        start = self.raw_offsets[i]
+        if start < 0:
+            return None
+        return json.loads(self.raw_blob[start:self.raw_ends[i]])
+
+    # ── Agregados por columna (usados por calculate_statistics) ──
+    # Con numpy instalado se calculan sobre vistas as_numpy(); sin numpy,
+    # recorriendo los arrays.
+
+    def _use_numpy(self) -> bool:
+        return np is not None and len(self) > 0
+
+    def _count_flag(self, bit: int) -> int:
+        if self._use_numpy():
+            return int(np.count_nonzero(self.as_numpy("flags") & bit))
+        return sum(1 for flags in self.flags if flags & bit)
+
+    def classification_counts(self) -> dict[str, int]:
+        """Conteo por clasificación (la matriz de confusión de la ejecución)."""
+        if self._use_numpy():
+            counts = np.bincount(self.as_numpy("classification_codes"))
+            return {self._labels[code]: int(n) for code, n in enumerate(counts) if n}
+        return {self._labels[code]: n for code, n in Counter(self.classification_codes).items()}
+
+    def source_counts(self) -> tuple[int, int] | None:
+        """
+        (válidos, inválidos) en origen de los resultados guardados, o None
+        si alguna fila no registró "is_valid_source".
+        """
+        known = self._count_flag(_SOURCE_KNOWN)
+        if known < len(self):
+            return None
+        valid = self._count_flag(_VALID_SOURCE)
+        return valid, known - valid
+
+    def _measured_durations(self) -> Any:
+        durations = self.as_numpy("durations")
+        return durations[~np.isnan(durations) & ((self.as_numpy("flags") & _CACHE_HIT) == 0)]
+
+    def latencies(self) -> list[float]:
+        """Duraciones medidas, sin las filas sin duración ni los hits del caché."""
+        if self._use_numpy():
+            return self._measured_durations().tolist()
+        return [
+            d for d, flags in zip(self.durations, self.flags)
+            if not (flags & _CACHE_HIT) and d == d  # d == d descarta NaN
+        ]
+
+    def sorted_latencies(self) -> Sequence[float]:
+        """
+        latencies() ordenadas una sola vez, para los percentiles y sus
+        intervalos bootstrap (un array de NumPy si está instalado).
+        """
+        if self._use_numpy():
+            return np.sort(self._measured_durations())
+        return sorted(self.latencies())
+
+    def cache_hits(self) -> int:
+        return self._count_flag(_CACHE_HIT)
+
+    def values(self, column: array) -> list[float]:
+        """Valores presentes (no NaN) de una columna numérica."""
+        if self._use_numpy():
+            data = np.frombuffer(column, dtype=column.typecode)
+            return data[~np.isnan(data)].tolist()
+        return [v for v in column if v == v]
+
+    def summarize(self, column: array, exclude_cache_hits: bool = False) -> dict[str, float]:
+        """
+        count, sum, min y max de los valores presentes (no NaN) de una
+        columna; con exclude_cache_hits no cuenta las filas servidas por el
+        caché (como latencies()).
+        """
+        if self._use_numpy():
+            data = np.frombuffer(column, dtype=column.typecode)
+            mask = ~np.isnan(data)
+            if exclude_cache_hits:
+                mask &= (self.as_numpy("flags") & _CACHE_HIT) == 0
+            data = data[mask]
+            if len(data):
+                return {"count": len(data), "sum": float(data.sum()),
+                        "min": float(data.min()), "max": float(data.max())}
+            return {"count": 0, "sum": 0.0, "min": 0.0, "max": 0.0}
+        if exclude_cache_hits:
+            values = [v for v, flags in zip(column, self.flags) if not (flags & _CACHE_HIT) and v == v]
+        else:
+            values = self.values(column)
+        return {
+            "count": len(values),
+            "sum": sum(values),
+            "min": min(values) if values else 0.0,
+            "max": max(values) if values else 0.0,
+        }
+
+    def timed_rows(self) -> int:
+        return self._count_flag(_HAS_TIMINGS)
+
+    def reused_connections(self) -> int:
+        return self._count_flag(_CONNECTION_REUSED)
+
+    def retry_summary(self) -> dict[str, Any]:
+        """Reintentos y throttling de la ejecución, separados de la latencia."""
+        return {
+            "retried_requests": sum(1 for n in self.attempts if n > 1),
+            "total_retries": sum(self.attempts) - len(self.attempts),
+            "total_retry_wait": sum(self.retry_waits),
+            "throttle_events": sum(self.throttle_events),
+        }
+
+    def scored_pairs(self) -> list[tuple[float, bool]]:
+        """Pares (score, es_válido_en_origen) de las filas con ambos datos."""
+        return [
+            (score, bool(flags & _VALID_SOURCE))
+            for score, flags in zip(self.scores, self.flags)
+            if score == score and flags & _SOURCE_KNOWN
+        ]
+
+    def as_numpy(self, column: str) -> Any:
+        """
+        Vista NumPy (sin copia) de una columna: "durations", "scheduling_lags",
+        "scores", "corrected_latencies", "classification_codes", "flags", "attempts" o una fase de
+        tracing.PHASES.
+        """
+        if np is None:
+            raise ImportError("as_numpy() requiere numpy instalado.")
+        data = self.phase_columns[column] if column in self.phase_columns else getattr(self, column)
+        return np.frombuffer(data, dtype=data.typecode)
+
+    def nbytes(self) -> int:
+        """Bytes ocupados por las columnas numéricas y el buffer de raw_response."""
+        columns = [
+            self.durations, self.classification_codes, self.reason_codes, self.error_codes,
+            self.scheduling_lags, self.scores, self.flags, self.timing_totals,
+            self.raw_offsets, self.raw_ends, self.attempts, self.retry_waits, self.throttle_events,
+            self.corrected_latencies, self.stages,
+            *self.phase_columns.values(),
+        ]
+        return sum(c.itemsize * len(c) for c in columns) + len(self.raw_blob)
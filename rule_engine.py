@@ -0,0 +1,220 @@
+import operator
+import logging
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Operadores soportados en validation_rules
+OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda a, b: a in b,
+}
+
+# Operadores que comparan numéricamente (se castea a int)
+NUMERIC_OPERATORS = frozenset({'>', '<', '>=', '<='})
+
+# Centinela para constantes que no pudieron convertirse a número
+_INVALID_NUMBER = object()
+
+
+def split_path(field_path: str | None) -> tuple[str, ...]:
+    """Divide una ruta en dot notation en sus claves ('a.b' → ('a', 'b'))."""
+    if not field_path:
+        return ()
+    return tuple(field_path.split("."))
+
+
+def resolve_keys(data: Any, keys: tuple[str, ...]) -> Any:
+    """Resuelve una ruta ya dividida. Retorna None si algún tramo no existe."""
+    current = data
+    for key in keys:
+        if isinstance(current, dict):
+            current = current.get(key)
+        else:
+            return None
+        if current is None:
+            return None
+    return current
+
+
+def resolve_field(data: dict[str, Any], field_path: str) -> Any:
+    """
+    Resuelve un campo usando dot notation.
+    Ejemplo: 'data.nested.field' → data['data']['nested']['field']
+    """
+    return resolve_keys(data, tuple(field_path.split(".")))
+
+
+def field_keys(field: str, response_path: str | None = "data") -> tuple[str, ...]:
+    """Claves de un campo relativo a response_path (igual que en las reglas)."""
+    return split_path(f"{response_path}.{field}" if response_path else field)
+
+
+def extract_score(data: Any, keys: tuple[str, ...]) -> float | None:
+    """Resuelve un campo numérico (ej. 'score') como float, o None si no es un número."""
+    value = resolve_keys(data, keys)
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def project_fields(data: Any, paths: Iterable[tuple[str, ...]]) -> Any:
+    """
+    Copia mínima de data con solo las rutas indicadas, conservando el
+    anidamiento (así resolve_keys sobre la copia da lo mismo que sobre el
+    original). Las rutas que no existen se omiten.
+    """
+    if not isinstance(data, dict):
+        return data
+    projected: dict[str, Any] = {}
+    for keys in paths:
+        if not keys:
+            return data
+        value = resolve_keys(data, keys)
+        if value is None:
+            continue
+        target = projected
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+            if not isinstance(target, dict):
+                break
+        else:
+            target[keys[-1]] = value
+    return projected
+
+
+class CompiledRule:
+    """
+    Regla de validación preparada: ruta pre-dividida, operador resuelto
+    y constante ya convertida (int para comparaciones numéricas,
+    frozenset para 'in' sobre listas).
+    """
+
+    __slots__ = ("field", "full_path", "keys", "op_str", "op_func", "value", "fallback_value", "numeric")
+
+    def __init__(self, rule: dict[str, Any], response_path: str | None = "data"):
+        field = rule.get("field")
+        op_str = rule.get("operator")
+        value = rule.get("value")
+
+        op_func = OPERATORS.get(op_str)
+        if not op_func:
+            raise ValueError(f"Operador no válido: {op_str}")
+
+        self.field = field
+        self.full_path = f"{response_path}.{field}" if response_path else field
+        self.keys = split_path(self.full_path)
+        self.op_str = op_str
+        self.op_func = op_func
+        self.numeric = op_str in NUMERIC_OPERATORS
+        self.fallback_value = None
+
+        if self.numeric:
+            try:
+                value = int(value)
+            except (ValueError, TypeError):
+                value = _INVALID_NUMBER
+        elif op_str == "in" and isinstance(value, (list, tuple, set, frozenset)):
+            # frozenset para búsqueda O(1); se conserva la tupla original
+            # para valores no hasheables (dicts, listas) en la respuesta.
+            self.fallback_value = tuple(value)
+            try:
+                value = frozenset(value)
+            except TypeError:
+                value = self.fallback_value
+        self.value = value
+
+    def __call__(self, api_response: Any) -> bool:
+        actual_value = resolve_keys(api_response, self.keys)
+
+        if actual_value is None:
+            logger.debug("Campo '%s' no encontrado en la respuesta.", self.full_path)
+            return False
+
+        if self.numeric:
+            if self.value is _INVALID_NUMBER:
+                logger.debug("No se pudo convertir a número para la comparación de '%s'.", self.field)
+                return False
+            try:
+                actual_value = int(actual_value)
+            except (ValueError, TypeError):
+                logger.debug("No se pudo convertir a número para la comparación de '%s'.", self.field)
+                return False
+            return self.op_func(actual_value, self.value)
+
+        if self.fallback_value is not None:
+            try:
+                return actual_value in self.value
+            except TypeError:
+                return actual_value in self.fallback_value
+
+        return self.op_func(actual_value, self.value)
+
+
+class RuleEvaluator:
+    """
+    Conjunto de reglas compiladas para una API. Se construye una vez
+    por ejecución y se reutiliza para cada respuesta.
+    """
+
+    __slots__ = ("rules", "response_path", "_path_keys")
+
+    def __init__(self, rules: list[CompiledRule], response_path: str | None = "data"):
+        self.rules = tuple(rules)
+        self.response_path = response_path
+        self._path_keys = split_path(response_path)
+
+    def evaluate(self, api_response: Any) -> bool:
+        """True si la respuesta cumple todas las reglas."""
+        for rule in self.rules:
+            if not rule(api_response):
+                return False
+        return True
+
+    def extract_reason(self, api_response: Any) -> Any:
+        """Extrae el campo 'reason' del objeto apuntado por response_path."""
+        response_data = resolve_keys(api_response, self._path_keys) if self._path_keys else api_response
+        if isinstance(response_data, dict):
+            return response_data.get("reason")
+        return None
+
+    def field_paths(self) -> tuple[tuple[str, ...], ...]:
+        """Rutas que usan las reglas y el 'reason' (lo que evaluate/extract_reason leen)."""
+        return (*(rule.keys for rule in self.rules), (*self._path_keys, "reason"))
+
+    def project(self, api_response: Any, extra_paths: Iterable[tuple[str, ...]] = ()) -> Any:
+        """
+        Reduce la respuesta a los campos de las reglas y el 'reason' (más
+        extra_paths, ej. el sweep_field) para no retener el objeto completo.
+        """
+        return project_fields(api_response, (*self.field_paths(), *extra_paths))
+
+
+def compile_rules(validation_rules: list[dict[str, Any]], response_path: str | None = "data") -> RuleEvaluator:
+    """
+    Compila las validation_rules de una API en un RuleEvaluator.
+    Lanza ValueError si alguna regla usa un operador no soportado.
+    """
+    return RuleEvaluator(
+        [CompiledRule(rule, response_path) for rule in validation_rules],
+        response_path,
+    )
+
+
+def evaluate_rule(api_response: dict[str, Any], rule: dict[str, Any], response_path: str = "data") -> bool:
+    """
+    Evalúa una única regla de validación contra la respuesta de la API.
+    Soporta dot notation para acceder a campos anidados.
+
+    Compila la regla en cada llamada; para evaluar muchas respuestas
+    conviene usar compile_rules() una sola vez.
+    """
+    return CompiledRule(rule, response_path)(api_response)
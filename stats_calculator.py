@@ -1,20 +1,219 @@
 
+import math
+import random
 import logging
-from collections import Counter
-from typing import Any
+from statistics import NormalDist
+from typing import Any, Iterable, Sequence
+
+from tracing import PHASES
+from latency_histogram import DEFAULT_PERCENTILES, LatencyHistogram
+from result_store import ResultStore
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_BOOTSTRAP_RESAMPLES = 1000
+
+
+def wilson_interval(successes: int, n: int, confidence: float = DEFAULT_CONFIDENCE) -> tuple[float, float] | None:
+    """
+    Intervalo de confianza de Wilson para una proporción (en 0..1), o None
+    si n es 0. A diferencia del intervalo normal, no sale de [0, 1] y
+    sigue siendo útil con tasas cercanas a 0 (el caso típico de FP/FN).
+    """
+    if n <= 0:
+        return None
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    low = 0.0 if successes == 0 else max(0.0, center - margin)
+    high = 1.0 if successes == n else min(1.0, center + margin)
+    return low, high
+
+
+def bootstrap_percentile_intervals(
+    values: Sequence[float],
+    quantiles: dict[str, float] = DEFAULT_PERCENTILES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    resamples: int = DEFAULT_BOOTSTRAP_RESAMPLES,
+    seed: int = 0,
+    presorted: bool = False,
+) -> dict[str, list[float]]:
+    """
+    Intervalos de confianza bootstrap (método de percentiles) para los
+    cuantiles de values, con el mismo rango que LatencyHistogram.percentile.
+
+    No hace falta remuestrear los n valores: el cuantil de un remuestreo
+    es el valor ordenado en la posición del k-ésimo menor de n índices
+    uniformes, que es floor(n·U) con U ~ Beta(k, n - k + 1). Cada réplica
+    cuesta un betavariate, así que el costo es el de ordenar una vez; con
+    presorted=True values ya viene ordenado (ej. sorted_latencies()) y no
+    se vuelve a ordenar.
+    """
+    n = len(values)
+    if not n:
+        return {}
+    ordered = values if presorted else sorted(values)
+    rng = random.Random(seed)
+    alpha = (1 - confidence) / 2
+    low_index = int(alpha * (resamples - 1))
+    high_index = int(math.ceil((1 - alpha) * (resamples - 1)))
+
+    intervals = {}
+    for name, q in quantiles.items():
+        k = max(1, math.ceil(q * n))
+        replicas = sorted(
+            float(ordered[min(n - 1, int(n * rng.betavariate(k, n - k + 1)))]) for _ in range(resamples)
+        )
+        intervals[name] = [replicas[low_index], replicas[high_index]]
+    return intervals
+
+
+def calculate_accuracy(
+    classification_counts: dict[str, int],
+    total_valid_source: int,
+    total_invalid_source: int,
+    confidence: float = DEFAULT_CONFIDENCE,
+) -> dict[str, Any]:
+    """
+    Calcula la sección "accuracy" a partir del conteo de clasificaciones,
+    con intervalos de Wilson (en %) para las tasas de FP/FN.
+    """
+    # NOTE: "Invalido considerado valido" = falso positivo (la API dice válido, pero es inválido)
+    false_positives = classification_counts.get("Invalido considerado valido", 0)
+    false_negatives = classification_counts.get("Valido considerado invalido", 0)
+
+    fp_rate = (false_positives / total_invalid_source * 100) if total_invalid_source > 0 else 0
+    fn_rate = (false_negatives / total_valid_source * 100) if total_valid_source > 0 else 0
+
+    fp_interval = wilson_interval(false_positives, total_invalid_source, confidence)
+    fn_interval = wilson_interval(false_negatives, total_valid_source, confidence)
+
+    return {
+        "classification_counts": dict(classification_counts),
+        "false_positive_rate_percent": fp_rate,
+        "false_negative_rate_percent": fn_rate,
+        "false_positive_rate_ci_percent": [bound * 100 for bound in fp_interval] if fp_interval else None,
+        "false_negative_rate_ci_percent": [bound * 100 for bound in fn_interval] if fn_interval else None,
+        "confidence": confidence,
+    }
+
+
+def calculate_threshold_sweep(
+    scored: Iterable[tuple[float, bool]],
+    field: str = "score",
+    max_points: int = 200,
+) -> dict[str, Any]:
+    """
+    Barrido de umbrales sobre un campo numérico de la respuesta: para cada
+    umbral t se considera válido "field >= t" y se calculan las tasas de
+    FP/FN como en calculate_accuracy.
+
+    Los scores se ordenan una sola vez (de mayor a menor) y los conteos se
+    acumulan en una única pasada, así que el costo es O(n log n) sin
+    importar la cantidad de umbrales distintos.
+
+    Args:
+        scored: Pares (score, es_válido_en_origen).
+        field: Nombre del campo, solo informativo.
+        max_points: Máximo de puntos de la curva en la salida (la AUC y el
+            mejor umbral se calculan sobre todos los umbrales).
+    """
+    ordered = sorted(scored, key=lambda pair: pair[0], reverse=True)
+    positives = sum(1 for _, is_valid in ordered if is_valid)
+    negatives = len(ordered) - positives
+
+    points = []
+    tp = fp = 0
+    auc = 0.0
+    prev_tpr = prev_fpr = 0.0
+    i = 0
+    while i < len(ordered):
+        threshold = ordered[i][0]
+        # Todos los empates entran juntos: "score >= threshold"
+        while i < len(ordered) and ordered[i][0] == threshold:
+            if ordered[i][1]:
+                tp += 1
+            else:
+                fp += 1
+            i += 1
+
+        tpr = tp / positives if positives else 0.0
+        fpr = fp / negatives if negatives else 0.0
+        auc += (fpr - prev_fpr) * (tpr + prev_tpr) / 2
+        prev_tpr, prev_fpr = tpr, fpr
+
+        points.append({
+            "threshold": threshold,
+            "true_positives": tp,
+            "false_positives": fp,
+            "false_positive_rate_percent": fpr * 100,
+            "false_negative_rate_percent": (1 - tpr) * 100 if positives else 0.0,
+            "precision": tp / (tp + fp),
+            "recall": tpr,
+        })
+
+    best = min(
+        points,
+        key=lambda p: p["false_positive_rate_percent"] + p["false_negative_rate_percent"],
+        default=None,
+    )
+    if len(points) > max_points:
+        step = len(points) / max_points
+        sampled = [points[int(k * step)] for k in range(max_points)]
+        if sampled[-1] is not points[-1]:
+            sampled[-1] = points[-1]
+        points = sampled
+
+    return {
+        "field": field,
+        "scored_count": len(ordered),
+        "positives": positives,
+        "negatives": negatives,
+        "auc": auc if positives and negatives else None,
+        "best_threshold": best,
+        "points": points,
+    }
+
+
+def merge_latency(run_metrics_list: Iterable[dict[str, Any]]) -> LatencyHistogram:
+    """Combina los histogramas de latencia de varias ejecuciones (ej. todas las APIs)."""
+    merged = LatencyHistogram()
+    for run_metrics in run_metrics_list:
+        if run_metrics.get("latency_histogram") is not None:
+            merged.merge(run_metrics["latency_histogram"])
+    return merged
+
 
 def calculate_statistics(
-    results: list[dict[str, Any]],
+    results: ResultStore | list[dict[str, Any]],
     total_valid_source: int,
     total_invalid_source: int,
     rps: int,
     endpoint: str,
+    run_metrics: dict[str, Any] | None = None,
+    details_file: str | None = None,
+    sweep_field: str | None = None,
+    confidence: float = DEFAULT_CONFIDENCE,
 ) -> dict[str, Any]:
     """
     Calcula y resume las estadísticas de los resultados de la prueba.
+    results es el ResultStore de run_api_tests (una lista de dicts se
+    convierte); los agregados se calculan sobre sus columnas.
+    run_metrics son las métricas de ejecución que completa run_api_tests
+    (ej. la tasa de envío lograda por el rate limiter).
+    Si se indica details_file (el JSONL escrito durante la ejecución), la
+    salida apunta a ese archivo en lugar de incluir "details".
+    Con sweep_field se agrega "threshold_sweep" a partir del "score" que
+    run_api_tests guarda en cada resultado.
+    confidence es el nivel de los intervalos de las tasas de FP/FN (Wilson)
+    y de los percentiles de latencia (bootstrap).
+    total_valid_source y total_invalid_source son los emails de cada
+    etiqueta que había para enviar; si la ejecución terminó antes (parada
+    temprana, umbral del perfil de carga), las tasas se calculan sobre los
+    resultados recibidos de cada etiqueta ("is_valid_source" de cada fila).
     """
     if not results:
         logger.warning("No hay resultados para procesar.")
@@ -25,47 +224,138 @@ def calculate_statistics(
             }
         }
 
-    durations = [r['duration'] for r in results if 'duration' in r]
-    total_time = sum(durations)
-    avg_duration = total_time / len(durations) if durations else 0
-    max_duration = max(durations) if durations else 0
-    min_duration = min(durations) if durations else 0
+    store = results if isinstance(results, ResultStore) else ResultStore(results)
 
-    classifications = [r['classification'] for r in results]
-    classification_counts = Counter(classifications)
+    # Los hits del caché no tocaron la red: se excluyen de la latencia
+    cache_hits = store.cache_hits()
+    measured = store.summarize(store.durations, exclude_cache_hits=True)
+    total_time = measured["sum"]
+    avg_duration = total_time / measured["count"] if measured["count"] else 0
+    max_duration = measured["max"]
+    min_duration = measured["min"]
+    # Ordenadas una sola vez para el histograma y los intervalos bootstrap
+    durations = store.sorted_latencies()
 
-    false_positives = classification_counts.get("Invalido considerado invalido por API", 0)
-    false_negatives = classification_counts.get("Valido considerado invalido por API", 0)
+    # Lag de planificación por solicitud (cuánto tarde salió respecto a su slot)
+    lags = store.summarize(store.scheduling_lags)
+    avg_lag = lags["sum"] / lags["count"] if lags["count"] else 0
+    max_lag = lags["max"]
 
-    # NOTE: "Invalido considerado valido" = falso positivo (la API dice válido, pero es inválido)
-    false_positives = classification_counts.get("Invalido considerado valido", 0)
-    false_negatives = classification_counts.get("Valido considerado invalido", 0)
+    limiter_stats = (run_metrics or {}).get("rate_limiter", {})
 
-    fp_rate = (false_positives / total_invalid_source * 100) if total_invalid_source > 0 else 0
-    fn_rate = (false_negatives / total_valid_source * 100) if total_valid_source > 0 else 0
+    # Reintentos y throttling: se reportan aparte; la latencia es la del
+    # último intento de cada solicitud
+    retries = store.retry_summary()
+
+    # Percentiles desde el histograma que run_api_tests completó en la
+    # ejecución (o uno armado ahora con las duraciones)
+    latency = (run_metrics or {}).get("latency_histogram")
+    if latency is None:
+        latency = LatencyHistogram()
+        latency.record_many(durations)
+
+    # Modelo open-loop: latencia medida desde el envío previsto (corrige
+    # coordinated omission); solo existe si hay "corrected_latency"
+    corrected = (run_metrics or {}).get("corrected_latency_histogram")
+    if corrected is None:
+        corrected_values = store.values(store.corrected_latencies)
+        if corrected_values:
+            corrected = LatencyHistogram()
+            corrected.record_many(corrected_values)
+
+    # Throughput real: requests completadas / tiempo de reloj de la ejecución.
+    # total_processing_time suma latencias que se solapan, no es tiempo real.
+    # En una ejecución retomada, los resultados previos no cuentan.
+    wall_clock_time = (run_metrics or {}).get("wall_clock_time")
+    resumed = (run_metrics or {}).get("resumed_requests", 0)
+    throughput = (len(results) - resumed) / wall_clock_time if wall_clock_time else None
+
+    # Desglose de latencia por fase (DNS, connect, envío, TTFB, body)
+    phases = {}
+    for phase in PHASES:
+        values = store.summarize(store.phase_columns[phase])
+        phases[phase] = {
+            "count": values["count"],
+            "average": values["sum"] / values["count"] if values["count"] else 0,
+            "max": values["max"],
+            "min": values["min"],
+        }
+    timed = store.timed_rows()
+    connection_reuse_rate = (store.reused_connections() / timed * 100) if timed else 0
+
+    # Denominadores: los resultados recibidos de cada etiqueta, no los
+    # emails que había para enviar
+    received = store.source_counts()
+    received_valid, received_invalid = received if received else (total_valid_source, total_invalid_source)
+    classification_counts = store.classification_counts()
+    accuracy = calculate_accuracy(classification_counts, received_valid, received_invalid, confidence)
+    fp_rate = accuracy["false_positive_rate_percent"]
+    fn_rate = accuracy["false_negative_rate_percent"]
 
     output_data = {
         "summary": {
             "total_requests": len(results),
             "valid_source_emails": total_valid_source,
             "invalid_source_emails": total_invalid_source,
+            "valid_source_results": received_valid,
+            "invalid_source_results": received_invalid,
             "requests_per_second_limit": rps,
+            "achieved_requests_per_second": limiter_stats.get("achieved_rps"),
+            "average_scheduling_lag": avg_lag,
+            "max_scheduling_lag": max_lag,
+            "cache_hits": cache_hits,
+            "resumed_requests": resumed,
             "api_endpoint": endpoint
         },
         "performance": {
             "total_processing_time": total_time,
             "average_response_time": avg_duration,
             "max_response_time": max_duration,
-            "min_response_time": min_duration
+            "min_response_time": min_duration,
+            "percentiles": latency.percentiles(),
+            "percentile_intervals": bootstrap_percentile_intervals(
+                durations, confidence=confidence, presorted=True
+            ),
+            "wall_clock_time": wall_clock_time,
+            "throughput_rps": throughput,
+            "latency_histogram": latency.to_dict(),
+            "phases": phases,
+            "connection_reuse_rate_percent": connection_reuse_rate
         },
-        "accuracy": {
-            "classification_counts": dict(classification_counts),
-            "false_positive_rate_percent": fp_rate,
-            "false_negative_rate_percent": fn_rate
-        },
-        "details": results
+        "accuracy": accuracy,
+        "retries": retries
     }
 
+    if corrected is not None and corrected.count:
+        output_data["performance"]["corrected_percentiles"] = corrected.percentiles()
+        output_data["performance"]["corrected_latency_histogram"] = corrected.to_dict()
+
+    if details_file:
+        output_data["details_file"] = details_file
+    else:
+        output_data["details"] = results if isinstance(results, list) else store.to_list()
+
+    if sweep_field:
+        output_data["threshold_sweep"] = calculate_threshold_sweep(store.scored_pairs(), sweep_field)
+
+    if run_metrics and "load_model" in run_metrics:
+        output_data["load_model"] = run_metrics["load_model"]
+
+    if run_metrics and "load_profile" in run_metrics:
+        output_data["load_profile"] = run_metrics["load_profile"]
+
+    if run_metrics and "early_stop" in run_metrics:
+        output_data["early_stop"] = run_metrics["early_stop"]
+
+    if run_metrics and "adaptive_rate" in run_metrics:
+        output_data["adaptive_rate"] = run_metrics["adaptive_rate"]
+
+    if run_metrics and "webhook" in run_metrics:
+        output_data["webhook"] = run_metrics["webhook"]
+
+    if run_metrics and "connection_pool" in run_metrics:
+        output_data["connection_pool"] = run_metrics["connection_pool"]
+
     logger.info(
         "Estadísticas calculadas: %d requests, FP=%.2f%%, FN=%.2f%%",
         len(results), fp_rate, fn_rate
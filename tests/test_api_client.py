@@ -1,9 +1,19 @@
 
+import json
+import itertools
 import unittest
 import asyncio
 import aiohttp
-from unittest.mock import MagicMock, AsyncMock
-from api_client import process_email, evaluate_rule, resolve_field, run_api_tests
+from unittest.mock import MagicMock, AsyncMock, patch
+from aiohttp import web
+from webhook_server import WebhookServer
+from api_client import (
+    process_email, evaluate_rule, resolve_field, run_api_tests, run_multi_api_tests,
+    create_connector, connector_settings, backoff_delay, parse_retry_after, retry_policy, load_settings,
+    SKIP_YIELD_EVERY,
+)
+from rate_limiter import AimdRateController
+from stats_calculator import calculate_statistics
 
 
 class TestResolveField(unittest.TestCase):
@@ -128,6 +138,35 @@ class TestProcessEmail(unittest.TestCase):
         self.assertEqual(result['classification'], 'Error')
         self.assertIn("Error de red", result['error_message'])
 
+    def test_cache_hit_skips_network_and_rate_limiter(self):
+        mock_session = MagicMock()
+        cache = MagicMock()
+        cache.get.return_value = {"data": {"score": 90, "reason": "cached"}}
+        acquire = AsyncMock(return_value=0.0)
+        config = self._make_api_config()
+        result = asyncio.run(process_email(mock_session, "test@example.com", True, config,
+                                           cache=cache, acquire=acquire))
+        self.assertTrue(result['cache_hit'])
+        self.assertEqual(result['classification'], 'Valido considerado valido')
+        self.assertEqual(result['response_reason'], 'cached')
+        mock_session.get.assert_not_called()
+        acquire.assert_not_called()
+
+    def test_cache_miss_stores_response(self):
+        mock_session = MagicMock()
+        mock_response = AsyncMock()
+        mock_response.json.return_value = {"data": {"score": 90, "reason": "ok"}}
+        mock_session.get.return_value.__aenter__.return_value = mock_response
+        cache = MagicMock()
+        cache.get.return_value = None
+        cache.make_key.return_value = "key"
+        config = self._make_api_config()
+        result = asyncio.run(process_email(mock_session, "test@example.com", True, config,
+                                           cache=cache, acquire=AsyncMock(return_value=0.25)))
+        self.assertNotIn('cache_hit', result)
+        self.assertEqual(result['scheduling_lag'], 0.25)
+        cache.put.assert_called_once_with("key", {"data": {"score": 90, "reason": "ok"}})
+
     def test_aiohttp_client_error(self):
         mock_session = MagicMock()
         mock_session.get.side_effect = aiohttp.ClientError("Error de cliente")
@@ -137,5 +176,632 @@ class TestProcessEmail(unittest.TestCase):
         self.assertIn("Error de cliente", result['error_message'])
 
 
+class TestRunApiTests(unittest.TestCase):
+    """Tests para la ejecución con pool de workers."""
+
+    def _make_api_config(self):
+        return {
+            "name": "TestAPI",
+            "api_key": "fake_key",
+            "endpoint": "http://fake.api",
+            "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+        }
+
+    def test_streams_iterator_with_bounded_concurrency(self):
+        in_flight = 0
+        peak = 0
+
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            nonlocal in_flight, peak
+            lag = await acquire()
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido",
+                    "scheduling_lag": lag}
+
+        emails = ((f"user{i}@example.com", True) for i in range(50))
+        progress = []
+
+        with patch("api_client.process_email", fake_process_email):
+            results = asyncio.run(run_api_tests(
+                emails, self._make_api_config(), 10000,
+                on_progress=lambda done, total: progress.append((done, total)),
+                max_in_flight=3, total=50,
+            ))
+
+        self.assertEqual(len(results), 50)
+        self.assertLessEqual(peak, 3)
+        self.assertEqual(progress[-1], (50, 50))
+        self.assertEqual([p[0] for p in progress], list(range(1, 51)))
+        self.assertIn("scheduling_lag", results[0])
+
+    def test_tokens_taken_at_dispatch_and_cache_hits_skip_limiter(self):
+        """Sin token no se crea la tarea: con un max_in_flight alto no hay tareas esperando turno."""
+        started = 0
+        peak = 0
+
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            nonlocal started, peak
+            self.assertTrue(cache_checked)
+            started += 1
+            peak = max(peak, started)
+            await acquire()
+            await asyncio.sleep(0.001)
+            started -= 1
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido"}
+
+        cache = MagicMock()
+        cache.get.side_effect = lambda key: {"data": {"score": 90}} if key.startswith("hit") else None
+        cache.make_key.side_effect = lambda api_config, email: email
+        emails = [(f"{'hit' if i % 2 else 'miss'}{i}@example.com", True) for i in range(20)]
+        run_metrics = {}
+
+        with patch("api_client.process_email", fake_process_email):
+            results = asyncio.run(run_api_tests(
+                emails, self._make_api_config(), 200, max_in_flight=1000, cache=cache, run_metrics=run_metrics,
+            ))
+
+        self.assertEqual(len(results), 20)
+        self.assertLessEqual(peak, 2)
+        self.assertEqual(sum(1 for r in results if r.get("cache_hit")), 10)
+        self.assertEqual(run_metrics["rate_limiter"]["requests_sent"], 10)
+
+    def test_records_sweep_score(self):
+        """Con sweep_field, cada resultado guarda el score aunque se descarte raw_response."""
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            await acquire()
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido",
+                    "raw_response": {"data": {"score": "85"}}}
+
+        api_config = self._make_api_config()
+        api_config["sweep_field"] = "score"
+        sink = MagicMock()
+
+        with patch("api_client.process_email", fake_process_email):
+            results = asyncio.run(run_api_tests([("a@example.com", True)], api_config, 100, sink=sink))
+
+        self.assertEqual(results[0]["score"], 85.0)
+        self.assertTrue(results[0]["is_valid_source"])
+        self.assertNotIn("raw_response", results[0])
+
+    def test_skips_completed_emails(self):
+        """Los emails de skip_emails (ya hechos al retomar) no se envían."""
+        sent = []
+
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            sent.append(email)
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido"}
+
+        emails = [(f"user{i}@example.com", True) for i in range(5)]
+        progress = []
+
+        with patch("api_client.process_email", fake_process_email):
+            results = asyncio.run(run_api_tests(
+                emails, self._make_api_config(), 10000,
+                on_progress=lambda done, total: progress.append((done, total)),
+                skip_emails={"user0@example.com", "user3@example.com"},
+            ))
+
+        self.assertEqual(sorted(sent), ["user1@example.com", "user2@example.com", "user4@example.com"])
+        self.assertEqual(len(results), 3)
+        self.assertEqual(progress[-1], (3, 3))
+
+    def test_skipping_completed_emails_yields_to_event_loop(self):
+        """Al retomar, recorrer los emails ya hechos no bloquea el event loop."""
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            await asyncio.sleep(0.01)
+            return {"email": email, "duration": 0.01, "classification": "Valido considerado valido"}
+
+        done = {f"user{i}@example.com" for i in range(5, 20005)}
+
+        async def scenario():
+            ticks = 0
+            pulled = []
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            def emails():
+                for i in range(20010):
+                    pulled.append(ticks)
+                    yield f"user{i}@example.com", True
+
+            task = asyncio.create_task(ticker())
+            try:
+                results = await run_api_tests(emails(), self._make_api_config(), 100000, skip_emails=done)
+            finally:
+                task.cancel()
+            return results, pulled
+
+        with patch("api_client.process_email", fake_process_email):
+            results, pulled = asyncio.run(scenario())
+        longest = max(len(list(group)) for _, group in itertools.groupby(pulled))
+        self.assertEqual(len(results), 10)
+        self.assertLess(longest, 2 * SKIP_YIELD_EVERY)
+
+
+class TestLoadModels(unittest.TestCase):
+    """Tests para los modelos de carga open y closed de run_api_tests."""
+
+    def _make_api_config(self, **load):
+        return {
+            "name": "TestAPI",
+            "api_key": "fake_key",
+            "endpoint": "http://fake.api",
+            "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+            **load,
+        }
+
+    def test_open_loop_measures_from_intended_time(self):
+        """Con el cupo en vuelo agotado, la latencia corregida incluye la espera."""
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            lag = await acquire()
+            await asyncio.sleep(0.02)
+            return {"email": email, "duration": 0.02, "classification": "Valido considerado valido",
+                    "scheduling_lag": lag}
+
+        emails = [(f"user{i}@example.com", True) for i in range(10)]
+        run_metrics = {}
+
+        with patch("api_client.process_email", fake_process_email):
+            results = asyncio.run(run_api_tests(
+                emails, self._make_api_config(load_model="open"), 1000,
+                max_in_flight=1, run_metrics=run_metrics,
+            ))
+
+        corrected = [r["corrected_latency"] for r in results]
+        # Llegadas cada 1 ms pero una solicitud a la vez: la última esperó ~9 × 20 ms
+        self.assertGreater(corrected[-1], 0.15)
+        self.assertGreater(results[-1]["scheduling_lag"], 0.1)
+        self.assertEqual(run_metrics["load_model"], {"model": "open", "arrival": "constant"})
+        self.assertEqual(run_metrics["corrected_latency_histogram"].count, 10)
+        self.assertEqual(run_metrics["rate_limiter"]["requests_sent"], 10)
+
+    def test_poisson_arrivals_are_seeded(self):
+        """La semilla de las llegadas Poisson viene de load (o de la API) y queda en load_model."""
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            await acquire()
+            return {"email": email, "duration": 0.0, "classification": "Valido considerado valido"}
+
+        def run_load_model(api_config, load):
+            run_metrics = {}
+            with patch("api_client.process_email", fake_process_email):
+                asyncio.run(run_api_tests(
+                    [(f"user{i}@example.com", True) for i in range(20)], api_config, 2000,
+                    run_metrics=run_metrics, load=load,
+                ))
+            return run_metrics["load_model"]
+
+        load = {"load_model": "open", "arrival": "poisson", "arrival_seed": 11}
+        self.assertEqual(run_load_model(self._make_api_config(), load),
+                         {"model": "open", "arrival": "poisson", "arrival_seed": 11})
+        self.assertEqual(run_load_model(self._make_api_config(arrival_seed=5), load)["arrival_seed"], 5)
+
+    def test_closed_loop_virtual_users(self):
+        in_flight = 0
+        peak = 0
+
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            nonlocal in_flight, peak
+            self.assertIsNone(acquire)
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido"}
+
+        emails = [(f"user{i}@example.com", True) for i in range(20)]
+        run_metrics = {}
+
+        with patch("api_client.process_email", fake_process_email):
+            results = asyncio.run(run_api_tests(
+                emails, self._make_api_config(), 1,
+                run_metrics=run_metrics, load={"load_model": "closed", "virtual_users": 4},
+            ))
+
+        self.assertEqual(len(results), 20)
+        self.assertEqual(peak, 4)
+        self.assertNotIn("corrected_latency", results[0])
+        self.assertEqual(run_metrics["max_in_flight"], 4)
+        self.assertEqual(run_metrics["load_model"]["virtual_users"], 4)
+
+    def test_load_profile_steps_rate_and_tags_stage(self):
+        """Con load_profile cada resultado lleva su etapa y la ejecución termina con el perfil."""
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            await acquire()
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido"}
+
+        api_config = self._make_api_config(load_profile={
+            "stages": [{"rps": 100, "duration": 0.05}, {"rps": 400, "duration": 0.05}],
+            "max_p99": 1.0,
+        })
+        emails = [(f"user{i}@example.com", True) for i in range(1000)]
+        run_metrics = {}
+
+        with patch("api_client.process_email", fake_process_email):
+            results = asyncio.run(run_api_tests(emails, api_config, 1, run_metrics=run_metrics))
+
+        stages = [r["stage"] for r in results]
+        self.assertEqual(set(stages), {1, 2})
+        self.assertLess(len(results), 1000)
+        self.assertGreater(stages.count(2), stages.count(1))
+        summary = run_metrics["load_profile"]
+        self.assertFalse(summary["stopped_early"])
+        self.assertEqual(summary["max_sustainable_rps"], 400)
+
+    def test_adaptive_rate_capped_at_current_stage(self):
+        """El AIMD no sube el rate por encima de la etapa del perfil en curso."""
+        rates = {}
+
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            await acquire()
+            for _ in range(50):
+                rate_control.on_success()
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido"}
+
+        api_config = self._make_api_config(
+            load_profile={"stages": [{"rps": 100, "duration": 0.05}, {"rps": 400, "duration": 0.05}]},
+            adaptive_rate={"increase_step": 1000},
+        )
+        emails = [(f"user{i}@example.com", True) for i in range(1000)]
+        run_metrics = {}
+
+        original = AimdRateController.on_success
+
+        def on_success(controller):
+            original(controller)
+            rates.setdefault(controller._max_rate, set()).add(controller._limiter.rate)
+
+        with patch("api_client.process_email", fake_process_email), \
+                patch.object(AimdRateController, "on_success", on_success):
+            asyncio.run(run_api_tests(emails, api_config, 1, run_metrics=run_metrics))
+
+        self.assertEqual(max(rates[100]), 100)
+        self.assertEqual(max(rates[400]), 400)
+        self.assertEqual(run_metrics["adaptive_rate"]["max_rps"], 400)
+
+    def test_load_profile_stop_rates_use_received_results(self):
+        """Si el perfil se detiene por un umbral, FP/FN se calculan sobre lo recibido."""
+        outcomes = ("Valido considerado valido", "Error", "Valido considerado invalido", "Invalido considerado valido")
+
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            await acquire()
+            return {"email": email, "duration": 0.001, "classification": outcomes[int(email[4:].split("@")[0]) % 4]}
+
+        # 25% de errores: el perfil se detiene al evaluar la primera etapa
+        api_config = self._make_api_config(load_profile={
+            "stages": [{"rps": 200, "duration": 0.1}, {"rps": 200, "duration": 10}],
+            "max_error_rate_percent": 10,
+        })
+        emails = [(f"user{i}@example.com", i % 4 in (0, 2)) for i in range(2000)]
+        run_metrics = {}
+
+        with patch("api_client.process_email", fake_process_email):
+            results = asyncio.run(run_api_tests(emails, api_config, 1, run_metrics=run_metrics))
+
+        self.assertTrue(run_metrics["load_profile"]["stopped_early"])
+        stats = calculate_statistics(results, 1000, 1000, 200, "http://fake.api", run_metrics=run_metrics)
+        summary, accuracy = stats["summary"], stats["accuracy"]
+        counts = accuracy["classification_counts"]
+        self.assertLess(summary["valid_source_results"] + summary["invalid_source_results"], 200)
+        self.assertEqual(summary["valid_source_results"] + summary["invalid_source_results"], len(results))
+        self.assertAlmostEqual(accuracy["false_negative_rate_percent"],
+                               counts["Valido considerado invalido"] / summary["valid_source_results"] * 100)
+        self.assertAlmostEqual(accuracy["false_positive_rate_percent"],
+                               counts["Invalido considerado valido"] / summary["invalid_source_results"] * 100)
+
+    def test_api_settings_override_global(self):
+        settings = load_settings({"load_model": "open"}, {"load_model": "closed", "arrival": "poisson"})
+        self.assertEqual(settings["load_model"], "open")
+        self.assertEqual(settings["arrival"], "poisson")
+        self.assertEqual(load_settings({})["load_model"], "paced")
+
+
+class TestRunMultiApiTests(unittest.TestCase):
+    """Tests para la ejecución concurrente de varias APIs."""
+
+    def test_fans_out_stream_to_every_api(self):
+        seen: dict[str, list[str]] = {}
+
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            await acquire()
+            seen.setdefault(api_config["name"], []).append(email)
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido"}
+
+        apis = [
+            {"name": "A", "endpoint": "http://a", "api_key": "k", "validation_rules": [], "rps": 5000},
+            {"name": "B", "endpoint": "http://b", "api_key": "k", "validation_rules": []},
+        ]
+        emails = ((f"user{i}@example.com", True) for i in range(20))
+        progress = {}
+
+        with patch("api_client.process_email", fake_process_email):
+            results, metrics = asyncio.run(run_multi_api_tests(
+                emails, apis, 4000,
+                on_progress=lambda name, done, total: progress.__setitem__(name, done),
+            ))
+
+        self.assertEqual(set(results), {"A", "B"})
+        self.assertEqual(len(results["A"]), 20)
+        self.assertEqual(sorted(seen["A"]), sorted(seen["B"]))
+        self.assertEqual(progress, {"A": 20, "B": 20})
+        self.assertEqual(metrics["A"]["rate_limiter"]["target_rps"], 5000)
+        self.assertEqual(metrics["B"]["rate_limiter"]["target_rps"], 4000)
+
+    def test_per_api_max_in_flight_overrides_global(self):
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido"}
+
+        apis = [
+            {"name": "A", "endpoint": "http://a", "api_key": "k", "validation_rules": [], "max_in_flight": 3},
+            {"name": "B", "endpoint": "http://b", "api_key": "k", "validation_rules": []},
+        ]
+        with patch("api_client.process_email", fake_process_email):
+            _, metrics = asyncio.run(run_multi_api_tests(
+                [("user@example.com", True)], apis, 1000, max_in_flight=10,
+            ))
+
+        self.assertEqual(metrics["A"]["max_in_flight"], 3)
+        self.assertEqual(metrics["B"]["max_in_flight"], 10)
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Tests para la configuración del pool de conexiones."""
+
+    def test_connector_settings(self):
+        async def build():
+            connector = create_connector({"max_connections": 7, "limit_per_host": 3, "dns_cache_ttl": 60})
+            try:
+                return connector.limit, connector.limit_per_host, connector.use_dns_cache
+            finally:
+                await connector.close()
+
+        self.assertEqual(asyncio.run(build()), (7, 3, True))
+
+    def test_force_close_disables_keepalive(self):
+        settings = connector_settings({"force_close": True})
+        self.assertTrue(settings["force_close"])
+        self.assertIsNone(settings["keepalive_timeout"])
+
+    def test_pool_stats_against_local_server(self):
+        """Las conexiones deben reutilizarse contra un servidor local."""
+        async def handler(request):
+            return web.json_response({"data": {"score": 90, "reason": "ok"}})
+
+        async def scenario():
+            app = web.Application()
+            app.router.add_get("/validate", handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = runner.addresses[0][1]
+            try:
+                api_config = {
+                    "name": "Local",
+                    "api_key": "k",
+                    "endpoint": f"http://127.0.0.1:{port}/validate",
+                    "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+                    "max_connections": 2,
+                }
+                run_metrics = {}
+                emails = [(f"user{i}@example.com", True) for i in range(20)]
+                results = await run_api_tests(emails, api_config, 1000, run_metrics=run_metrics)
+                return results, run_metrics
+            finally:
+                await runner.cleanup()
+
+        results, run_metrics = asyncio.run(scenario())
+        pool = run_metrics["connection_pool"]
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(r["classification"] == "Valido considerado valido" for r in results))
+        self.assertEqual(pool["max_connections"], 2)
+        self.assertLessEqual(pool["connections_created"], 2)
+        self.assertEqual(pool["connections_created"] + pool["connections_reused"], 20)
+
+        # Fases por solicitud: las nuevas conexiones miden connect, las reutilizadas no
+        timings = [r["timings"] for r in results]
+        self.assertTrue(all(t["ttfb"] is not None and t["body"] is not None for t in timings))
+        fresh = [t for t in timings if not t["connection_reused"]]
+        self.assertTrue(fresh and all(t["connect"] is not None for t in fresh))
+        self.assertTrue(all(t["connect"] is None for t in timings if t["connection_reused"]))
+        for t in timings:
+            self.assertAlmostEqual(t["total"], sum(t[p] or 0 for p in ("queue", "dns", "connect", "send", "ttfb", "body")), delta=0.01)
+
+    def test_fields_mode_and_raw_body_against_local_server(self):
+        """response_mode "fields" reduce raw_response; keep_raw_body guarda el body original."""
+        body = {"data": {"score": 90, "reason": "ok", "mx": ["mx1", "mx2"]}, "meta": {"credits": 5}}
+
+        async def handler(request):
+            return web.json_response(body)
+
+        async def scenario():
+            app = web.Application()
+            app.router.add_get("/validate", handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = runner.addresses[0][1]
+            try:
+                api_config = {
+                    "name": "Local",
+                    "api_key": "k",
+                    "endpoint": f"http://127.0.0.1:{port}/validate",
+                    "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+                    "response_mode": "fields",
+                    "keep_raw_body": True,
+                }
+                return await run_api_tests([("a@example.com", True)], api_config, 1000)
+            finally:
+                await runner.cleanup()
+
+        result = asyncio.run(scenario())[0]
+        self.assertEqual(result["classification"], "Valido considerado valido")
+        self.assertEqual(result["raw_response"], {"data": {"score": 90, "reason": "ok"}})
+        self.assertEqual(json.loads(result["raw_body"]), body)
+
+
+
+class TestWebhookCorrelation(unittest.TestCase):
+    """Tests para webhooks correlacionados por id_field con entregas en lote."""
+
+    def test_batched_callbacks_resolve_by_job_id(self):
+        async def scenario():
+            server = WebhookServer(host="127.0.0.1", port=0)
+            await server.start()
+
+            jobs = []
+            posted = []
+
+            async def validate(request):
+                body = await request.json()
+                job_id = f"job-{len(jobs)}"
+                jobs.append((job_id, body["email"], body["callback_url"]))
+                if len(jobs) == 4:
+                    # El proveedor entrega todos los resultados en un solo POST
+                    async def deliver():
+                        batch = {"results": [
+                            {"job_id": job, "data": {"score": 90 if email.startswith("good") else 10, "reason": "r"}}
+                            for job, email, _ in jobs
+                        ]}
+                        async with aiohttp.ClientSession() as session:
+                            async with session.post(jobs[0][2], json=batch) as response:
+                                posted.append(await response.json())
+                    asyncio.get_running_loop().create_task(deliver())
+                return web.json_response({"job_id": job_id, "status": "queued"})
+
+            app = web.Application()
+            app.router.add_post("/validate", validate)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = runner.addresses[0][1]
+            try:
+                api_config = {
+                    "name": "Batch",
+                    "api_key": "k",
+                    "endpoint": f"http://127.0.0.1:{port}/validate",
+                    "method": "POST",
+                    "mode": "webhook",
+                    "webhook": {"id_field": "job_id", "batch_path": "results", "timeout": 5},
+                    "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+                }
+                emails = [("good1@example.com", True), ("good2@example.com", True),
+                          ("bad1@example.com", False), ("bad2@example.com", True)]
+                run_metrics = {}
+                results = await run_api_tests(emails, api_config, 1000, webhook_server=server, run_metrics=run_metrics)
+                return results, run_metrics, posted, {url for _, _, url in jobs}
+            finally:
+                await runner.cleanup()
+                await server.stop()
+
+        results, run_metrics, posted, callback_urls = asyncio.run(scenario())
+        self.assertEqual(len(callback_urls), 1)
+        self.assertEqual(posted, [{"status": "ok", "received": 4, "resolved": 4}])
+        by_email = {r["email"]: r["classification"] for r in results}
+        self.assertEqual(by_email["good1@example.com"], "Valido considerado valido")
+        self.assertEqual(by_email["bad1@example.com"], "Invalido considerado invalido")
+        self.assertEqual(by_email["bad2@example.com"], "Valido considerado invalido")
+        self.assertEqual(run_metrics["webhook"]["batches"], 1)
+        self.assertEqual(run_metrics["webhook"]["pending"], 0)
+
+
+class TestRetries(unittest.TestCase):
+    """Tests para reintentos con backoff y Retry-After."""
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)  # fecha pasada
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("pronto"))
+
+    def test_backoff_delay_bounds(self):
+        policy = retry_policy({"retry": {"max_attempts": 5, "backoff_base": 1, "backoff_max": 4}})
+        for attempt in range(1, 6):
+            self.assertLessEqual(backoff_delay(attempt, policy), min(4, 2 ** (attempt - 1)))
+        self.assertGreaterEqual(backoff_delay(1, policy, retry_after=10), 10)
+
+    def test_retries_throttled_request_against_local_server(self):
+        """Un 429 con Retry-After se reintenta; la latencia es la del último intento."""
+        calls = []
+
+        async def handler(request):
+            calls.append(request.query["email"])
+            if len(calls) % 2 == 1:
+                return web.json_response({"error": "slow down"}, status=429, headers={"Retry-After": "0"})
+            return web.json_response({"data": {"score": 90, "reason": "ok"}})
+
+        async def scenario():
+            app = web.Application()
+            app.router.add_get("/validate", handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = runner.addresses[0][1]
+            try:
+                api_config = {
+                    "name": "Local",
+                    "api_key": "k",
+                    "endpoint": f"http://127.0.0.1:{port}/validate",
+                    "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+                    "retry": {"max_attempts": 3, "backoff_base": 0.001},
+                    "adaptive_rate": {"min_rps": 10},
+                }
+                run_metrics = {}
+                results = await run_api_tests([("a@example.com", True)], api_config, 1000,
+                                              run_metrics=run_metrics, max_in_flight=1)
+                return results, run_metrics
+            finally:
+                await runner.cleanup()
+
+        results, run_metrics = asyncio.run(scenario())
+        result = results[0]
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(result["classification"], "Valido considerado valido")
+        self.assertEqual(result["attempts"], 2)
+        self.assertEqual(result["throttle_events"], 1)
+        self.assertEqual(run_metrics["adaptive_rate"]["rate_decreases"], 1)
+        self.assertEqual(run_metrics["adaptive_rate"]["lowest_rps"], 500)
+
+    def test_exhausted_retries_report_http_error(self):
+        """Sin reintentos disponibles, un 503 es Error (no se evalúa su body)."""
+        response = MagicMock(status=503, headers={})
+        response.read = AsyncMock()
+        mock_session = MagicMock()
+        mock_session.get.return_value.__aenter__ = AsyncMock(return_value=response)
+        mock_session.get.return_value.__aexit__ = AsyncMock(return_value=False)
+
+        config = {
+            "api_key": "k", "endpoint": "http://fake.api",
+            "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+        }
+        result = asyncio.run(process_email(mock_session, "a@example.com", True, config))
+        self.assertEqual(result["classification"], "Error")
+        self.assertEqual(result["status_code"], 503)
+        self.assertEqual(result["error_message"], "HTTP 503")
+        self.assertNotIn("attempts", result)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import os
+import json
+import shutil
+from types import SimpleNamespace
+from checkpoint import RunCheckpoint, completed_emails, config_fingerprint, merge_previous_results
+from main import restore_run_settings
+from latency_histogram import LatencyHistogram
+from result_store import ResultStore
+
+
+def make_result(email, classification="Valido considerado valido", duration=0.1):
+    return {"email": email, "duration": duration, "classification": classification,
+            "is_valid_source": True, "raw_response": {"status": "valid"}}
+
+
+class TestRunCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.runs_dir = "test_checkpoint_runs"
+
+    def tearDown(self):
+        shutil.rmtree(self.runs_dir, ignore_errors=True)
+
+    def test_resume_after_interruption(self):
+        """Lo escrito antes del corte se recupera por API, con los agregados parciales."""
+        checkpoint = RunCheckpoint.create(self.runs_dir, drop_raw_response=False, requests_per_second=5)
+        checkpoint.write(make_result("a@x.com"), api="API1")
+        checkpoint.write(make_result("b@x.com", "Error"), api="API1")
+        checkpoint.write(make_result("a@x.com"), api="API2")
+        checkpoint.close(completed=False)
+
+        self.assertEqual(RunCheckpoint.latest_unfinished(self.runs_dir), checkpoint.run_id)
+        with open(checkpoint.meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        self.assertEqual(meta["status"], "interrupted")
+        self.assertEqual(meta["requests_per_second"], 5)
+        self.assertEqual(meta["progress"]["API1"]["completed"], 2)
+        self.assertEqual(meta["progress"]["API1"]["classification_counts"]["Error"], 1)
+
+        resumed = RunCheckpoint.load(checkpoint.run_id, self.runs_dir)
+        previous = resumed.load_results()
+        self.assertEqual(len(previous["API1"]), 2)
+        # Sin details_file propio, el detalle del checkpoint no guarda raw_response
+        self.assertNotIn("raw_response", previous["API1"][0])
+        self.assertEqual(completed_emails(previous), {"API1": {"a@x.com", "b@x.com"}, "API2": {"a@x.com"}})
+
+        resumed.write(make_result("c@x.com"), api="API2")
+        resumed.close(completed=True)
+        self.assertIsNone(RunCheckpoint.latest_unfinished(self.runs_dir))
+        self.assertEqual(len(RunCheckpoint.load(checkpoint.run_id, self.runs_dir).load_results()["API2"]), 2)
+
+    def test_truncated_last_line_is_discarded(self):
+        checkpoint = RunCheckpoint.create(self.runs_dir)
+        checkpoint.write(make_result("a@x.com"), api="API1")
+        checkpoint.close()
+        with open(checkpoint.details_path, "a", encoding="utf-8") as f:
+            f.write('{"api": "API1", "email": "b@x')
+
+        previous = RunCheckpoint.load(checkpoint.run_id, self.runs_dir).load_results()
+        self.assertEqual(previous["API1"].emails, ["a@x.com"])
+        self.assertNotIn("raw_response", previous["API1"][0])
+
+    def test_details_file_keeps_raw_response(self):
+        """Con --details-file, el detalle (y lo que se retoma) conserva raw_response."""
+        os.makedirs(self.runs_dir, exist_ok=True)
+        details_file = os.path.join(self.runs_dir, "details.jsonl")
+        checkpoint = RunCheckpoint.create(self.runs_dir, details_file=details_file, drop_raw_response=False)
+        checkpoint.write(make_result("a@x.com"), api="API1")
+        checkpoint.close()
+
+        previous = RunCheckpoint.load(checkpoint.run_id, self.runs_dir).load_results()
+        self.assertEqual(previous["API1"][0]["raw_response"], {"status": "valid"})
+
+    def test_resume_restores_settings_and_rejects_changed_config(self):
+        """--resume usa las opciones guardadas y no acepta otra configuración de APIs."""
+        os.makedirs(self.runs_dir, exist_ok=True)
+        config_file = os.path.join(self.runs_dir, "apis.json")
+        with open(config_file, "w", encoding="utf-8") as f:
+            json.dump([{"name": "API1", "endpoint": "http://a"}], f)
+        fingerprint = config_fingerprint(config_file)
+        with open(config_file, "w", encoding="utf-8") as f:
+            json.dump([{"endpoint": "http://a", "name": "API1"}], f, indent=4)
+        self.assertEqual(config_fingerprint(config_file), fingerprint)
+
+        meta = {"run_id": "r1", "config_file": config_file, "config_fingerprint": fingerprint,
+                "details_file": None, "requests_per_second": 40, "workers": 4, "sample_size": 100}
+        args = SimpleNamespace(config_file=config_file, requests_per_second=16, workers=1,
+                               sample_size=None, details_file="otro.jsonl")
+        restore_run_settings(args, meta)
+        self.assertEqual((args.requests_per_second, args.workers, args.sample_size), (40, 4, 100))
+        self.assertIsNone(args.details_file)
+
+        with open(config_file, "w", encoding="utf-8") as f:
+            json.dump([{"name": "API1", "endpoint": "http://b"}], f)
+        with self.assertRaises(ValueError):
+            restore_run_settings(args, meta)
+
+    def test_missing_run(self):
+        with self.assertRaises(FileNotFoundError):
+            RunCheckpoint.load("no-existe", self.runs_dir)
+
+    def test_merge_previous_results(self):
+        """Los resultados previos van primero y suman al histograma, no al throughput."""
+        previous = {"API1": ResultStore([make_result("a@x.com", duration=0.2)])}
+        new_latency = LatencyHistogram()
+        new_latency.record(0.4)
+        results_by_api = {"API1": ResultStore([make_result("b@x.com", duration=0.4)])}
+        metrics_by_api = {"API1": {"latency_histogram": new_latency}}
+
+        merge_previous_results(previous, results_by_api, metrics_by_api)
+
+        self.assertEqual(results_by_api["API1"].emails, ["a@x.com", "b@x.com"])
+        self.assertEqual(metrics_by_api["API1"]["latency_histogram"].count, 2)
+        self.assertEqual(metrics_by_api["API1"]["resumed_requests"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
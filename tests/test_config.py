@@ -58,6 +58,43 @@ class TestLoadApisConfig(unittest.TestCase):
         finally:
             os.unlink(path)
 
+    def test_invalid_operator(self):
+        """Debe fallar al cargar si una regla usa un operador no soportado."""
+        config = [{
+            "name": "TestAPI",
+            "endpoint": "http://test.com",
+            "api_key": "key123",
+            "validation_rules": [{"field": "score", "operator": "=>", "value": 80}]
+        }]
+        path = self._write_temp_config(config)
+        try:
+            with self.assertRaises(ValueError):
+                load_apis_config(path)
+        finally:
+            os.unlink(path)
+
+    def test_invalid_retry_policy(self):
+        """Debe fallar si la política de reintentos, el rate adaptativo o el modelo de carga son inválidos."""
+        base = {
+            "name": "TestAPI",
+            "endpoint": "http://test.com",
+            "api_key": "key123",
+            "validation_rules": [{"field": "score", "operator": ">=", "value": 80}]
+        }
+        for extra in ({"retry": {"max_attempts": 0}},
+                      {"retry": {"retry_on": ["429"]}},
+                      {"adaptive_rate": {"decrease_factor": 1.5}},
+                      {"load_model": "burst"},
+                      {"virtual_users": 0},
+                      {"max_in_flight": 0},
+                      {"max_in_flight": -5}):
+            path = self._write_temp_config([{**base, **extra}])
+            try:
+                with self.assertRaises(ValueError):
+                    load_apis_config(path)
+            finally:
+                os.unlink(path)
+
     def test_env_var_api_key(self):
         """Debe resolver API keys desde variables de entorno."""
         config = [{
@@ -152,5 +189,13 @@ class TestGetConfig(unittest.TestCase):
             self.assertEqual(args.log_level, "DEBUG")
 
 
+    @patch('config.load_apis_config')
+    def test_invalid_max_in_flight_argument(self, mock_load):
+        mock_load.return_value = self._mock_apis_config()
+        for value in ("0", "-1"):
+            with patch.object(sys, 'argv', ["programa", "--max-in-flight", value]), \
+                    patch('sys.stderr'), self.assertRaises(SystemExit):
+                get_config()
+
 if __name__ == '__main__':
     unittest.main()
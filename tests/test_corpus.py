@@ -0,0 +1,121 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from corpus import (
+    CompactHashSet, CorpusSource, EmailCorpus, allocate_sample, email_hash, parse_label, stratified_sample,
+)
+
+
+class TestCompactHashSet(unittest.TestCase):
+    """Tests para el conjunto compacto de hashes."""
+
+    def test_add_contains_and_grow(self):
+        hashes = CompactHashSet(4)
+        values = [email_hash(f"user{i}@example.com") for i in range(1000)]
+        self.assertTrue(all(hashes.add(h) for h in values))
+        self.assertFalse(hashes.add(values[10]))
+        self.assertEqual(len(hashes), 1000)
+        self.assertTrue(all(h in hashes for h in values))
+        self.assertNotIn(email_hash("otro@example.com"), hashes)
+        self.assertEqual(sorted(hashes), sorted(values))
+
+
+class TestEmailCorpus(unittest.TestCase):
+    """Tests para el corpus de emails en streaming."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.directory, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_dedupes_and_reports_conflicts(self):
+        valid = self.write("valid.txt", "a@example.com\nb@example.com\n\na@example.com\nBoth@Example.com \n")
+        invalid = self.write("invalid.txt.gz", "x@example.com\nboth@example.com\n")
+        corpus = EmailCorpus.from_files(valid, invalid, normalize=True)
+
+        self.assertEqual(list(corpus), [
+            ("a@example.com", True), ("b@example.com", True), ("both@example.com", True), ("x@example.com", False),
+        ])
+        self.assertEqual(list(corpus), list(corpus))  # re-iterable
+        self.assertEqual((len(corpus), corpus.valid_count, corpus.invalid_count), (4, 3, 1))
+        report = corpus.report()
+        self.assertEqual(report["duplicates"], 1)
+        self.assertEqual(report["conflicts"], 1)
+        self.assertEqual(report["conflict_sample"], ["both@example.com"])
+
+    def test_drop_conflicts(self):
+        valid = self.write("valid.txt", "a@example.com\nboth@example.com\n")
+        invalid = self.write("invalid.txt", "both@example.com\nx@example.com\nboth@example.com\n")
+        corpus = EmailCorpus.from_files(valid, invalid, conflicts="drop")
+        self.assertEqual(list(corpus), [("a@example.com", True), ("x@example.com", False)])
+        self.assertEqual((corpus.valid_count, corpus.invalid_count), (1, 1))
+
+    def test_gzipped_csv_with_label_column(self):
+        path = self.write("corpus.csv.gz", "id,email,label\n1,a@example.com,valid\n2,b@example.com,0\n3,c@example.com,?\n4,,1\n")
+        corpus = EmailCorpus.from_files(corpus_file=path, label_column="label")
+        self.assertEqual(list(corpus), [("a@example.com", True), ("b@example.com", False)])
+        self.assertEqual(corpus.report()["unlabeled"], 2)
+
+        with self.assertRaises(ValueError):
+            EmailCorpus.from_files(corpus_file=path, label_column="verdict")
+
+    def test_without_dedupe_and_missing_files(self):
+        valid = self.write("valid.txt", "a@example.com\na@example.com\n")
+        corpus = EmailCorpus.from_files(valid, os.path.join(self.directory, "missing.txt"), dedupe=False)
+        self.assertEqual(len(list(corpus)), 2)
+        with self.assertRaises(ValueError):
+            CorpusSource(valid)
+
+    def test_parse_label(self):
+        self.assertTrue(parse_label(" Válido "))
+        self.assertFalse(parse_label("false"))
+        self.assertIsNone(parse_label("tal vez"))
+
+
+
+class TestStratifiedSample(unittest.TestCase):
+    """Tests para la muestra estratificada por reservorio."""
+
+    def setUp(self):
+        self.emails = [(f"user{i}@{'a' if i % 3 else 'b'}.com", i % 5 != 0) for i in range(1000)]
+
+    def test_sample_is_stratified_and_reproducible(self):
+        sample, report = stratified_sample(self.emails, 100, seed=7)
+        self.assertEqual(len(sample), 100)
+        self.assertEqual((report["valid"], report["invalid"]),
+                         ({"population": 800, "sample": 80}, {"population": 200, "sample": 20}))
+        self.assertEqual(sum(1 for _, label in sample if not label), 20)
+        self.assertTrue(set(sample) <= set(self.emails))
+        # En el orden del corpus, y la misma semilla da la misma muestra
+        positions = [self.emails.index(item) for item in sample]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual(stratified_sample(self.emails, 100, seed=7)[0], sample)
+        self.assertNotEqual(stratified_sample(self.emails, 100, seed=8)[0], sample)
+
+    def test_sample_by_domain(self):
+        sample, report = stratified_sample(self.emails, 90, by_domain=True)
+        self.assertEqual(report["stratum_count"], 4)
+        b_count = sum(1 for email, _ in sample if email.endswith("@b.com"))
+        self.assertEqual(b_count, 30)
+
+    def test_sample_larger_than_corpus(self):
+        sample, report = stratified_sample(self.emails[:10], 50)
+        self.assertEqual(sample, self.emails[:10])
+        self.assertEqual(report["fraction"], 1.0)
+
+    def test_allocate_sample(self):
+        self.assertEqual(allocate_sample({"a": 5, "b": 3, "c": 2}, 5), {"a": 3, "b": 1, "c": 1})
+        self.assertEqual(sum(allocate_sample({i: i + 1 for i in range(50)}, 77).values()), 77)
+
+if __name__ == '__main__':
+    unittest.main()
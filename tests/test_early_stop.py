@@ -0,0 +1,204 @@
+import asyncio
+import itertools
+import unittest
+from unittest.mock import patch
+from api_client import SKIP_YIELD_EVERY, run_api_tests
+from early_stop import EarlyStopController, ShardEarlyStop
+from mock_provider import MockProvider
+from multiprocess_runner import run_sharded_api_tests
+from stats_calculator import calculate_statistics
+
+
+def result(is_valid_source, classification):
+    return {"is_valid_source": is_valid_source, "classification": classification}
+
+
+OK_VALID = result(True, "Valido considerado valido")
+FN = result(True, "Valido considerado invalido")
+OK_INVALID = result(False, "Invalido considerado invalido")
+ERROR = result(True, "Error")
+
+
+class TestEarlyStopController(unittest.TestCase):
+    """Tests para la parada temprana por convergencia de FP/FN."""
+
+    def test_labels_converge_independently(self):
+        controller = EarlyStopController(max_ci_width_percent=10, min_requests=20)
+        for i in range(19):
+            controller.record_result(FN if i % 10 == 0 else OK_VALID)
+        self.assertTrue(controller.should_send(True))  # todavía no llegó a min_requests
+
+        while controller.should_send(True):
+            controller.record_result(OK_VALID)
+        self.assertTrue(controller.converged(True))
+        self.assertFalse(controller.stopped)
+        self.assertTrue(controller.should_send(False))
+
+        while controller.should_send(False):
+            controller.record_result(OK_INVALID)
+        self.assertTrue(controller.stopped)
+        low, high = controller.interval(False)
+        self.assertLessEqual(high - low, 10)
+
+    def test_error_budget(self):
+        controller = EarlyStopController(max_ci_width_percent=1, min_requests=10, max_error_rate_percent=30)
+        for _ in range(5):
+            controller.record_result(ERROR)
+        self.assertFalse(controller.stopped)  # menos de min_requests resultados
+        for _ in range(5):
+            controller.record_result(OK_VALID)
+        controller.record_result(ERROR)
+        self.assertIn("presupuesto de errores", controller.stop_reason)
+
+        absolute = EarlyStopController(max_ci_width_percent=1, max_errors=2)
+        absolute.record_result(ERROR)
+        absolute.record_result(ERROR)
+        self.assertTrue(absolute.stopped)
+
+    def test_summary(self):
+        controller = EarlyStopController(max_ci_width_percent=5, min_requests=1)
+        for _ in range(10):
+            controller.record_sent()
+            controller.record_result(FN)
+        controller.record_skipped()
+        summary = controller.summary(total=100)
+        self.assertEqual(summary["requests_sent"], 10)
+        self.assertEqual(summary["requests_saved"], 90)
+        self.assertEqual(summary["valid"]["false_negatives"], 10)
+        self.assertEqual(summary["valid"]["false_negative_rate_percent"], 100.0)
+        self.assertIsNone(summary["invalid"]["false_positive_rate_ci_percent"])
+
+    def test_shards_follow_published_decisions(self):
+        """Los workers no deciden: siguen lo que publica el controlador del proceso principal."""
+        controller = EarlyStopController(max_ci_width_percent=100, min_requests=2, max_errors=3)
+        flags = [0, 0, 0]
+        shard = ShardEarlyStop(flags)
+        controller.record_result(OK_VALID)
+        controller.publish(flags)
+        self.assertTrue(shard.should_send(True))
+        controller.record_result(OK_VALID)
+        controller.publish(flags)
+        self.assertFalse(shard.should_send(True))
+        self.assertTrue(shard.should_send(False))
+        for _ in range(3):
+            controller.record_result(ERROR)
+        controller.publish(flags)
+        self.assertTrue(shard.stopped)
+        self.assertFalse(shard.should_send(False))
+
+    def test_invalid_config(self):
+        for config in ({}, {"max_ci_width_percent": 0}, {"max_ci_width_percent": 1, "confidence": 1.5},
+                       {"max_ci_width_percent": 1, "min_requests": 0}, {"max_ci_width_percent": 1, "max_errors": -1}):
+            with self.assertRaises(ValueError):
+                EarlyStopController.from_config(config)
+        controller = EarlyStopController.from_config({"max_ci_width_percent": 2, "max_errors": 5})
+        self.assertEqual((controller.max_ci_width_percent, controller.max_errors), (2, 5))
+
+
+class TestEarlyStopRun(unittest.TestCase):
+    """Tests de punta a punta de la parada temprana en run_api_tests."""
+
+    def test_run_stops_after_convergence(self):
+        emails = [(f"user{i}@example.com", True) if i % 2 else (f"invalid{i}@example.com", False)
+                  for i in range(2000)]
+
+        async def scenario():
+            async with MockProvider(mislabel_rate=0.05, seed=3) as provider:
+                api_config = provider.api_config(
+                    early_stop={"max_ci_width_percent": 12, "min_requests": 50}, max_in_flight=8,
+                )
+                run_metrics = {}
+                results = await run_api_tests(emails, api_config, 1000, run_metrics=run_metrics)
+                return results, run_metrics
+
+        results, run_metrics = asyncio.run(scenario())
+        summary = run_metrics["early_stop"]
+        self.assertTrue(summary["stopped_early"])
+        self.assertLess(len(results), 1000)
+        self.assertEqual(summary["requests_sent"], len(results))
+        self.assertEqual(summary["requests_saved"], 2000 - len(results))
+        self.assertIsNotNone(summary["valid"]["converged_after"])
+        self.assertIsNotNone(summary["invalid"]["converged_after"])
+
+        # Las tasas se calculan sobre los resultados recibidos, no sobre el corpus
+        stats = calculate_statistics(results, 1000, 1000, 1000, "http://mock", run_metrics=run_metrics)
+        accuracy = stats["accuracy"]
+        counts = accuracy["classification_counts"]
+        received_valid = counts.get("Valido considerado valido", 0) + counts.get("Valido considerado invalido", 0)
+        received_invalid = len(results) - received_valid
+        self.assertLess(received_valid, 1000)
+        self.assertEqual(stats["summary"]["valid_source_results"], received_valid)
+        self.assertEqual(stats["summary"]["invalid_source_results"], received_invalid)
+        self.assertAlmostEqual(
+            accuracy["false_negative_rate_percent"],
+            counts.get("Valido considerado invalido", 0) / received_valid * 100,
+        )
+        self.assertAlmostEqual(
+            accuracy["false_positive_rate_percent"],
+            counts.get("Invalido considerado valido", 0) / received_invalid * 100,
+        )
+        self.assertAlmostEqual(accuracy["false_negative_rate_percent"], summary["valid"]["false_negative_rate_percent"])
+
+    def test_sharded_run_stops_on_combined_counts(self):
+        """Con workers, el proceso principal decide con los conteos de todos (min_requests es del total)."""
+        emails = [(f"user{i}@example.com", True) if i % 2 else (f"invalid{i}@example.com", False)
+                  for i in range(4000)]
+
+        async def scenario():
+            async with MockProvider(seed=3) as provider:
+                api_config = provider.api_config(early_stop={"max_ci_width_percent": 100, "min_requests": 30})
+                run_metrics = {}
+                results = await run_sharded_api_tests(emails, api_config, 400, 2, run_metrics=run_metrics)
+                return results, run_metrics
+
+        results, run_metrics = asyncio.run(scenario())
+        summary = run_metrics["early_stop"]
+        self.assertTrue(summary["stopped_early"])
+        self.assertEqual(summary["valid"]["converged_after"], 30)
+        self.assertEqual(summary["invalid"]["converged_after"], 30)
+        self.assertEqual(summary["requests_sent"], len(results))
+        self.assertEqual(summary["valid"]["results"] + summary["invalid"]["results"], len(results))
+        self.assertLess(len(results), 1000)
+
+    def test_skipped_emails_yield_to_event_loop(self):
+        """Un tramo largo de emails de una etiqueta ya convergida no bloquea el event loop."""
+        async def fake_process_email(session, email, is_valid_source, api_config, evaluator=None,
+                                     cache=None, acquire=None, rate_control=None, cache_checked=False):
+            return {"email": email, "duration": 0.001, "classification": "Valido considerado valido"}
+
+        async def scenario():
+            ticks = 0
+            pulled = []
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            def emails():
+                for i in range(20000):
+                    pulled.append(ticks)
+                    yield f"user{i}@example.com", True
+
+            api_config = {
+                "name": "TestAPI", "api_key": "k", "endpoint": "http://fake.api",
+                "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+                "early_stop": {"max_ci_width_percent": 100, "min_requests": 1},
+            }
+            task = asyncio.create_task(ticker())
+            try:
+                await run_api_tests(emails(), api_config, 100000, max_in_flight=1)
+            finally:
+                task.cancel()
+            return pulled
+
+        with patch("api_client.process_email", fake_process_email):
+            pulled = asyncio.run(scenario())
+        longest = max(len(list(group)) for _, group in itertools.groupby(pulled))
+        self.assertEqual(len(pulled), 20000)
+        self.assertLess(longest, 2 * SKIP_YIELD_EVERY)
+
+
+if __name__ == '__main__':
+    unittest.main()
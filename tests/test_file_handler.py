@@ -3,7 +3,7 @@ import unittest
 import os
 import json
 from unittest import mock
-from file_handler import read_emails_from_file, save_results_to_json
+from file_handler import read_emails_from_file, save_results_to_json, JsonlResultSink
 
 
 class TestFileHandler(unittest.TestCase):
@@ -13,6 +13,7 @@ class TestFileHandler(unittest.TestCase):
         self.valid_file = "test_valid_emails.txt"
         self.invalid_file = "test_invalid_emails.txt"
         self.output_file = "test_output.json"
+        self.details_file = "test_details.jsonl"
 
         with open(self.valid_file, "w") as f:
             f.write("email1@example.com\n")
@@ -24,7 +25,7 @@ class TestFileHandler(unittest.TestCase):
 
     def tearDown(self):
         """Limpia el entorno después de cada prueba."""
-        for f in [self.valid_file, self.invalid_file, self.output_file]:
+        for f in [self.valid_file, self.invalid_file, self.output_file, self.details_file]:
             if os.path.exists(f):
                 os.remove(f)
 
@@ -62,6 +63,30 @@ class TestFileHandler(unittest.TestCase):
             result = save_results_to_json({}, "ruta/protegida/resultado.json")
             self.assertFalse(result)
 
+    def test_jsonl_sink_writes_one_line_per_result(self):
+        """Prueba que el sink escribe una línea JSON por resultado, con campos extra."""
+        with JsonlResultSink(self.details_file, flush_every=2) as sink:
+            sink.write({"email": "a@example.com", "duration": 0.1}, api="API_1")
+            sink.write({"email": "b@example.com", "duration": 0.2}, api="API_1")
+            # Con flush_every=2 ya debe estar en disco antes de cerrar
+            with open(self.details_file, 'r', encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 2)
+            sink.write({"email": "c@example.com", "duration": 0.3}, api="API_2")
+
+        with open(self.details_file, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([r["email"] for r in rows], ["a@example.com", "b@example.com", "c@example.com"])
+        self.assertEqual(rows[2]["api"], "API_2")
+
+    def test_jsonl_sink_append(self):
+        """Prueba que append=True continúa un archivo existente."""
+        with JsonlResultSink(self.details_file) as sink:
+            sink.write({"email": "a@example.com"})
+        with JsonlResultSink(self.details_file, append=True) as sink:
+            sink.write({"email": "b@example.com"})
+        with open(self.details_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
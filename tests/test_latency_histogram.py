@@ -0,0 +1,58 @@
+import unittest
+import json
+import random
+from latency_histogram import LatencyHistogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles_within_relative_error(self):
+        """Los percentiles tienen error relativo < 1% frente al valor exacto."""
+        rng = random.Random(42)
+        values = [rng.lognormvariate(-2, 1) for _ in range(20000)]
+        histogram = LatencyHistogram()
+        histogram.record_many(values)
+
+        ordered = sorted(values)
+        for q in (0.5, 0.9, 0.99, 0.999):
+            exact = ordered[max(0, int(q * len(ordered)) - 1)]
+            self.assertAlmostEqual(histogram.percentile(q), exact, delta=exact * 0.01 + 1e-6)
+
+        self.assertEqual(histogram.count, 20000)
+        self.assertEqual(histogram.max, max(values))
+        self.assertLess(len(histogram.counts), 3000)
+
+    def test_merge_equals_single_histogram(self):
+        """Combinar histogramas parciales da lo mismo que registrar todo en uno."""
+        values = [i / 1000 for i in range(1, 5000)]
+        whole = LatencyHistogram()
+        whole.record_many(values)
+
+        a, b = LatencyHistogram(), LatencyHistogram()
+        a.record_many(values[::2])
+        b.record_many(values[1::2])
+        merged = a.merge(b)
+
+        self.assertEqual(merged.counts, whole.counts)
+        self.assertEqual(merged.percentiles(), whole.percentiles())
+        self.assertEqual((merged.min, merged.max), (whole.min, whole.max))
+
+    def test_serialization_roundtrip(self):
+        """to_dict/from_dict permite guardar el histograma y combinarlo después."""
+        histogram = LatencyHistogram()
+        histogram.record_many([0.01, 0.2, 3.5])
+        restored = LatencyHistogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+
+        self.assertEqual(restored.counts, histogram.counts)
+        self.assertEqual(restored.percentile(0.99), histogram.percentile(0.99))
+
+    def test_merge_rejects_different_precision(self):
+        with self.assertRaises(ValueError):
+            LatencyHistogram(7).merge(LatencyHistogram(5))
+
+    def test_empty(self):
+        self.assertEqual(LatencyHistogram().percentile(0.99), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from load_profile import LoadProfile, build_stages
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def ok(duration):
+    return {"duration": duration, "classification": "Valido considerado valido"}
+
+
+class TestBuildStages(unittest.TestCase):
+
+    def test_ramp(self):
+        stages = build_stages({"start_rps": 5, "step_rps": 5, "step_duration": 30, "max_rps": 20})
+        self.assertEqual([s["rps"] for s in stages], [5, 10, 15, 20])
+        self.assertTrue(all(s["duration"] == 30 for s in stages))
+
+    def test_explicit_stages(self):
+        stages = build_stages({"stages": [{"rps": 2, "duration": 10}, {"rps": 8, "duration": 5}]})
+        self.assertEqual(stages, [{"rps": 2, "duration": 10}, {"rps": 8, "duration": 5}])
+
+    def test_invalid(self):
+        for profile in ({"stages": []},
+                        {"stages": [{"rps": 0, "duration": 5}]},
+                        {"start_rps": 5, "step_rps": 5, "step_duration": 30},
+                        {"start_rps": 10, "step_rps": 5, "step_duration": 30, "max_rps": 5}):
+            with self.assertRaises(ValueError):
+                build_stages(profile)
+        with self.assertRaises(ValueError):
+            LoadProfile.from_config({"stages": [{"rps": 1, "duration": 1}], "max_p99": -1})
+
+
+class TestLoadProfile(unittest.TestCase):
+
+    def _profile(self, clock, **thresholds):
+        stages = [{"rps": 10, "duration": 10}, {"rps": 20, "duration": 10}, {"rps": 30, "duration": 10}]
+        return LoadProfile(stages, clock=clock, **thresholds)
+
+    def test_stages_follow_clock(self):
+        clock = FakeClock()
+        profile = self._profile(clock)
+        self.assertEqual(profile.current_stage(), 0)
+        clock.now += 15
+        self.assertEqual(profile.current_stage(), 1)
+        clock.now += 20
+        self.assertIsNone(profile.current_stage())
+        self.assertFalse(profile.stopped)
+
+    def test_stops_when_p99_threshold_is_breached(self):
+        """Se evalúa la etapa cuando terminó y llegaron todas sus respuestas."""
+        clock = FakeClock()
+        profile = self._profile(clock, max_p99=1.0)
+        profile.current_stage()
+        for _ in range(10):
+            profile.record_sent(0)
+            profile.record_result(0, ok(0.2))
+
+        clock.now += 10
+        self.assertEqual(profile.current_stage(), 1)
+        for _ in range(10):
+            profile.record_sent(1)
+        for _ in range(9):
+            profile.record_result(1, ok(0.3))
+
+        # La etapa 2 terminó pero falta una respuesta (lenta): todavía no se evalúa
+        clock.now += 10
+        self.assertEqual(profile.current_stage(), 2)
+        self.assertFalse(profile.stopped)
+        profile.record_result(1, ok(5.0))
+        self.assertTrue(profile.stopped)
+        self.assertIsNone(profile.current_stage())
+
+        summary = profile.summary()
+        self.assertEqual(summary["max_sustainable_rps"], 10)
+        self.assertEqual(summary["max_sustainable_throughput"], 1.0)
+        self.assertIn("Etapa 2", summary["stop_reason"])
+        self.assertEqual(summary["stages"][1]["requests"], 10)
+        self.assertTrue(summary["stages"][1]["breaches"])
+        self.assertFalse(summary["stages"][2]["evaluated"])
+
+    def test_error_rate_threshold(self):
+        clock = FakeClock()
+        profile = self._profile(clock, max_error_rate_percent=5)
+        profile.current_stage()
+        for i in range(10):
+            profile.record_sent(0)
+            profile.record_result(0, {"duration": 0.1, "classification": "Error" if i == 0 else "Valido considerado valido"})
+        clock.now += 10
+        profile.finish()
+        self.assertTrue(profile.stopped)
+        self.assertEqual(profile.summary()["stages"][0]["error_rate_percent"], 10.0)
+        self.assertIsNone(profile.summary()["max_sustainable_rps"])
+
+
+    def test_partial_stage_is_not_sustainable(self):
+        """Si los emails se acaban a mitad de una etapa, esa etapa no se evalúa."""
+        clock = FakeClock()
+        profile = LoadProfile([{"rps": 5, "duration": 30}, {"rps": 50, "duration": 30}], clock=clock, max_p99=1.0)
+        profile.current_stage()
+        for _ in range(150):
+            profile.record_sent(0)
+            profile.record_result(0, ok(0.2))
+        clock.now += 30
+        self.assertEqual(profile.current_stage(), 1)
+        profile.record_sent(1)
+        clock.now += 2
+        profile.end_sending()
+        profile.record_result(1, ok(0.2))
+        clock.now += 5
+        profile.finish()
+
+        summary = profile.summary()
+        self.assertEqual(summary["max_sustainable_rps"], 5)
+        self.assertEqual(summary["max_sustainable_throughput"], 5.0)
+        self.assertTrue(summary["stages"][0]["completed"])
+        self.assertFalse(summary["stages"][1]["completed"])
+        self.assertFalse(summary["stages"][1]["evaluated"])
+        self.assertEqual(summary["stages"][1]["elapsed"], 2)
+        self.assertEqual(summary["stages"][1]["throughput_rps"], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
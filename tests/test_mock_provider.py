@@ -0,0 +1,88 @@
+import unittest
+import random
+import asyncio
+from api_client import run_api_tests
+from mock_provider import LatencyModel, MockProvider, is_valid_email
+from webhook_server import WebhookServer
+
+EMAILS = [("user1@example.com", True), ("invalid1@example.com", False),
+          ("user2@example.com", True), ("user3@example.invalid", False)] * 5
+
+
+class TestLatencyModel(unittest.TestCase):
+    """Tests para las distribuciones de latencia simuladas."""
+
+    def test_distributions(self):
+        rng = random.Random(1)
+        self.assertEqual(LatencyModel("fixed", 0.2, rng=rng).sample(), 0.2)
+
+        lognormal = LatencyModel("lognormal", 0.05, sigma=0.5, rng=rng)
+        samples = sorted(lognormal.sample() for _ in range(2001))
+        self.assertAlmostEqual(samples[1000], 0.05, delta=0.005)
+
+        bimodal = LatencyModel("bimodal", 0.01, slow_latency=1.0, slow_fraction=0.2, rng=rng)
+        slow = sum(1 for _ in range(1000) if bimodal.sample() == 1.0)
+        self.assertTrue(150 < slow < 250)
+
+        with self.assertRaises(ValueError):
+            LatencyModel("uniform")
+
+    def test_ground_truth(self):
+        self.assertTrue(is_valid_email("user@example.com"))
+        self.assertFalse(is_valid_email("invalid.x@example.com"))
+        self.assertFalse(is_valid_email("user@example.invalid"))
+
+
+class TestMockProvider(unittest.TestCase):
+    """Tests de punta a punta de run_api_tests contra el proveedor simulado."""
+
+    def test_sync_run_with_injected_throttling(self):
+        async def scenario():
+            async with MockProvider(throttle_rate=0.2, retry_after=0, seed=7) as provider:
+                api_config = provider.api_config(retry={"max_attempts": 10, "backoff_base": 0.001})
+                results = await run_api_tests(EMAILS, api_config, 1000)
+                return results, provider.stats()
+
+        results, stats = asyncio.run(scenario())
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(r["classification"] in ("Valido considerado valido", "Invalido considerado invalido")
+                            for r in results))
+        self.assertGreater(stats["throttled"], 0)
+        self.assertEqual(stats["requests"], 20 + stats["throttled"])
+
+    def test_response_path_and_errors(self):
+        async def scenario():
+            async with MockProvider(error_rate=1.0, response_path="result.info") as provider:
+                errors = await run_api_tests(EMAILS[:2], provider.api_config(), 1000)
+                provider.error_rate = 0.0
+                ok = await run_api_tests(EMAILS[:2], provider.api_config(), 1000)
+                return errors, ok
+
+        errors, ok = asyncio.run(scenario())
+        self.assertTrue(all(r["classification"] == "Error" and r["status_code"] == 500 for r in errors))
+        self.assertEqual(ok[0]["raw_response"]["result"]["info"]["reason"], "accepted_email")
+        self.assertEqual(ok[1]["classification"], "Invalido considerado invalido")
+
+    def test_batched_webhook_delivery(self):
+        async def scenario():
+            server = WebhookServer(host="127.0.0.1", port=0)
+            await server.start()
+            try:
+                async with MockProvider(webhook=True, batch_size=8, latency=LatencyModel("fixed", 0.01)) as provider:
+                    api_config = provider.api_config()
+                    results = await run_api_tests(EMAILS, api_config, 1000, webhook_server=server)
+                    return results, provider.stats(), server.stats()
+            finally:
+                await server.stop()
+
+        results, provider_stats, server_stats = asyncio.run(scenario())
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(r["classification"] in ("Valido considerado valido", "Invalido considerado invalido")
+                            for r in results))
+        self.assertEqual(provider_stats["callbacks"], 20)
+        self.assertLess(provider_stats["callback_posts"], 20)
+        self.assertEqual(server_stats["resolved"], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
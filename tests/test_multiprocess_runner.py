@@ -0,0 +1,134 @@
+import unittest
+import asyncio
+from aiohttp import web
+from multiprocess_runner import _shard, _shard_totals, merge_run_metrics, run_sharded_api_tests, shard_api_config
+from latency_histogram import LatencyHistogram
+
+
+class TestShardApiConfig(unittest.TestCase):
+
+    def test_divides_load_between_workers(self):
+        api_config = {
+            "name": "API1",
+            "max_in_flight": 10,
+            "load_profile": {"start_rps": 10, "step_rps": 10, "step_duration": 5, "max_rps": 20, "max_p99": 1},
+            "adaptive_rate": {"min_rps": 4},
+        }
+        shard = shard_api_config(api_config, 4, load={"load_model": "open", "virtual_users": 10})
+        self.assertEqual(shard["max_in_flight"], 3)
+        self.assertEqual(shard["load_model"], "open")
+        self.assertEqual(shard["virtual_users"], 3)
+        self.assertEqual([s["rps"] for s in shard["load_profile"]["stages"]], [2.5, 5.0])
+        self.assertEqual(shard["load_profile"]["max_p99"], 1)
+        self.assertEqual(shard["adaptive_rate"]["min_rps"], 1.0)
+        self.assertEqual(api_config["max_in_flight"], 10)
+
+
+class TestMergeRunMetrics(unittest.TestCase):
+
+    def test_merges_histograms_and_limiter_stats(self):
+        metrics_list = []
+        for duration in (0.1, 0.3):
+            histogram = LatencyHistogram()
+            histogram.record(duration)
+            metrics_list.append({
+                "rate_limiter": {"target_rps": 50, "burst": 1, "requests_sent": 10, "achieved_rps": 49.0,
+                                 "average_scheduling_lag": 0.001 * len(metrics_list), "max_scheduling_lag": 0.01},
+                "max_in_flight": 5,
+                "latency_histogram": histogram,
+                "load_model": {"model": "paced"},
+            })
+        merged = merge_run_metrics(metrics_list)
+        self.assertEqual(merged["workers"], 2)
+        self.assertEqual(merged["latency_histogram"].count, 2)
+        self.assertEqual(merged["rate_limiter"]["target_rps"], 100)
+        self.assertEqual(merged["rate_limiter"]["achieved_rps"], 98.0)
+        self.assertAlmostEqual(merged["rate_limiter"]["average_scheduling_lag"], 0.0005)
+        self.assertEqual(merged["max_in_flight"], 10)
+        self.assertEqual(merged["load_model"], {"model": "paced", "workers": 2})
+
+
+class RecordingSink:
+    """Sink de prueba: guarda (api, email, con raw_response) de cada resultado escrito."""
+    drop_raw_response = True
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, result, api="?"):
+        self.written.append((api, result["email"], "raw_response" in result))
+
+
+class TestShards(unittest.TestCase):
+
+    def test_shards_stride_over_the_corpus(self):
+        emails = [(f"u{i}@x.com", True) for i in range(7)]
+        shards = [list(_shard(emails, index, 3)) for index in range(3)]
+        self.assertEqual([email for email, _ in shards[0]], ["u0@x.com", "u3@x.com", "u6@x.com"])
+        self.assertEqual(sorted(sum(shards, [])), sorted(emails))
+        self.assertEqual(_shard_totals(emails, 3, None), [len(shard) for shard in shards])
+        self.assertEqual(_shard_totals(emails, 3, {"u3@x.com"}), [2, 2, 2])
+
+
+class TestRunShardedApiTests(unittest.TestCase):
+
+    def test_workers_against_local_server(self):
+        """Dos procesos reparten los emails; el padre combina resultados, histograma y progreso."""
+        seen = []
+
+        async def handler(request):
+            seen.append(request.query["email"])
+            score = 90 if request.query["email"].startswith("ok") else 10
+            return web.json_response({"data": {"score": score}})
+
+        async def scenario():
+            app = web.Application()
+            app.router.add_get("/validate", handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = runner.addresses[0][1]
+            try:
+                api_config = {
+                    "name": "Local",
+                    "api_key": "k",
+                    "endpoint": f"http://127.0.0.1:{port}/validate",
+                    "validation_rules": [{"field": "score", "operator": ">=", "value": 80}],
+                }
+                emails = [(f"ok{i}@example.com", True) for i in range(6)] + \
+                         [(f"bad{i}@example.com", False) for i in range(5)]
+                run_metrics = {}
+                progress = []
+                results = await run_sharded_api_tests(
+                    emails, api_config, 1000, 2, run_metrics=run_metrics,
+                    on_progress=lambda done, total: progress.append((done, total)),
+                    skip_emails={"bad4@example.com"},
+                    sink=sink,
+                )
+                return results, run_metrics, progress
+            finally:
+                await runner.cleanup()
+
+        sink = RecordingSink()
+        results, run_metrics, progress = asyncio.run(scenario())
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(sorted(seen), sorted(r["email"] for r in results))
+        self.assertNotIn("bad4@example.com", seen)
+        counts = results.classification_counts()
+        self.assertEqual(counts["Valido considerado valido"], 6)
+        self.assertEqual(counts["Invalido considerado invalido"], 4)
+        self.assertEqual(run_metrics["workers"], 2)
+        self.assertEqual(run_metrics["latency_histogram"].count, 10)
+        self.assertEqual(run_metrics["rate_limiter"]["requests_sent"], 10)
+        self.assertGreater(run_metrics["wall_clock_time"], 0)
+        self.assertEqual(progress[-1], (10, 10))
+        # El padre escribe el sink con los resultados completos y los guarda sin raw_response
+        self.assertEqual(sorted(email for _, email, _ in sink.written), sorted(results.emails))
+        self.assertTrue(all(api == "Local" and has_raw for api, _, has_raw in sink.written))
+        self.assertTrue(all(results.raw_offsets[i] < 0 for i in range(len(results))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import unittest
+import asyncio
+from unittest.mock import patch
+from rate_limiter import AimdRateController, ArrivalSchedule, TokenBucketRateLimiter
+
+
+class FakeClock:
+    """Reloj controlable: sleep() avanza el tiempo con un exceso fijo."""
+
+    def __init__(self, overshoot: float = 0.0):
+        self.now = 100.0
+        self.overshoot = overshoot
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.now += seconds + self.overshoot
+
+
+class TestTokenBucketRateLimiter(unittest.TestCase):
+
+    def _run(self, limiter, clock, n):
+        async def go():
+            return [await limiter.acquire() for _ in range(n)]
+        with patch("rate_limiter.asyncio.sleep", clock.sleep):
+            return asyncio.run(go())
+
+    def test_exact_rate_without_overshoot(self):
+        clock = FakeClock()
+        limiter = TokenBucketRateLimiter(100, clock=clock)
+        lags = self._run(limiter, clock, 101)
+        stats = limiter.stats()
+        self.assertAlmostEqual(stats["achieved_rps"], 100.0)
+        self.assertEqual(max(lags), 0.0)
+
+    def test_overshoot_does_not_accumulate(self):
+        """El exceso de sleep no debe reducir la tasa lograda si hay burst."""
+        clock = FakeClock(overshoot=0.004)
+        limiter = TokenBucketRateLimiter(200, burst=4, clock=clock)
+        self._run(limiter, clock, 1001)
+        stats = limiter.stats()
+        self.assertAlmostEqual(stats["achieved_rps"], 200.0, delta=2.0)
+        self.assertGreater(stats["max_scheduling_lag"], 0.0)
+
+    def test_without_burst_overshoot_is_reported(self):
+        clock = FakeClock(overshoot=0.004)
+        limiter = TokenBucketRateLimiter(200, burst=1, clock=clock)
+        self._run(limiter, clock, 101)
+        stats = limiter.stats()
+        self.assertLess(stats["achieved_rps"], 200.0)
+        self.assertGreater(stats["average_scheduling_lag"], 0.0)
+
+    def test_set_rate(self):
+        clock = FakeClock()
+        limiter = TokenBucketRateLimiter(10, clock=clock)
+        limiter.set_rate(50)
+        self._run(limiter, clock, 51)
+        self.assertAlmostEqual(limiter.stats()["achieved_rps"], 50.0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            TokenBucketRateLimiter(0)
+        with self.assertRaises(ValueError):
+            TokenBucketRateLimiter(10, burst=0)
+
+
+
+class TestArrivalSchedule(unittest.TestCase):
+
+    def test_late_sends_do_not_shift_schedule(self):
+        """Un atraso del cliente no corre las llegadas siguientes (open loop)."""
+        clock = FakeClock()
+        schedule = ArrivalSchedule(10, clock=clock)
+
+        async def go():
+            intended = [await schedule.next_arrival() for _ in range(3)]
+            clock.now += 1.0  # el cliente se trabó un segundo
+            intended.append(await schedule.next_arrival())
+            return intended
+
+        with patch("rate_limiter.asyncio.sleep", clock.sleep):
+            intended = asyncio.run(go())
+
+        self.assertEqual([round(t - 100.0, 6) for t in intended], [0.0, 0.1, 0.2, 0.3])
+        self.assertAlmostEqual(schedule.record_send(intended[3]), 0.9)
+        self.assertAlmostEqual(schedule.elapsed_since(intended[0]), 1.2)
+
+    def test_poisson_mean_interval(self):
+        clock = FakeClock()
+        schedule = ArrivalSchedule(50, arrival="poisson", seed=7, clock=clock)
+
+        async def go():
+            return [await schedule.next_arrival() for _ in range(5001)]
+
+        with patch("rate_limiter.asyncio.sleep", clock.sleep):
+            intended = asyncio.run(go())
+
+        intervals = [b - a for a, b in zip(intended, intended[1:])]
+        self.assertAlmostEqual(sum(intervals) / len(intervals), 1 / 50, delta=0.001)
+        self.assertGreater(max(intervals), 3 / 50)
+
+    def test_invalid_arrival(self):
+        with self.assertRaises(ValueError):
+            ArrivalSchedule(10, arrival="burst")
+
+
+class TestAimdRateController(unittest.TestCase):
+
+    def test_multiplicative_decrease_with_cooldown(self):
+        clock = FakeClock()
+        limiter = TokenBucketRateLimiter(100, clock=clock)
+        controller = AimdRateController(limiter, min_rate=10, cooldown=1.0, clock=clock)
+
+        controller.on_throttle()
+        controller.on_throttle()  # dentro del cooldown: no vuelve a bajar
+        self.assertEqual(limiter.rate, 50)
+
+        clock.now += 1.5
+        controller.on_throttle()
+        self.assertEqual(limiter.rate, 25)
+
+        for _ in range(5):
+            clock.now += 1.5
+            controller.on_throttle()
+        self.assertEqual(limiter.rate, 10)  # nunca por debajo de min_rate
+
+        stats = controller.stats()
+        self.assertEqual(stats["throttle_events"], 8)
+        self.assertEqual(stats["rate_decreases"], 4)  # 50, 25, 12.5, 10
+        self.assertEqual(stats["lowest_rps"], 10)
+
+    def test_additive_increase_up_to_max(self):
+        limiter = TokenBucketRateLimiter(20)
+        controller = AimdRateController(limiter, increase_step=2.0)
+        limiter.set_rate(10)
+
+        for _ in range(10):
+            controller.on_success()
+        # ~increase_step / rate por respuesta: 10 respuestas a 10 RPS ≈ +2 RPS
+        self.assertAlmostEqual(limiter.rate, 12, delta=0.2)
+
+        for _ in range(1000):
+            controller.on_success()
+        self.assertEqual(limiter.rate, 20)
+
+    def test_set_max_rate(self):
+        """Con un perfil de carga, el techo es el rate de la etapa en curso."""
+        limiter = TokenBucketRateLimiter(10)
+        controller = AimdRateController(limiter, increase_step=5.0)
+        for _ in range(100):
+            controller.on_success()
+        self.assertEqual(limiter.rate, 10)
+
+        controller.set_max_rate(40)
+        for _ in range(1000):
+            controller.on_success()
+        self.assertEqual(limiter.rate, 40)
+
+        controller.set_max_rate(20)
+        self.assertEqual(limiter.rate, 20)
+        self.assertEqual(controller.stats()["max_rps"], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
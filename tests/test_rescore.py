@@ -0,0 +1,91 @@
+
+import unittest
+import os
+import json
+from rescore import iter_detail_rows, rescore_rows, rescore_file
+
+
+class TestRescore(unittest.TestCase):
+
+    def setUp(self):
+        self.details_file = "test_rescore_details.jsonl"
+        self.results_file = "test_rescore_results.json"
+        self.api_configs = [{
+            "name": "API1",
+            "endpoint": "https://api.example.com/verify",
+            "response_path": "data",
+            "validation_rules": [{"field": "status", "operator": "==", "value": "valid"}],
+        }]
+        rows = [
+            # "risky" antes se consideraba válido; con la regla actual, no
+            {"api": "API1", "email": "a@x.com", "classification": "Valido considerado valido",
+             "is_valid_source": True, "raw_response": {"data": {"status": "valid"}}},
+            {"api": "API1", "email": "b@x.com", "classification": "Invalido considerado valido",
+             "is_valid_source": False, "raw_response": {"data": {"status": "risky"}}},
+            {"api": "API1", "email": "c@x.com", "classification": "Error", "is_valid_source": True},
+            {"api": "Otra", "email": "d@x.com", "classification": "Valido considerado valido",
+             "is_valid_source": True, "raw_response": {"data": {"status": "valid"}}},
+        ]
+        with open(self.details_file, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+    def tearDown(self):
+        for f in [self.details_file, self.results_file]:
+            if os.path.exists(f):
+                os.remove(f)
+
+    def test_rescore_jsonl(self):
+        """Re-clasifica con las reglas actuales y recalcula la precisión."""
+        api_results = rescore_rows(iter_detail_rows(self.details_file), self.api_configs)
+
+        self.assertEqual(list(api_results), ["API1"])  # "Otra" no está en la configuración
+        stats = api_results["API1"]
+        self.assertEqual(stats["summary"]["total_requests"], 3)
+        self.assertEqual(stats["summary"]["valid_source_emails"], 2)
+        self.assertEqual(stats["summary"]["invalid_source_emails"], 1)
+        self.assertEqual(stats["summary"]["changed_classifications"], 1)
+        self.assertEqual(stats["accuracy"]["classification_counts"], {
+            "Valido considerado valido": 1,
+            "Invalido considerado invalido": 1,
+            "Error": 1,
+        })
+        self.assertEqual(stats["accuracy"]["false_positive_rate_percent"], 0)
+
+    def test_rescore_threshold_sweep(self):
+        """Con sweep_field se recalcula el barrido de umbrales sobre las respuestas guardadas."""
+        rows = [
+            ("API1", {"classification": "Valido considerado valido", "is_valid_source": True,
+                      "raw_response": {"data": {"status": "valid", "score": 90}}}),
+            ("API1", {"classification": "Invalido considerado valido", "is_valid_source": False,
+                      "raw_response": {"data": {"status": "valid", "score": 70}}}),
+        ]
+        api_configs = [dict(self.api_configs[0], sweep_field="score")]
+
+        sweep = rescore_rows(iter(rows), api_configs)["API1"]["threshold_sweep"]
+        self.assertEqual(sweep["scored_count"], 2)
+        self.assertEqual(sweep["best_threshold"]["threshold"], 90)
+
+    def test_rescore_results_json_follows_details_file(self):
+        """Un results.json escrito con --details-file se re-evalúa desde el JSONL."""
+        with open(self.results_file, "w", encoding="utf-8") as f:
+            json.dump({"individual_api_results": {"API1": {"details_file": self.details_file}}}, f)
+
+        output = rescore_file(self.results_file, self.api_configs)
+        self.assertEqual(output["global_summary"]["total_apis_tested"], 1)
+        self.assertEqual(output["individual_api_results"]["API1"]["summary"]["total_requests"], 3)
+
+    def test_rescore_results_json_with_details(self):
+        """Sin is_valid_source, el origen se deduce de la clasificación original."""
+        details = [{"email": "b@x.com", "classification": "Invalido considerado valido",
+                    "raw_response": {"data": {"status": "risky"}}}]
+        with open(self.results_file, "w", encoding="utf-8") as f:
+            json.dump({"individual_api_results": {"API1": {"details": details}}}, f)
+
+        stats = rescore_file(self.results_file, self.api_configs)["individual_api_results"]["API1"]
+        self.assertEqual(stats["summary"]["invalid_source_emails"], 1)
+        self.assertEqual(stats["accuracy"]["classification_counts"], {"Invalido considerado invalido": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import unittest
+import tempfile
+from response_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.api_config = {"endpoint": "http://fake.api", "method": "GET", "param_name": "email"}
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_put_and_get(self):
+        cache = ResponseCache(self.path)
+        key = cache.make_key(self.api_config, "a@example.com")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {"data": {"score": 90}})
+        self.assertEqual(cache.get(key), {"data": {"score": 90}})
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        cache.close()
+
+    def test_persists_between_instances(self):
+        cache = ResponseCache(self.path)
+        key = cache.make_key(self.api_config, "a@example.com")
+        cache.put(key, {"ok": True})
+        cache.close()
+
+        cache = ResponseCache(self.path)
+        self.assertEqual(cache.get(key), {"ok": True})
+        cache.close()
+
+    def test_commits_are_batched(self):
+        cache = ResponseCache(self.path, commit_every=3, commit_interval=3600)
+        reader = ResponseCache(self.path)
+        keys = [cache.make_key(self.api_config, f"{i}@example.com") for i in range(3)]
+        for key in keys[:2]:
+            cache.put(key, {"ok": True})
+        self.assertIsNone(reader.get(keys[0]))
+        self.assertEqual(cache.get(keys[0]), {"ok": True})
+
+        cache.put(keys[2], {"ok": True})
+        self.assertEqual(reader.get(keys[0]), {"ok": True})
+        reader.close()
+        cache.close()
+
+    def test_key_depends_on_request_fingerprint(self):
+        key = ResponseCache.make_key(self.api_config, "a@example.com")
+        self.assertNotEqual(key, ResponseCache.make_key(self.api_config, "b@example.com"))
+        self.assertNotEqual(key, ResponseCache.make_key({**self.api_config, "method": "POST"}, "a@example.com"))
+        self.assertNotEqual(key, ResponseCache.make_key({**self.api_config, "endpoint": "http://otra.api"}, "a@example.com"))
+
+    def test_expired_entries_are_misses(self):
+        cache = ResponseCache(self.path, ttl=-1)
+        key = cache.make_key(self.api_config, "a@example.com")
+        cache.put(key, {"ok": True})
+        self.assertIsNone(cache.get(key))
+        cache.close()
+
+    def test_size_based_eviction(self):
+        cache = ResponseCache(self.path, max_entries=3, evict_every=1)
+        keys = [cache.make_key(self.api_config, f"user{i}@example.com") for i in range(5)]
+        for key in keys:
+            cache.put(key, {"ok": True})
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[-1]))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch
+from result_store import ResultStore
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.results = [
+            {
+                "email": "a@example.com", "duration": 0.12, "classification": "Valido considerado valido",
+                "response_reason": "accepted_email", "raw_response": {"data": {"score": 90}},
+                "timings": {"queue": None, "dns": 0.01, "connect": 0.02, "send": 0.001, "ttfb": 0.05,
+                            "body": 0.002, "total": 0.12, "connection_reused": False},
+                "scheduling_lag": 0.0005, "is_valid_source": True, "score": 90.0,
+            },
+            {"email": "b@example.com", "duration": 0.0, "classification": "Invalido considerado invalido",
+             "response_reason": "rejected_email", "cache_hit": True, "is_valid_source": False},
+            {"email": "c@example.com", "duration": 30.0, "classification": "Error",
+             "error_message": "Timeout después de 30s", "is_valid_source": True, "webhook_id": "x1"},
+        ]
+        self.store = ResultStore(self.results)
+
+    def test_roundtrip_rows(self):
+        """Cada fila se reconstruye igual al dict original."""
+        self.assertEqual(len(self.store), 3)
+        for original, row in zip(self.results, self.store):
+            self.assertEqual(row, original)
+        self.assertEqual(self.store[-1]["webhook_id"], "x1")
+        self.assertEqual(self.store[1:], self.results[1:])
+        with self.assertRaises(IndexError):
+            self.store[3]
+
+    def test_column_aggregates(self):
+        """Los agregados salen de las columnas, sin recorrer dicts."""
+        self.assertEqual(self.store.classification_counts(), {
+            "Valido considerado valido": 1,
+            "Invalido considerado invalido": 1,
+            "Error": 1,
+        })
+        self.assertEqual(self.store.latencies(), [0.12, 30.0])  # sin el hit del caché
+        self.assertEqual(self.store.cache_hits(), 1)
+        self.assertEqual(self.store.values(self.store.phase_columns["dns"]), [0.01])
+        self.assertEqual(self.store.scored_pairs(), [(90.0, True)])
+
+    def test_aggregates_without_numpy(self):
+        """Sin numpy, los agregados recorren los arrays y dan lo mismo."""
+        expected = (
+            self.store.classification_counts(), self.store.latencies(), list(self.store.sorted_latencies()),
+            self.store.cache_hits(), self.store.summarize(self.store.durations, exclude_cache_hits=True),
+            self.store.summarize(self.store.phase_columns["dns"]),
+        )
+        with patch("result_store.np", None):
+            self.assertEqual((
+                self.store.classification_counts(), self.store.latencies(), list(self.store.sorted_latencies()),
+                self.store.cache_hits(), self.store.summarize(self.store.durations, exclude_cache_hits=True),
+                self.store.summarize(self.store.phase_columns["dns"]),
+            ), expected)
+        self.assertEqual(expected[4], {"count": 2, "sum": 30.12, "min": 0.12, "max": 30.0})
+
+    def test_labels_are_interned(self):
+        """Las clasificaciones y reasons repetidos se guardan una sola vez como código."""
+        store = ResultStore({"email": f"u{i}", "classification": "Error", "error_message": "boom"}
+                            for i in range(1000))
+        self.assertEqual(set(store.error_codes), {store.error_codes[0]})
+        self.assertEqual(store.raw_offsets[0], -1)
+
+    def test_unhashable_reason_kept(self):
+        """Un reason no hasheable (ej. un dict) se conserva tal cual."""
+        store = ResultStore([{"email": "a", "classification": "Error", "response_reason": {"code": 1}}])
+        self.assertEqual(store[0]["response_reason"], {"code": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from rule_engine import compile_rules, evaluate_rule, CompiledRule
+
+
+class TestCompileRules(unittest.TestCase):
+    """Tests para el motor de reglas compilado."""
+
+    RULES = [
+        {"field": "score", "operator": ">=", "value": "80"},
+        {"field": "result", "operator": "in", "value": ["deliverable", "risky"]},
+    ]
+
+    def test_matches_evaluate_rule(self):
+        """El evaluador compilado debe dar el mismo resultado que evaluate_rule."""
+        responses = [
+            {"data": {"score": 90, "result": "deliverable"}},
+            {"data": {"score": "85", "result": "risky"}},
+            {"data": {"score": 79, "result": "deliverable"}},
+            {"data": {"score": "n/a", "result": "deliverable"}},
+            {"data": {"score": 95, "result": "undeliverable"}},
+            {"data": {"score": 95}},
+            {"data": {"score": 95, "result": ["deliverable"]}},
+            {"other": {}},
+            {"data": "no es un dict"},
+        ]
+        evaluator = compile_rules(self.RULES, "data")
+        for response in responses:
+            expected = all(evaluate_rule(response, rule, "data") for rule in self.RULES)
+            self.assertEqual(evaluator.evaluate(response), expected, response)
+
+    def test_constants_are_precoerced(self):
+        rule = CompiledRule({"field": "score", "operator": ">=", "value": "80"}, "data")
+        self.assertEqual(rule.value, 80)
+        rule = CompiledRule({"field": "result", "operator": "in", "value": ["a", "b"]}, "data")
+        self.assertIsInstance(rule.value, frozenset)
+        self.assertEqual(rule.keys, ("data", "result"))
+
+    def test_invalid_numeric_constant(self):
+        evaluator = compile_rules([{"field": "score", "operator": ">", "value": "alto"}], "data")
+        self.assertFalse(evaluator.evaluate({"data": {"score": 90}}))
+
+    def test_in_with_unhashable_values(self):
+        evaluator = compile_rules([{"field": "tags", "operator": "in", "value": [["a"], ["b"]]}], "data")
+        self.assertTrue(evaluator.evaluate({"data": {"tags": ["a"]}}))
+        self.assertFalse(evaluator.evaluate({"data": {"tags": ["c"]}}))
+
+    def test_invalid_operator_raises(self):
+        with self.assertRaises(ValueError):
+            compile_rules([{"field": "score", "operator": "~", "value": 1}], "data")
+
+    def test_extract_reason(self):
+        evaluator = compile_rules([], "result.info")
+        self.assertEqual(evaluator.extract_reason({"result": {"info": {"reason": "ok"}}}), "ok")
+        self.assertIsNone(evaluator.extract_reason({"result": {}}))
+        self.assertEqual(compile_rules([], "").extract_reason({"reason": "top"}), "top")
+
+    def test_project_keeps_only_rule_fields(self):
+        """La proyección conserva lo que leen las reglas y el reason, y evalúa igual."""
+        evaluator = compile_rules(self.RULES, "data")
+        response = {
+            "data": {"score": 90, "result": "risky", "reason": "ok", "mx": ["a", "b"]},
+            "meta": {"id": 1},
+        }
+        projected = evaluator.project(response, extra_paths=[("meta", "id")])
+        self.assertEqual(projected, {
+            "data": {"score": 90, "result": "risky", "reason": "ok"},
+            "meta": {"id": 1},
+        })
+        self.assertEqual(evaluator.evaluate(projected), evaluator.evaluate(response))
+        self.assertEqual(evaluator.project({"data": {"score": 10}}), {"data": {"score": 10}})
+        self.assertEqual(evaluator.project(["no", "dict"]), ["no", "dict"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 
+import random
 import unittest
-from stats_calculator import calculate_statistics
+from stats_calculator import (
+    bootstrap_percentile_intervals, calculate_statistics, calculate_threshold_sweep, wilson_interval,
+)
 
 
 class TestStatistics(unittest.TestCase):
@@ -60,6 +63,137 @@ class TestStatistics(unittest.TestCase):
         self.assertEqual(summary['requests_per_second_limit'], self.rps)
         self.assertEqual(summary['api_endpoint'], self.endpoint)
 
+    def test_send_rate_metrics(self):
+        """Prueba que se reportan la tasa lograda y el lag de planificación."""
+        results = [
+            {'duration': 0.1, 'classification': 'Valido considerado valido', 'scheduling_lag': 0.0},
+            {'duration': 0.2, 'classification': 'Valido considerado valido', 'scheduling_lag': 0.02},
+        ]
+        run_metrics = {"rate_limiter": {"achieved_rps": 14.5}}
+        stats = calculate_statistics(results, 2, 0, self.rps, self.endpoint, run_metrics=run_metrics)
+
+        summary = stats['summary']
+        self.assertEqual(summary['achieved_requests_per_second'], 14.5)
+        self.assertAlmostEqual(summary['average_scheduling_lag'], 0.01)
+        self.assertAlmostEqual(summary['max_scheduling_lag'], 0.02)
+
+    def test_phase_breakdown(self):
+        """Prueba la agregación de las fases de latencia."""
+        results = [
+            {'duration': 0.3, 'classification': 'Valido considerado valido',
+             'timings': {'dns': 0.01, 'connect': 0.05, 'ttfb': 0.2, 'body': 0.04, 'connection_reused': False}},
+            {'duration': 0.2, 'classification': 'Valido considerado valido',
+             'timings': {'dns': None, 'connect': None, 'ttfb': 0.18, 'body': 0.02, 'connection_reused': True}},
+            {'duration': 0.4, 'classification': 'Error'},
+        ]
+        stats = calculate_statistics(results, 2, 0, self.rps, self.endpoint)
+
+        phases = stats['performance']['phases']
+        self.assertEqual(phases['connect']['count'], 1)
+        self.assertAlmostEqual(phases['ttfb']['average'], 0.19)
+        self.assertAlmostEqual(phases['body']['max'], 0.04)
+        self.assertAlmostEqual(stats['performance']['connection_reuse_rate_percent'], 50.0)
+
+    def test_cache_hits_excluded_from_latency(self):
+        """Los hits del caché se cuentan pero no entran en los tiempos."""
+        results = self.mock_results + [
+            {'duration': 0.0, 'classification': 'Valido considerado valido', 'cache_hit': True},
+        ]
+        stats = calculate_statistics(results, 4, self.total_invalid, self.rps, self.endpoint)
+        self.assertEqual(stats['summary']['cache_hits'], 1)
+        self.assertEqual(stats['performance']['min_response_time'], 0.1)
+        self.assertAlmostEqual(stats['performance']['average_response_time'], 1.4 / 6)
+
+    def test_details_file_pointer(self):
+        """Con details_file, la salida no incluye el detalle sino un puntero."""
+        stats = calculate_statistics(self.mock_results, self.total_valid, self.total_invalid, self.rps,
+                                     self.endpoint, details_file="results_details.jsonl")
+        self.assertEqual(stats['details_file'], "results_details.jsonl")
+        self.assertNotIn('details', stats)
+
+    def test_threshold_sweep(self):
+        """Cada umbral "score >= t" acumula TP/FP en una sola pasada ordenada."""
+        scored = [(90, True), (80, True), (80, False), (60, True), (40, False)]
+        sweep = calculate_threshold_sweep(scored, "score")
+
+        self.assertEqual([p['threshold'] for p in sweep['points']], [90, 80, 60, 40])
+        at_80 = sweep['points'][1]
+        self.assertEqual((at_80['true_positives'], at_80['false_positives']), (2, 1))
+        self.assertAlmostEqual(at_80['false_positive_rate_percent'], 50.0)
+        self.assertAlmostEqual(at_80['false_negative_rate_percent'], 100 / 3)
+        self.assertEqual(sweep['best_threshold']['threshold'], 60)
+        self.assertAlmostEqual(sweep['auc'], 0.75)
+
+    def test_threshold_sweep_downsampled(self):
+        """La curva se limita a max_points, conservando el último umbral."""
+        scored = [(i, i % 2 == 0) for i in range(1000)]
+        sweep = calculate_threshold_sweep(scored, max_points=50)
+        self.assertEqual(len(sweep['points']), 50)
+        self.assertEqual(sweep['points'][-1]['threshold'], 0)
+        self.assertEqual(sweep['scored_count'], 1000)
+
+    def test_statistics_include_sweep(self):
+        """Con sweep_field, la salida incluye threshold_sweep a partir de "score"."""
+        results = [
+            {'duration': 0.1, 'classification': 'Valido considerado valido', 'is_valid_source': True, 'score': 90},
+            {'duration': 0.1, 'classification': 'Invalido considerado invalido', 'is_valid_source': False, 'score': 30},
+            {'duration': 0.1, 'classification': 'Error', 'is_valid_source': True},
+        ]
+        stats = calculate_statistics(results, 2, 1, self.rps, self.endpoint, sweep_field="score")
+        self.assertEqual(stats['threshold_sweep']['scored_count'], 2)
+        self.assertEqual(stats['threshold_sweep']['auc'], 1.0)
+
+    def test_percentiles_and_wall_clock_throughput(self):
+        """Los percentiles salen del histograma y el throughput del tiempo real de la ejecución."""
+        stats = calculate_statistics(self.mock_results, self.total_valid, self.total_invalid, self.rps,
+                                     self.endpoint, run_metrics={"wall_clock_time": 2.0})
+        performance = stats['performance']
+        self.assertAlmostEqual(performance['percentiles']['p50'], 0.2, delta=0.002)
+        self.assertAlmostEqual(performance['percentiles']['p99'], 0.4, delta=0.004)
+        self.assertEqual(performance['throughput_rps'], 3.0)
+        self.assertEqual(performance['latency_histogram']['count'], 6)
+
+    def test_corrected_percentiles_for_open_loop(self):
+        """Con corrected_latency (modelo open) se reportan también los percentiles corregidos."""
+        results = [{**r, "corrected_latency": r["duration"] + 1.0} for r in self.mock_results]
+        stats = calculate_statistics(results, self.total_valid, self.total_invalid, self.rps, self.endpoint,
+                                     run_metrics={"load_model": {"model": "open", "arrival": "constant"}})
+        performance = stats['performance']
+        self.assertAlmostEqual(performance['corrected_percentiles']['p50'], 1.2, delta=0.012)
+        self.assertAlmostEqual(performance['percentiles']['p50'], 0.2, delta=0.002)
+        self.assertEqual(stats['load_model']['model'], "open")
+
+        plain = calculate_statistics(self.mock_results, self.total_valid, self.total_invalid, self.rps, self.endpoint)
+        self.assertNotIn('corrected_percentiles', plain['performance'])
+
+    def test_confidence_intervals(self):
+        """Prueba los intervalos de Wilson de FP/FN y los bootstrap de los percentiles."""
+        stats = calculate_statistics(self.mock_results, self.total_valid, self.total_invalid, self.rps, self.endpoint)
+
+        low, high = stats['accuracy']['false_positive_rate_ci_percent']
+        self.assertLess(low, 50.0)
+        self.assertGreater(high, 50.0)
+        self.assertEqual(stats['accuracy']['confidence'], 0.95)
+        intervals = stats['performance']['percentile_intervals']
+        self.assertLessEqual(intervals['p50'][0], intervals['p50'][1])
+
+        # Wilson: no sale de [0, 1] con 0 éxitos y se angosta con más datos
+        self.assertEqual(wilson_interval(0, 100)[0], 0.0)
+        self.assertAlmostEqual(wilson_interval(0, 100)[1], 0.037, places=3)
+        self.assertLess(wilson_interval(50, 1000)[1] - wilson_interval(50, 1000)[0],
+                        wilson_interval(5, 100)[1] - wilson_interval(5, 100)[0])
+        self.assertIsNone(wilson_interval(0, 0))
+
+    def test_bootstrap_matches_resampling(self):
+        """El atajo con Beta da el mismo intervalo que remuestrear los valores."""
+        rng = random.Random(3)
+        values = [rng.random() for _ in range(300)]
+        fast = bootstrap_percentile_intervals(values, {"p90": 0.9}, resamples=2000)["p90"]
+        replicas = sorted(sorted(rng.choices(values, k=300))[269] for _ in range(2000))
+        self.assertAlmostEqual(fast[0], replicas[49], delta=0.02)
+        self.assertAlmostEqual(fast[1], replicas[1949], delta=0.02)
+        self.assertEqual(bootstrap_percentile_intervals([]), {})
+
     def test_no_results(self):
         """Prueba cómo se maneja una lista de resultados vacía."""
         stats = calculate_statistics([], 0, 0, 10, "http://empty.api")
@@ -0,0 +1,189 @@
+import unittest
+import asyncio
+import aiohttp
+from webhook_server import WebhookServer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestWebhookServer(unittest.TestCase):
+    """Tests para la tabla de callbacks pendientes del servidor de webhooks."""
+
+    def test_pending_entries_are_removed_when_closed(self):
+        async def scenario():
+            server = WebhookServer()
+            _, _, resolved = server.create_callback("a")
+            _, _, timed_out = server.create_callback("b")
+            self.assertEqual(server.pending_count, 2)
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(timed_out, timeout=0.01)
+            await asyncio.sleep(0)
+            self.assertEqual(server.pending_count, 1)
+
+            resolved.cancel()
+            await asyncio.sleep(0)
+            return server.stats()
+
+        stats = asyncio.run(scenario())
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["max_pending"], 2)
+        self.assertEqual(stats["cancelled"], 2)
+
+    def test_sweep_expires_orphaned_callbacks(self):
+        async def scenario():
+            clock = FakeClock()
+            server = WebhookServer(callback_ttl=10, clock=clock)
+            _, _, old = server.create_callback("old")
+            clock.now = 5
+            _, _, recent = server.create_callback("recent")
+            clock.now = 12
+            expired = server.sweep()
+            return expired, old.cancelled(), recent.done(), server.stats()
+
+        expired, old_cancelled, recent_done, stats = asyncio.run(scenario())
+        self.assertEqual(expired, 1)
+        self.assertTrue(old_cancelled)
+        self.assertFalse(recent_done)
+        self.assertEqual(stats["pending"], 1)
+        self.assertEqual(stats["expired"], 1)
+        self.assertEqual(stats["cancelled"], 0)
+
+    def test_reregistered_callback_moves_to_its_new_deadline(self):
+        """Volver a registrar un request_id lo pasa al final: no bloquea el barrido de los vencidos."""
+        async def scenario():
+            clock = FakeClock()
+            server = WebhookServer(callback_ttl=10, clock=clock)
+            server.create_callback("again")
+            clock.now = 2
+            _, _, orphan = server.create_callback("orphan")
+            clock.now = 5
+            _, _, again = server.create_callback("again")
+            clock.now = 13
+            return server.sweep(), orphan.cancelled(), again.done()
+
+        expired, orphan_cancelled, again_done = asyncio.run(scenario())
+        self.assertEqual(expired, 1)
+        self.assertTrue(orphan_cancelled)
+        self.assertFalse(again_done)
+
+    def test_stats_per_api(self):
+        """Con dos APIs en el mismo servidor, cada una ve solo sus contadores."""
+        async def scenario():
+            server = WebhookServer(host="127.0.0.1", port=0)
+            await server.start()
+            try:
+                _, url_a, future_a = server.create_callback("a1", api="A")
+                server.create_callback("b1", api="B")[2].cancel()
+                url_b = server.add_channel("B", "job")
+                future_b = server.expect("B", 7)
+                await asyncio.sleep(0)
+                async with aiohttp.ClientSession() as session:
+                    for url, body in ((url_a, {}), (url_a, {}), (url_b, [{"job": 7}, {"job": 8}, {}])):
+                        async with session.post(url, json=body):
+                            pass
+                    async with session.post(url_a.replace("a1", "b1"), json={}):
+                        pass
+                await future_a, await future_b
+                return server.stats("A"), server.stats("B"), server.stats("C"), server.stats()
+            finally:
+                await server.stop()
+
+        stats_a, stats_b, stats_c, total = asyncio.run(scenario())
+        self.assertEqual((stats_a["created"], stats_a["resolved"], stats_a["duplicate_callbacks"]), (1, 1, 1))
+        self.assertEqual(stats_a["batches"], 0)
+        self.assertEqual((stats_b["created"], stats_b["resolved"], stats_b["cancelled"]), (2, 1, 1))
+        self.assertEqual((stats_b["late_callbacks"], stats_b["batches"], stats_b["early_callbacks"]), (1, 1, 1))
+        self.assertEqual(stats_b["unknown_callbacks"], 1)
+        self.assertEqual((stats_a["pending"], stats_b["pending"], stats_b["max_pending"]), (0, 0, 2))
+        self.assertEqual(stats_c["created"], 0)
+        self.assertEqual(total["created"], 3)
+        self.assertEqual(total["duplicate_callbacks"] + total["late_callbacks"], 2)
+
+    def test_recent_ids_are_bounded(self):
+        async def scenario():
+            server = WebhookServer(recent_limit=3)
+            for i in range(10):
+                server.create_callback(str(i))[2].cancel()
+            await asyncio.sleep(0)
+            return server
+
+        server = asyncio.run(scenario())
+        self.assertEqual(server.pending_count, 0)
+        self.assertEqual(list(server._recent), ["7", "8", "9"])
+
+    def test_callbacks_against_local_server(self):
+        """Resuelto, duplicado, tardío y desconocido se cuentan por separado."""
+        async def scenario():
+            server = WebhookServer(host="127.0.0.1", port=0)
+            await server.start()
+            port = server.port
+            base = f"http://127.0.0.1:{port}/webhook"
+            try:
+                _, _, future = server.create_callback("ok")
+                _, _, late = server.create_callback("late")
+                late.cancel()
+                await asyncio.sleep(0)
+                async with aiohttp.ClientSession() as session:
+                    statuses = []
+                    for request_id in ("ok", "ok", "late", "nope"):
+                        async with session.post(f"{base}/{request_id}", json={"data": {"score": 1}}) as response:
+                            statuses.append(response.status)
+                return statuses, await future, server.stats()
+            finally:
+                await server.stop()
+
+        statuses, payload, stats = asyncio.run(scenario())
+        self.assertEqual(statuses, [200, 409, 410, 404])
+        self.assertEqual(payload, {"data": {"score": 1}})
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["resolved"], 1)
+        self.assertEqual(stats["duplicate_callbacks"], 1)
+        self.assertEqual(stats["late_callbacks"], 1)
+        self.assertEqual(stats["unknown_callbacks"], 1)
+
+    def test_channel_batch_resolves_many_futures(self):
+        """Un POST con un lote resuelve varios Futures, incluso si llegó antes que expect()."""
+        async def scenario():
+            server = WebhookServer(host="127.0.0.1", port=0)
+            await server.start()
+            port = server.port
+            try:
+                url = server.add_channel("Prov A", "job.id", batch_path="results")
+                url = url.replace("0.0.0.0", "127.0.0.1").replace(":0/", f":{port}/")
+                futures = {job: server.expect("Prov A", job) for job in (1, 2)}
+                batch = {"results": [
+                    {"job": {"id": 1}, "data": {"score": 90}},
+                    {"job": {"id": 2}, "data": {"score": 10}},
+                    {"job": {"id": 3}, "data": {"score": 50}},
+                    {"data": {"score": 0}},
+                ]}
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(url, json=batch) as response:
+                        body = await response.json()
+                early = server.expect("Prov A", "3")
+                payloads = {job: await future for job, future in futures.items()}
+                return body, payloads, early.result(), server.stats()
+            finally:
+                await server.stop()
+
+        body, payloads, early, stats = asyncio.run(scenario())
+        self.assertEqual(body, {"status": "ok", "received": 4, "resolved": 2})
+        self.assertEqual(payloads[2]["data"]["score"], 10)
+        self.assertEqual(early["data"]["score"], 50)
+        self.assertEqual(stats["batches"], 1)
+        self.assertEqual(stats["batched_results"], 4)
+        self.assertEqual(stats["early_callbacks"], 1)
+        self.assertEqual(stats["unknown_callbacks"], 1)
+        self.assertEqual(stats["resolved"], 3)
+        self.assertEqual(stats["pending"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import time
+import logging
+from types import SimpleNamespace
+from typing import Any
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Fases de una solicitud, en orden. Son disjuntas: su suma ≈ total.
+#   queue:   espera de un slot libre en el pool de conexiones
+#   dns:     resolución DNS (None si salió de la caché)
+#   connect: establecimiento de la conexión (TCP + handshake TLS en https;
+#            aiohttp no expone el TLS por separado)
+#   send:    envío de headers y body de la solicitud
+#   ttfb:    espera desde el envío hasta recibir los headers de respuesta
+#   body:    lectura y decodificación del body
+PHASES = ("queue", "dns", "connect", "send", "ttfb", "body")
+
+
+class RequestTimings:
+    """
+    Marcas de tiempo (time.perf_counter) de una solicitud HTTP. Se pasa como
+    trace_request_ctx a aiohttp y los hooks de create_trace_config() la
+    completan; el body se marca a mano con mark_body_read().
+    """
+
+    __slots__ = (
+        "start", "queue_start", "queue_end", "dns_start", "dns_end",
+        "connect_start", "connect_end", "connection_ready", "request_sent",
+        "headers_received", "body_read", "connection_reused",
+    )
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queue_start = self.queue_end = None
+        self.dns_start = self.dns_end = None
+        self.connect_start = self.connect_end = None
+        self.connection_ready = None
+        self.request_sent = None
+        self.headers_received = None
+        self.body_read = None
+        self.connection_reused = False
+
+    def mark_body_read(self) -> None:
+        self.body_read = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        """Tiempo desde el inicio hasta el body leído (o hasta ahora)."""
+        end = self.body_read if self.body_read is not None else time.perf_counter()
+        return end - self.start
+
+    def phases(self) -> dict[str, Any]:
+        """Duración de cada fase en segundos (None si la fase no ocurrió)."""
+        def span(a: float | None, b: float | None) -> float | None:
+            return b - a if a is not None and b is not None else None
+
+        dns = span(self.dns_start, self.dns_end)
+        connect = span(self.connect_start, self.connect_end)
+        if connect is not None and dns is not None:
+            # La resolución DNS ocurre dentro de la creación de la conexión
+            connect -= dns
+
+        return {
+            "queue": span(self.queue_start, self.queue_end),
+            "dns": dns,
+            "connect": connect,
+            "send": span(self.connection_ready, self.request_sent),
+            "ttfb": span(self.request_sent, self.headers_received),
+            "body": span(self.headers_received, self.body_read),
+            "total": self.total,
+            "connection_reused": self.connection_reused,
+        }
+
+
+def _timings(ctx: SimpleNamespace) -> RequestTimings | None:
+    timings = ctx.trace_request_ctx
+    return timings if isinstance(timings, RequestTimings) else None
+
+
+async def _on_connection_queued_start(session, ctx, params) -> None:
+    if t := _timings(ctx):
+        t.queue_start = time.perf_counter()
+
+
+async def _on_connection_queued_end(session, ctx, params) -> None:
+    if t := _timings(ctx):
+        t.queue_end = time.perf_counter()
+
+
+async def _on_dns_resolvehost_start(session, ctx, params) -> None:
+    if t := _timings(ctx):
+        t.dns_start = time.perf_counter()
+
+
+async def _on_dns_resolvehost_end(session, ctx, params) -> None:
+    if t := _timings(ctx):
+        t.dns_end = time.perf_counter()
+
+
+async def _on_connection_create_start(session, ctx, params) -> None:
+    if t := _timings(ctx):
+        t.connect_start = time.perf_counter()
+
+
+async def _on_connection_create_end(session, ctx, params) -> None:
+    if t := _timings(ctx):
+        t.connect_end = t.connection_ready = time.perf_counter()
+
+
+async def _on_connection_reuseconn(session, ctx, params) -> None:
+    if t := _timings(ctx):
+        t.connection_reused = True
+        t.connection_ready = time.perf_counter()
+
+
+async def _on_request_sent(session, ctx, params) -> None:
+    # headers_sent y chunk_sent: la última marca es el fin del envío
+    if t := _timings(ctx):
+        t.request_sent = time.perf_counter()
+
+
+async def _on_request_end(session, ctx, params) -> None:
+    if t := _timings(ctx):
+        t.headers_received = time.perf_counter()
+
+
+class ConnectionPoolStats:
+    """
+    Contadores del pool de conexiones de una sesión, alimentados por un
+    aiohttp.TraceConfig: conexiones nuevas vs reutilizadas y solicitudes
+    que tuvieron que esperar un slot libre en el connector.
+    """
+
+    def __init__(self):
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.requests_queued = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    def attach(self, trace_config: aiohttp.TraceConfig) -> None:
+        """Registra los hooks que actualizan estos contadores."""
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_connection_queued_start.append(self._on_connection_queued_start)
+        trace_config.on_connection_queued_end.append(self._on_connection_queued_end)
+
+    async def _on_connection_create_end(self, session, ctx: SimpleNamespace, params) -> None:
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, ctx: SimpleNamespace, params) -> None:
+        self.connections_reused += 1
+
+    async def _on_connection_queued_start(self, session, ctx: SimpleNamespace, params) -> None:
+        ctx.pool_queued_at = time.perf_counter()
+
+    async def _on_connection_queued_end(self, session, ctx: SimpleNamespace, params) -> None:
+        wait = time.perf_counter() - ctx.pool_queued_at
+        self.requests_queued += 1
+        self.total_queue_wait += wait
+        if wait > self.max_queue_wait:
+            self.max_queue_wait = wait
+
+    def stats(self) -> dict[str, Any]:
+        """Resumen del uso del pool de conexiones."""
+        acquired = self.connections_created + self.connections_reused
+        return {
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": self.connections_reused / acquired if acquired else 0.0,
+            "requests_queued": self.requests_queued,
+            "average_queue_wait": self.total_queue_wait / self.requests_queued if self.requests_queued else 0.0,
+            "max_queue_wait": self.max_queue_wait,
+        }
+
+
+def create_trace_config(pool_stats: ConnectionPoolStats | None = None) -> aiohttp.TraceConfig:
+    """
+    Crea el TraceConfig de una sesión: registra las fases de cada solicitud
+    que lleve un RequestTimings como trace_request_ctx y, si se pasa,
+    actualiza los contadores de pool_stats.
+    """
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_queued_start.append(_on_connection_queued_start)
+    trace_config.on_connection_queued_end.append(_on_connection_queued_end)
+    trace_config.on_dns_resolvehost_start.append(_on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    trace_config.on_request_headers_sent.append(_on_request_sent)
+    trace_config.on_request_chunk_sent.append(_on_request_sent)
+    trace_config.on_request_end.append(_on_request_end)
+
+    if pool_stats is not None:
+        pool_stats.attach(trace_config)
+    return trace_config
@@ -1,13 +1,24 @@
 
+import time
 import asyncio
 import logging
 import uuid
-from typing import Any
+from collections import OrderedDict
+from typing import Any, Callable
+from urllib.parse import quote
 
 from aiohttp import web
 
+import json_codec
+from rule_engine import resolve_keys, split_path
+
 logger = logging.getLogger(__name__)
 
+# Límites de la tabla de callbacks pendientes
+DEFAULT_CALLBACK_TTL = 900.0  # segundos hasta cancelar un callback huérfano
+DEFAULT_SWEEP_INTERVAL = 30.0
+DEFAULT_RECENT_LIMIT = 100_000  # request_id cerrados que se recuerdan
+
 
 class WebhookServer:
     """
@@ -15,45 +26,101 @@ class WebhookServer:
     Cada solicitud de validación obtiene un request_id único.
     Cuando el proveedor envía el resultado al callback URL,
     el Future correspondiente se resuelve con el payload.
+
+    Para proveedores que publican en una URL fija (y quizás en lotes), un
+    canal (add_channel) recibe los callbacks en /webhook/channel/{canal}:
+    cada resultado (o cada elemento de un array) se correlaciona por el ID
+    de trabajo del proveedor con el Future registrado por expect().
+
+    Un callback sale de la tabla de pendientes apenas su Future termina
+    (resuelto, cancelado por timeout del que espera o vencido por TTL), así
+    que la memoria depende de los callbacks en vuelo y no del total de la
+    ejecución. Los request_id ya cerrados se recuerdan (hasta recent_limit)
+    para distinguir callbacks tardíos y duplicados de los desconocidos.
+
+    El servidor es compartido por todas las APIs de la ejecución: los
+    contadores se llevan en total y por API (el api de create_callback o
+    el canal), y stats(api) devuelve solo los de esa API.
     """
 
-    def __init__(self, host: str = "0.0.0.0", port: int = 8765, base_url: str | None = None):
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8765,
+        base_url: str | None = None,
+        callback_ttl: float = DEFAULT_CALLBACK_TTL,
+        sweep_interval: float = DEFAULT_SWEEP_INTERVAL,
+        recent_limit: int = DEFAULT_RECENT_LIMIT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         """
         Args:
             host: Dirección en la que escuchar.
             port: Puerto en el que escuchar.
             base_url: URL pública base (ej. de ngrok). Si no se da,
                       se usa http://{host}:{port}.
+            callback_ttl: Segundos tras los que un callback que nadie
+                          resolvió se cancela (IDs huérfanos).
+            sweep_interval: Segundos entre barridos de callbacks vencidos.
+            recent_limit: Cantidad de request_id cerrados que se recuerdan
+                          para contar callbacks tardíos.
         """
         self._host = host
         self._port = port
         self._base_url = base_url or f"http://{host}:{port}"
+        self._default_base_url = base_url is None
+        self.callback_ttl = callback_ttl
+        self._sweep_interval = sweep_interval
+        self._recent_limit = recent_limit
+        self._clock = clock
 
-        # Mapa de request_id → asyncio.Future pendiente
-        self._pending: dict[str, asyncio.Future] = {}
+        # Mapa de request_id → (asyncio.Future pendiente, vencimiento, API). Con
+        # un TTL fijo, el orden de inserción es también el orden de vencimiento
+        # (_register reinserta al final un request_id que se vuelve a registrar).
+        self._pending: dict[str, tuple[asyncio.Future, float, str | None]] = {}
+        # request_id cerrados recientemente → ("resolved", "cancelled" o "expired", API)
+        self._recent: OrderedDict[str, tuple[str, str | None]] = OrderedDict()
+        self._counters = self._new_counters()
+        # Los mismos contadores (más pending / max_pending) por API
+        self._api_counters: dict[str, dict[str, int]] = {}
+        # Canales: nombre → (ruta del ID en cada resultado, ruta del array del lote)
+        self._channels: dict[str, tuple[tuple[str, ...], tuple[str, ...]]] = {}
+        # Resultados de canal que llegaron antes que su expect(): clave → (payload, llegada)
+        self._early: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._max_pending = 0
 
         self._app: web.Application | None = None
         self._runner: web.AppRunner | None = None
         self._site: web.TCPSite | None = None
+        self._sweeper: asyncio.Task | None = None
 
     # ── Ciclo de vida ───────────────────────────────────────────────
 
     async def start(self) -> None:
-        """Inicia el servidor HTTP."""
+        """Inicia el servidor HTTP y el barrido de callbacks vencidos."""
         self._app = web.Application()
         self._app.router.add_post("/webhook/{request_id}", self._handle_webhook)
+        self._app.router.add_post("/webhook/channel/{channel}", self._handle_channel)
 
         self._runner = web.AppRunner(self._app)
         await self._runner.setup()
         self._site = web.TCPSite(self._runner, self._host, self._port)
         await self._site.start()
+        if self._default_base_url and self._port == 0:
+            # Con port=0 el sistema elige un puerto libre: usar el real
+            self._base_url = f"http://{self._host}:{self.port}"
+        self._sweeper = asyncio.create_task(self._sweep_loop())
 
         logger.info("Webhook server escuchando en %s:%s", self._host, self._port)
 
     async def stop(self) -> None:
         """Detiene el servidor y cancela Futures pendientes."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
         # Cancelar todos los futures pendientes
-        for req_id, future in self._pending.items():
+        for req_id, (future, _, _) in list(self._pending.items()):
             if not future.done():
                 future.cancel()
                 logger.debug("Future cancelado para request_id=%s", req_id)
@@ -62,16 +129,19 @@ class WebhookServer:
 
         if self._runner:
             await self._runner.cleanup()
-            logger.info("Webhook server detenido.")
+            logger.info("Webhook server detenido. %s", self.stats())
 
     # ── API pública ─────────────────────────────────────────────────
 
-    def create_callback(self, request_id: str | None = None) -> tuple[str, str, asyncio.Future]:
+    def create_callback(
+        self, request_id: str | None = None, api: str | None = None,
+    ) -> tuple[str, str, asyncio.Future]:
         """
         Registra un callback pendiente.
 
         Args:
             request_id: ID de la solicitud (se genera uno si no se proporciona).
+            api: API a la que se atribuyen sus contadores (ver stats).
 
         Returns:
             Tupla (request_id, callback_url, future).
@@ -82,43 +152,221 @@ class WebhookServer:
         if request_id is None:
             request_id = uuid.uuid4().hex
 
-        loop = asyncio.get_event_loop()
-        future: asyncio.Future = loop.create_future()
-        self._pending[request_id] = future
-
+        future = self._register(request_id, api)
         callback_url = f"{self._base_url}/webhook/{request_id}"
         logger.debug("Callback registrado: %s → %s", request_id, callback_url)
 
         return request_id, callback_url, future
 
+    def add_channel(self, channel: str, id_path: str, batch_path: str | None = None) -> str:
+        """
+        Registra (o devuelve, si ya existe) un canal de callbacks con URL fija.
+
+        Args:
+            channel: Nombre del canal (ej. el nombre de la API).
+            id_path: Ruta (dot notation) del ID de trabajo en cada resultado.
+            batch_path: Ruta del array de resultados cuando el proveedor los
+                        envía envueltos (ej. "results"); un body que ya es un
+                        array se acepta siempre.
+
+        Returns:
+            URL del canal, a enviar como callback_url.
+        """
+        self._channels.setdefault(channel, (split_path(id_path), split_path(batch_path)))
+        return f"{self._base_url}/webhook/channel/{quote(channel, safe='')}"
+
+    def expect(self, channel: str, provider_id: Any) -> asyncio.Future:
+        """
+        Registra el resultado pendiente del trabajo provider_id en el canal.
+        Si ese resultado ya llegó (antes que la respuesta inicial), el
+        Future se devuelve resuelto.
+        """
+        key = self._channel_key(channel, provider_id)
+        future = self._register(key, channel)
+        early = self._early.pop(key, None)
+        if early is not None:
+            self._close(key, future, "resolved")
+            future.set_result(early[0])
+        return future
+
+    @property
+    def port(self) -> int:
+        """Puerto en el que escucha (con port=0, el que eligió el sistema al iniciar)."""
+        if self._runner is not None and self._runner.addresses:
+            return self._runner.addresses[0][1]
+        return self._port
+
     @property
     def pending_count(self) -> int:
         """Cantidad de callbacks pendientes."""
-        return sum(1 for f in self._pending.values() if not f.done())
+        return len(self._pending)
+
+    def sweep(self) -> int:
+        """
+        Cancela los callbacks cuyo TTL venció (ej. el que esperaba el
+        resultado terminó sin cancelar su Future). Retorna cuántos venció.
+        """
+        now = self._clock()
+        overdue = []
+        for request_id, (future, deadline, _) in self._pending.items():
+            if deadline > now:
+                break
+            overdue.append((request_id, future))
+        for request_id, future in overdue:
+            self._close(request_id, future, "expired")
+            future.cancel()
+        expired = len(overdue)
+        # Resultados de canal que nadie reclamó dentro del TTL
+        while self._early and next(iter(self._early.values()))[1] + self.callback_ttl <= now:
+            key, _ = self._early.popitem(last=False)
+            self._count("unknown_callbacks", self._channel_of(key))
+        if expired:
+            logger.warning("%d callbacks de webhook vencidos por TTL (%ss).", expired, self.callback_ttl)
+        return expired
+
+    def stats(self, api: str | None = None) -> dict[str, int]:
+        """
+        Contadores de callbacks: creados, resueltos, cancelados, vencidos,
+        tardíos, etc. Con api, solo los de esa API (los callbacks a un
+        request_id o canal desconocido no tienen API y solo cuentan en el
+        total).
+        """
+        if api is not None:
+            return dict(self._api_counters.get(api) or {"pending": 0, "max_pending": 0, **self._new_counters()})
+        return {"pending": len(self._pending), "max_pending": self._max_pending, **self._counters}
+
+    # ── Internos ────────────────────────────────────────────────────
+
+    @staticmethod
+    def _new_counters() -> dict[str, int]:
+        return {
+            "created": 0, "resolved": 0, "cancelled": 0, "expired": 0,
+            "late_callbacks": 0, "duplicate_callbacks": 0, "unknown_callbacks": 0,
+            "batches": 0, "batched_results": 0, "early_callbacks": 0,
+        }
+
+    def _count(self, key: str, api: str | None, n: int = 1) -> None:
+        """Suma a un contador en el total y en el de la API (si se conoce)."""
+        self._counters[key] += n
+        if api is not None:
+            self._api(api)[key] += n
+
+    def _api(self, api: str) -> dict[str, int]:
+        counters = self._api_counters.get(api)
+        if counters is None:
+            counters = self._api_counters[api] = {"pending": 0, "max_pending": 0, **self._new_counters()}
+        return counters
 
-    # ── Handler interno ─────────────────────────────────────────────
+    @staticmethod
+    def _channel_key(channel: str, provider_id: Any) -> str:
+        return f"{channel}\x00{provider_id}"
+
+    @staticmethod
+    def _channel_of(key: str) -> str:
+        return key.split("\x00", 1)[0]
+
+    def _register(self, request_id: str, api: str | None = None) -> asyncio.Future:
+        """Agrega un Future pendiente con su vencimiento por TTL."""
+        loop = asyncio.get_event_loop()
+        future: asyncio.Future = loop.create_future()
+        # Quitarlo antes: asignar sobre una clave existente conserva su
+        # posición y sweep() cortaría en un vencimiento fuera de orden
+        previous = self._pending.pop(request_id, None)
+        if previous is not None and previous[2] is not None:
+            self._api(previous[2])["pending"] -= 1
+        self._pending[request_id] = (future, self._clock() + self.callback_ttl, api)
+        future.add_done_callback(lambda f: self._close(request_id, f, "cancelled"))
+
+        self._count("created", api)
+        if len(self._pending) > self._max_pending:
+            self._max_pending = len(self._pending)
+        if api is not None:
+            counters = self._api(api)
+            counters["pending"] += 1
+            counters["max_pending"] = max(counters["max_pending"], counters["pending"])
+        return future
+
+    def _deliver(self, key: str, payload: Any) -> bool:
+        """
+        Resuelve el callback pendiente de un resultado de canal. Si no hay
+        ninguno, lo cuenta como tardío/duplicado o lo guarda por si su
+        expect() todavía no llegó. Retorna True si resolvió un Future.
+        """
+        entry = self._pending.get(key)
+        if entry is not None and not entry[0].done():
+            self._close(key, entry[0], "resolved")
+            entry[0].set_result(payload)
+            return True
+        if entry is not None:
+            self._close(key, entry[0], "cancelled")
+        channel = self._channel_of(key)
+        outcome, _ = self._recent.get(key, (None, None))
+        if outcome == "resolved":
+            self._count("duplicate_callbacks", channel)
+        elif outcome is not None:
+            self._count("late_callbacks", channel)
+        else:
+            self._count("early_callbacks", channel)
+            self._early[key] = (payload, self._clock())
+            if len(self._early) > self._recent_limit:
+                dropped, _ = self._early.popitem(last=False)
+                self._count("unknown_callbacks", self._channel_of(dropped))
+        return False
+
+    def _close(self, request_id: str, future: asyncio.Future, outcome: str) -> None:
+        """Saca el callback de los pendientes y lo recuerda con su resultado."""
+        entry = self._pending.get(request_id)
+        if entry is None or entry[0] is not future:
+            return
+        del self._pending[request_id]
+        api = entry[2]
+        self._count(outcome, api)
+        if api is not None:
+            self._api(api)["pending"] -= 1
+        self._recent[request_id] = (outcome, api)
+        if len(self._recent) > self._recent_limit:
+            self._recent.popitem(last=False)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._sweep_interval)
+            self.sweep()
+
+    def _closed_response(
+        self, request_id: str, entry: tuple[asyncio.Future, float, str | None] | None,
+    ) -> web.Response:
+        """Respuesta (y métrica) para un callback cuyo request_id ya no está pendiente."""
+        if entry is not None:
+            # Future cancelado cuyo done callback todavía no corrió
+            self._close(request_id, entry[0], "cancelled")
+        outcome, api = self._recent.get(request_id, (None, None))
+        if outcome == "resolved":
+            self._count("duplicate_callbacks", api)
+            logger.warning("Webhook duplicado para request_id: %s", request_id)
+            return web.json_response({"error": "callback ya procesado"}, status=409)
+        if outcome is not None:
+            # Llegó después del timeout de quien lo esperaba (o del TTL)
+            self._count("late_callbacks", api)
+            logger.info("Webhook tardío para request_id=%s (%s).", request_id, outcome)
+            return web.json_response({"error": "callback tardío"}, status=410)
+        self._counters["unknown_callbacks"] += 1
+        logger.warning("Webhook recibido para request_id desconocido: %s", request_id)
+        return web.json_response(
+            {"error": "request_id desconocido"},
+            status=404,
+        )
 
     async def _handle_webhook(self, request: web.Request) -> web.Response:
         """Recibe un POST del proveedor y resuelve el Future correspondiente."""
         request_id = request.match_info["request_id"]
 
-        future = self._pending.get(request_id)
-        if future is None:
-            logger.warning("Webhook recibido para request_id desconocido: %s", request_id)
-            return web.json_response(
-                {"error": "request_id desconocido"},
-                status=404,
-            )
-
-        if future.done():
-            logger.warning("Webhook duplicado para request_id: %s", request_id)
-            return web.json_response(
-                {"error": "callback ya procesado"},
-                status=409,
-            )
+        entry = self._pending.get(request_id)
+        if entry is None or entry[0].done():
+            return self._closed_response(request_id, entry)
 
+        future = entry[0]
         try:
-            payload = await request.json()
+            payload = await request.json(loads=json_codec.loads)
         except Exception:
             logger.error("Payload inválido para request_id=%s", request_id)
             return web.json_response(
@@ -126,7 +374,50 @@ class WebhookServer:
                 status=400,
             )
 
+        if future.done():
+            # Se canceló (timeout) mientras se leía el body
+            return self._closed_response(request_id, entry)
+
+        self._close(request_id, future, "resolved")
         future.set_result(payload)
         logger.info("Webhook resuelto para request_id=%s", request_id)
 
         return web.json_response({"status": "ok"})
+
+    async def _handle_channel(self, request: web.Request) -> web.Response:
+        """
+        Recibe un POST en la URL fija de un canal: un resultado o un lote
+        (array) de resultados, cada uno correlacionado por su ID de trabajo.
+        """
+        channel = request.match_info["channel"]
+        if channel not in self._channels:
+            self._counters["unknown_callbacks"] += 1
+            logger.warning("Webhook recibido para un canal desconocido: %s", channel)
+            return web.json_response({"error": "canal desconocido"}, status=404)
+        id_keys, batch_keys = self._channels[channel]
+
+        try:
+            body = await request.json(loads=json_codec.loads)
+        except Exception:
+            logger.error("Payload inválido en el canal %s", channel)
+            return web.json_response({"error": "payload JSON inválido"}, status=400)
+
+        items = resolve_keys(body, batch_keys) if batch_keys and isinstance(body, dict) else body
+        if not isinstance(items, list):
+            items = [items]
+        self._count("batches", channel)
+        self._count("batched_results", channel, len(items))
+
+        resolved = missing_id = 0
+        for item in items:
+            provider_id = resolve_keys(item, id_keys)
+            if provider_id is None:
+                missing_id += 1
+                continue
+            resolved += self._deliver(self._channel_key(channel, provider_id), item)
+        if missing_id:
+            self._count("unknown_callbacks", channel, missing_id)
+            logger.warning("%d resultados sin ID de trabajo en el canal %s.", missing_id, channel)
+        logger.debug("Lote en el canal %s: %d resultados, %d resueltos.", channel, len(items), resolved)
+
+        return web.json_response({"status": "ok", "received": len(items), "resolved": resolved})